@@ -5,6 +5,10 @@ from varglas.data.data_factory    import DataFactory
 from varglas.io                   import DataInput, DataOutput
 from fenics                       import *
 
+import sys
+sys.path.append('../')
+from bedstats.bedfile import read_function
+
 # get the input args :
 out_dir = 'dump/bed/07/bv/'
 in_dir  = 'dump/bed/07/'
@@ -12,11 +16,8 @@ in_dir  = 'dump/bed/07/'
 mesh   = Mesh(in_dir + 'submesh.xdmf')
 Q      = FunctionSpace(mesh, 'CG', 1)
 
-S      = Function(Q)
-B      = Function(Q)
-
-File(in_dir + 'S_s.xml') >> S
-File(in_dir + 'B_s.xml') >> B
+S      = read_function(in_dir, 'S_s.xml', Q)
+B      = read_function(in_dir, 'B_s.xml', Q)
 
 config = default_config()
 config['output_path']               = out_dir
@@ -28,7 +29,7 @@ model.set_mesh(mesh)
 model.set_surface_and_bed(S, B)
 model.initialize_variables()
 
-model.init_adot(in_dir + 'adot_s.xml')
+model.init_adot(read_function(in_dir, 'adot_s.xml', Q))
 
 F = solvers.BalanceVelocitySolver(model, config)
 
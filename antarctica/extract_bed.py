@@ -1,8 +1,13 @@
+import sys
 import varglas.model as model
 from fenics          import *
 from pylab           import *
 from varglas.helper  import default_config
 
+sys.path.append('../')
+from bedstats.transfer import BedTransfer
+from bedstats.bedfile  import create_bed
+
 out_dir  = 'dump/bed/07/'
 in_dir   = 'dump/high/07/'
 bv_dir   = 'dump/high/balance_velocity/'
@@ -88,102 +93,54 @@ model.assign_variable(ws, avg_dir + 'ws.xml')
 
 submesh = model.get_bed_mesh()
 
-Q_b       = FunctionSpace(submesh, 'CG', 1)
-beta_s    = Function(Q_b)
-S_s       = Function(Q_b)
-B_s       = Function(Q_b)
-H_s       = Function(Q_b)
-Tb_s      = Function(Q_b)
-Ts_s      = Function(Q_b)
-ub_s      = Function(Q_b)
-vb_s      = Function(Q_b)
-wb_s      = Function(Q_b)
-us_s      = Function(Q_b)
-vs_s      = Function(Q_b)
-ws_s      = Function(Q_b)
-Mb_s      = Function(Q_b)
-W_s       = Function(Q_b)
-adot_s    = Function(Q_b)
-qgeo_s    = Function(Q_b)
-U_ob_s    = Function(Q_b)
-Ubar_s    = Function(Q_b)
-etabar_s  = Function(Q_b)
-ubar_s    = Function(Q_b)
-vbar_s    = Function(Q_b)
-tau_id_s  = Function(Q_b)
-tau_jd_s  = Function(Q_b)
-tau_ii_s  = Function(Q_b)
-tau_ij_s  = Function(Q_b)
-tau_iz_s  = Function(Q_b)
-tau_ji_s  = Function(Q_b)
-tau_jj_s  = Function(Q_b)
-tau_jz_s  = Function(Q_b)
-mask_s    = Function(Q_b)
-
-
-lg      = LagrangeInterpolator()
-
-lg.interpolate(beta_s,   model.beta)
-lg.interpolate(Tb_s,     model.T)
-lg.interpolate(Ts_s,     T_s)
-lg.interpolate(S_s,      S)
-lg.interpolate(B_s,      B)
-lg.interpolate(ub_s,     model.u)
-lg.interpolate(vb_s,     model.v)
-lg.interpolate(wb_s,     model.w)
-lg.interpolate(us_s,     us)
-lg.interpolate(vs_s,     vs)
-lg.interpolate(ws_s,     ws)
-lg.interpolate(Mb_s,     model.Mb)
-lg.interpolate(W_s,      model.W)
-lg.interpolate(adot_s,   adot)
-lg.interpolate(qgeo_s,   q_geo)
-lg.interpolate(U_ob_s,   U_ob)
-lg.interpolate(Ubar_s,   model.Ubar)
-lg.interpolate(etabar_s, model.etabar)
-lg.interpolate(ubar_s,   model.ubar)
-lg.interpolate(vbar_s,   model.vbar)
-lg.interpolate(tau_id_s, tau_id)
-lg.interpolate(tau_jd_s, tau_jd)
-lg.interpolate(tau_ii_s, tau_ii)
-lg.interpolate(tau_ij_s, tau_ij)
-lg.interpolate(tau_iz_s, tau_iz)
-lg.interpolate(tau_ji_s, tau_ji)
-lg.interpolate(tau_jj_s, tau_jj)
-lg.interpolate(tau_jz_s, tau_jz)
-lg.interpolate(mask_s,   mask)
+Q_b     = FunctionSpace(submesh, 'CG', 1)
 
 XDMFFile(submesh.mpi_comm(), out_dir + 'submesh.xdmf') << submesh
 
-model.save_xml(beta_s,   'beta_s')
-model.save_xml(Tb_s,     'Tb_s')
-model.save_xml(Ts_s,     'Ts_s')
-model.save_xml(S_s,      'S_s')
-model.save_xml(B_s,      'B_s')
-model.save_xml(ub_s,     'ub_s')
-model.save_xml(vb_s,     'vb_s')
-model.save_xml(wb_s,     'wb_s')
-model.save_xml(us_s,     'us_s')
-model.save_xml(vs_s,     'vs_s')
-model.save_xml(ws_s,     'ws_s')
-model.save_xml(Mb_s,     'Mb_s')
-model.save_xml(W_s,      'W_s')
-model.save_xml(adot_s,   'adot_s')
-model.save_xml(qgeo_s,   'qgeo_s')
-model.save_xml(U_ob_s,   'U_ob_s')
-model.save_xml(Ubar_s,   'Ubar_s')
-model.save_xml(etabar_s, 'etabar_s')
-model.save_xml(ubar_s,   'ubar_s')
-model.save_xml(vbar_s,   'vbar_s')
-model.save_xml(tau_id_s, 'tau_id_s')
-model.save_xml(tau_jd_s, 'tau_jd_s')
-model.save_xml(tau_ii_s, 'tau_ii_s')
-model.save_xml(tau_ij_s, 'tau_ij_s')
-model.save_xml(tau_iz_s, 'tau_iz_s')
-model.save_xml(tau_ji_s, 'tau_ji_s')
-model.save_xml(tau_jj_s, 'tau_jj_s')
-model.save_xml(tau_jz_s, 'tau_jz_s')
-model.save_xml(mask_s,   'mask_s')
-
-
-
+# the bed fields and the 3D fields they are taken from :
+fields  = [('beta_s',   model.beta),
+           ('Tb_s',     model.T),
+           ('Ts_s',     T_s),
+           ('S_s',      S),
+           ('B_s',      B),
+           ('ub_s',     model.u),
+           ('vb_s',     model.v),
+           ('wb_s',     model.w),
+           ('us_s',     us),
+           ('vs_s',     vs),
+           ('ws_s',     ws),
+           ('Mb_s',     model.Mb),
+           ('W_s',      model.W),
+           ('adot_s',   adot),
+           ('qgeo_s',   q_geo),
+           ('U_ob_s',   U_ob),
+           ('Ubar_s',   model.Ubar),
+           ('etabar_s', model.etabar),
+           ('ubar_s',   model.ubar),
+           ('vbar_s',   model.vbar),
+           ('tau_id_s', tau_id),
+           ('tau_jd_s', tau_jd),
+           ('tau_ii_s', tau_ii),
+           ('tau_ij_s', tau_ij),
+           ('tau_iz_s', tau_iz),
+           ('tau_ji_s', tau_ji),
+           ('tau_jj_s', tau_jj),
+           ('tau_jz_s', tau_jz),
+           ('mask_s',   mask)]
+
+# every bed vertex is a vertex of the 3D mesh, so all the fields are carried
+# to the bed by one product with the transfer matrix, cached in out_dir :
+bt      = BedTransfer(out_dir, Q, Q_b)
+names   = [n for n, f in fields]
+bed_f   = bt.functions([f for n, f in fields])
+
+# the submesh and all the fields go to one compressed HDF5 container, read
+# a field at a time by bedstats.bedfile; the legacy XML files are written
+# as well only if 'xml' is given on the command line :
+bf      = create_bed(out_dir, submesh)
+bf.write_functions(zip(names, bed_f))
+bf.close()
+
+if 'xml' in sys.argv[1:]:
+  for n, f in zip(names, bed_f):
+    model.save_xml(f, n)
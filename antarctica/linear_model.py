@@ -105,6 +105,10 @@ sys.path.append(src_directory)
 
 from scipy.stats               import probplot 
 from src.regstats              import prbplotObj
+sys.path.append('../')
+from bedstats.filters          import filter_mask, print_counts
+from bedstats.gradient         import GradientOperator
+from bedstats.subset           import gram, best_subsets, print_subsets
 from fenics                    import *
 from pylab                     import *
 
@@ -145,12 +149,6 @@ File(in_dir + 'w_s.xml')    >> w
 File('dump/bed/balance_velocity/Ubar_s.xml') >> Ubar
 File('dump/bed/balance_water/q.xml')         >> qbar
 
-dSdx   = project(S.dx(0), Q)
-dSdy   = project(S.dx(1), Q)
-
-dBdx   = project(B.dx(0), Q)
-dBdy   = project(B.dx(1), Q)
-
 # vectors :
 beta_v = beta.vector().array()
 S_v    = S.vector().array()
@@ -168,19 +166,26 @@ qbar_v = qbar.vector().array()
 
 H_v    = S_v - B_v
 U_mag  = sqrt(u_v**2 + v_v**2 + w_v**2 + 1e-16)
-dSdx_v = dSdx.vector().array()
-dSdy_v = dSdy.vector().array()
+# horizontal derivatives from the cached gradient operator of the submesh :
+G      = GradientOperator(in_dir, Q)
+dSdx_v, dSdy_v = G.gradient(S_v)
 gradS  = sqrt(dSdx_v**2 + dSdy_v**2 + 1e-16)
-dBdx_v = dBdx.vector().array()
-dBdy_v = dBdy.vector().array()
+dBdx_v, dBdy_v = G.gradient(B_v)
 gradB  = sqrt(dBdx_v**2 + dBdy_v**2 + 1e-16)
 
 #B_v -= B_v.min()
 
-valid  = where(beta_v > 1e-10)[0]
-valid  = intersect1d(valid, where(Ubar_v > 0)[0])
-valid  = intersect1d(valid, where(abs(Mb_v) < 40)[0])
-valid  = intersect1d(valid, where(abs(adot_v) < 2)[0])
+spec   = {'beta'      : '>1e-10',
+          'Ubar'      : '>0',
+          'abs(Mb)'   : '<40',
+          'abs(adot)' : '<2'}
+F      = {'beta' : beta_v,
+          'Ubar' : Ubar_v,
+          'Mb'   : Mb_v,
+          'adot' : adot_v}
+ok, rej = filter_mask(spec, F)
+print_counts(rej, len(beta_v))
+valid  = where(ok)[0]
 
 print "sample size:", len(valid)
 
@@ -223,6 +228,12 @@ y   = log(beta_v[valid]**2 + 1)
 
 index  = [0,1,2,3,4,5,10,11,12,13,14]
 
+#===============================================================================
+# best subsets of the variables by branch and bound on the normal equations :
+XTX, XTy, yTy = gram(X, y)
+subsets = best_subsets(XTX, XTy, yTy, len(y), 'BIC', nbest=10)
+print_subsets(subsets, names, 'BIC')
+
 #for idx in range(1,len(index)+1):
 for idx in [len(index)+1]:
   ii     = index[:idx]
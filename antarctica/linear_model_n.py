@@ -1,8 +1,6 @@
 from pylab             import *
 from scipy.stats       import t, distributions, scoreatpercentile, \
                               distributions, probplot, chisquare
-from scipy.special     import fdtrc
-from scipy.sparse      import diags
 from scipy.interpolate import interp1d
 
 import sys
@@ -14,6 +12,11 @@ from varglas.helper            import plotIce
 from varglas.data.data_factory import DataFactory
 from varglas.io                import DataInput
 
+sys.path.append('../')
+from bedstats.glm              import glm
+from bedstats.gradient         import GradientOperator
+from bedstats.distfit          import fit_fixed
+
 lognorm  = distributions.lognorm
 
 def iqr(arr):
@@ -30,100 +33,6 @@ def normal(x, mu, sigma):
   """
   return 1.0/(sigma * sqrt(2.0 * pi)) * exp(-(x - mu)**2 / (2.0 * sigma**2))
 
-def glm(x,y,w=1.0):
-
-  p,n    = shape(x)                    # sample size
-  p     += 1                           # add one for intercept
-  dof    = n - p                       # degrees of freedom
-  
-  sig    = var(y)                      # variance
-  mu     = (y + mean(y))/2.0           # initial mean estimate
-  eta    = log(mu)                     # initial predictor
-  X      = vstack((ones(n), x)).T      # observed x-variable matrix
-
-  # Newton-Raphson :
-  converged = False
-  rtol      = 1e-4
-  dtol      = 1e-4
-  lmbda     = 1.0
-  nIter     = 0
-  deviance  = 1
-  D         = 1
-  ahat      = zeros(p)   # initial parameters
-  rel_res   = zeros(p)   # initial relative residual
-  maxIter   = 65
-
-  rel_a = []
-  dev_a = []
-
-  while not converged and nIter < maxIter:
-    W       = diags(w*mu**2/sig, 0)         # compute weights
-    z       = eta + (y - mu)/mu             # adjusted dependent variable
-
-    WX      = W.dot(X)
-    XTWX    = dot(X.T, WX)
-    iXTWX   = inv(XTWX)
-    Wz      = W.dot(z)
-
-    ahat_n  = dot(iXTWX, dot(X.T, Wz))
-    
-    eta     = dot(X, ahat_n)               # compute estimates
-    mu      = exp(eta)                     # linear predictor
-
-    # calculate residual :
-    rel_res  = norm(ahat - ahat_n, inf)
-    rel_a.append(rel_res)
-    ahat     = ahat_n
-
-    D_n      = sum((y - mu)**2)
-    deviance = abs(D_n - D)
-    D        = D_n
-    dev_a.append(deviance)
-    
-    if rel_res < rtol or deviance < dtol: converged = True
-    nIter +=  1
-
-    string = "Newton iteration %d: d (abs) = %.2e, (tol = %.2e) r (rel) = %.2e (tol = %.2e)"
-    print string % (nIter, deviance, dtol, rel_res, rtol)
-  
-  # calculate statistics :
-  varA   = diag(iXTWX)            # variance of alpha hat
-  sea    = sqrt(varA)             # vector of standard errors for alpha hat
-  t_a    = ahat / sea
-  pval   = t.sf(abs(t_a), dof) * 2
-  conf   = 0.95                        # 95% confidence interval
-  tbonf  = t.ppf((1 - conf/p), dof)    # bonferroni corrected t-value
-  ci     = tbonf*sea                   # confidence interval for ahat
-  resid  = (y - mu)                    # 'working' residual
-                                       
-  RSS    = sum((y - mu)**2)            # residual sum of squares
-  TSS    = sum((y - mean(y))**2)       # total sum of squares
-  R2     = (TSS-RSS)/TSS               # R2
-  F      = (TSS-RSS)/(p-1) * (n-p)/RSS # F-statistic
-  F_p    = fdtrc(p-1, dof, F)          # F-Stat. p-value
-
-  # log-likelihood :
-  L      = sum((y*mu - mu**2/2)/(2*sig) - y**2/(2*sig) - 0.5*log(2*pi*sig))
-  AIC    = (-2*L + 2*p)/n              # AIC statistic
-
-  # estimated error variance :
-  sighat = 1/(n-p) * RSS
-                                        
-  vara = { 'ahat'  : ahat,              
-           'yhat'  : mu,                
-           'sea'   : sea,               
-           'ci'    : ci,                
-           'dof'   : dof,               
-           'resid' : resid,             
-           'rel_a' : rel_a,
-           'dev_a' : dev_a,
-           'R2'    : R2,
-           'F'     : F,
-           'AIC'   : AIC,
-           'sighat': sighat}
-  return vara
-
-
 #===============================================================================
 # create directories and such :
 
@@ -207,12 +116,6 @@ File(in_dir + 'tau_jj_s.xml') >> tau_jj
 File(in_dir + 'tau_jz_s.xml') >> tau_jz
 File(in_dir + 'mask_s.xml')   >> mask
 
-dSdx   = project(S.dx(0), Q)
-dSdy   = project(S.dx(1), Q)
-                          
-dBdx   = project(B.dx(0), Q)
-dBdy   = project(B.dx(1), Q)
-
 # vectors :
 beta_v = beta.vector().array()
 S_v    = S.vector().array()
@@ -241,11 +144,11 @@ mask_v   = mask.vector().array()
 
 H_v    = S_v - B_v
 U_mag  = sqrt(u_v**2 + v_v**2 + w_v**2 + 1e-16)
-dSdx_v = dSdx.vector().array()
-dSdy_v = dSdy.vector().array()
+# horizontal derivatives from the cached gradient operator of the submesh :
+G      = GradientOperator(in_dir, Q)
+dSdx_v, dSdy_v = G.gradient(S_v)
 gradS  = sqrt(dSdx_v**2 + dSdy_v**2 + 1e-16)
-dBdx_v = dBdx.vector().array()
-dBdy_v = dBdy.vector().array()
+dBdx_v, dBdy_v = G.gradient(B_v)
 gradB  = sqrt(dBdx_v**2 + dBdy_v**2 + 1e-16)
 D      = zeros(len(B_v))
 D[B_v < 0] = B_v[B_v < 0]
@@ -507,7 +410,7 @@ ex_n.insert(0, '$\mathbf{1}$')
 #==============================================================================
 # plot beta distribution and lognorm fit :
 
-ln_fit   = lognorm.fit(y)
+ln_fit   = fit_fixed(y, 'lognorm')
 g_x      = linspace(y.min(), y.max(), 1000)
 ln_freq  = lognorm.pdf(g_x, *ln_fit)
 
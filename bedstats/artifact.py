@@ -0,0 +1,145 @@
+import json
+
+from numpy             import array, asarray, load, savez_compressed, sign, \
+                              ndim, float64
+
+from bedstats.design   import LazyDesign
+from bedstats.resample import predict
+
+# the arrays of a fit of glm() or glm_chunked() kept by save_fit() :
+ARRAYS = ['ahat', 'cov', 'sea', 'ci', 'yhat', 'resid', 'rel_a', 'dev_a',
+          'cond_a', 'vif']
+
+# its scalar statistics :
+SCALARS = ['dof', 'R2', 'F', 'AIC', 'sighat']
+
+# the fit statistics of stats.dat, after those of the fitted values :
+STATS_NAMES = ['$\mu$', 'median', '$\sigma^2$', 'IQR',   '$\sigma^2 / \mu$',
+               '$R^2$', 'F',      'AIC',        '$\hat{\sigma}^2$']
+
+
+def save_fit(fn, out, names, terms, valid, w=1.0, **info):
+  """
+  Save the fit <out> of glm() or glm_chunked() to the compressed .npz file
+  <fn> : its estimates, covariance, standard errors, intervals, fitted
+  values, residuals, convergence history and statistics, with the term
+  <names> (intercept first), the <terms> of the LazyDesign it was fit on,
+  the indices <valid> of the nodes of the fit and its prior weights <w>.
+  The keyword arguments <info>, e.g. the model variant, are stored with
+  the names and terms as JSON.
+  """
+  arrs = dict((k, asarray(out[k])) for k in ARRAYS)
+  arrs['valid'] = asarray(valid)
+  arrs['w']     = asarray(w, dtype=float64)
+  meta = {'names'   : list(names),
+          'terms'   : terms,
+          'stats'   : dict((k, float(out[k])) for k in SCALARS),
+          'info'    : info}
+  arrs['__meta__'] = array(json.dumps(meta))
+  savez_compressed(fn, **arrs)
+
+
+def load_fit(fn):
+  """
+  Return the fit saved by save_fit() to <fn> as a dictionary with the keys
+  of the fit, so that it may be used in its place, and the 'names',
+  'terms', 'valid', 'w' and 'info' saved with it.
+  """
+  npz  = load(fn)
+  meta = json.loads(str(npz['__meta__']))
+  fit  = dict((k, npz[k]) for k in ARRAYS + ['valid', 'w'])
+  fit.update(meta['stats'])
+  fit['names'] = array(meta['names'])
+  fit['terms'] = meta['terms']
+  fit['info']  = meta['info']
+  if ndim(fit['w']) == 0:
+    fit['w'] = float(fit['w'])
+  npz.close()
+  return fit
+
+
+def predict_fit(fit, base, chunk=2**16):
+  """
+  Return the fitted friction of the loaded <fit> at every node of the
+  base variables <base> (see LazyDesign), e.g. the full-length columns
+  <V> of linear_model_n.py, without refitting.
+  """
+  return predict(LazyDesign(base, fit['terms'], chunk=chunk), fit['ahat'],
+                 chunk)
+
+
+def write_alpha(fn, fit, names=None):
+  """
+  Write the Bonferroni interval and estimate of each term of <fit>, named
+  by <names> or by the 'names' of a fit returned by load_fit(), as the
+  LaTeX rows of alpha.dat, insignificant terms in red.
+  """
+  if names is None:
+    names = fit['names']
+  f = open(fn, 'w')
+  for n, a, c in zip(names, fit['ahat'], fit['ci']):
+    al = a-c
+    ah = a+c
+    if sign(al) != sign(ah):
+      strng = '\\color{red}%s & \\color{red}%.1e & \\color{red}%.1e & ' + \
+              '\\color{red}%.1e \\\\\n'
+    else:
+      strng = '%s & %.1e & %.1e & %.1e \\\\\n'
+    f.write(strng % (n, al, a, ah))
+  f.write('\n')
+  f.close()
+
+
+def write_stats(fn, fit, stats_yh):
+  """
+  Write the LaTeX rows of stats.dat : the statistics <stats_yh> of the
+  fitted values (see StreamStats.table()) and the fit statistics of <fit>.
+  """
+  vals = list(stats_yh) + [fit['R2'], fit['F'], fit['AIC'], fit['sighat']]
+  f = open(fn, 'w')
+  for n, s_yh in zip(STATS_NAMES, vals):
+    strng = '%s & %g \\\\\n' % (n, s_yh)
+    f.write(strng)
+  f.write('\n')
+  f.close()
+
+
+def write_comparison(fn, fits, labels):
+  """
+  Write the fits <fits> of several variants side by side as LaTeX rows to
+  <fn> : the estimate of each term in any of them, in the order of first
+  appearance, insignificant ones in red and absent ones as '--', then the
+  number of parameters, R^2, AIC and error variance of each.  The columns
+  are headed by <labels>.
+  """
+  terms = []
+  for fit in fits:
+    for n in fit['names']:
+      if n not in terms:
+        terms.append(n)
+
+  f = open(fn, 'w')
+  f.write(' & '.join(['term'] + list(labels)) + ' \\\\\n')
+  for n in terms:
+    row = [n]
+    for fit in fits:
+      k = [i for i,m in enumerate(fit['names']) if m == n]
+      if len(k) == 0:
+        row.append('--')
+        continue
+      a, c = fit['ahat'][k[0]], fit['ci'][k[0]]
+      if sign(a-c) != sign(a+c):
+        row.append('\\color{red}%.1e' % a)
+      else:
+        row.append('%.1e' % a)
+    f.write(' & '.join(row) + ' \\\\\n')
+  f.write('\n')
+  for n, k, fmt in [('$p$',              'ahat',   '%i'),
+                    ('$R^2$',            'R2',     '%.4f'),
+                    ('AIC',              'AIC',    '%.6g'),
+                    ('$\hat{\sigma}^2$', 'sighat', '%.6g')]:
+    if k == 'ahat': vals = [fmt % len(fit[k]) for fit in fits]
+    else:           vals = [fmt % fit[k] for fit in fits]
+    f.write(' & '.join([n] + vals) + ' \\\\\n')
+  f.write('\n')
+  f.close()
@@ -0,0 +1,228 @@
+import os
+import hashlib
+
+from numpy             import asarray, ascontiguousarray, float64
+
+from bedstats.transfer import mesh_hash
+
+# the container of the bed fields of a bed directory, written by
+# extract_bed.py :
+BED = 'bed.h5'
+
+
+def field_name(fn):
+  """
+  Return the name in the container of the field of the legacy DOLFIN XML
+  file <fn>, relative to the bed directory, e.g. 'bv/Ubar_5' for
+  'bv/Ubar_5.xml'.
+  """
+  return os.path.splitext(fn)[0]
+
+
+def values_hash(v):
+  """
+  Return the SHA-1 hex digest of the float64 values <v>.
+  """
+  return hashlib.sha1(ascontiguousarray(v, dtype=float64)).hexdigest()
+
+
+def create_bed(bed_dir, mesh):
+  """
+  Create the container of <bed_dir> holding the submesh <mesh>, written
+  by DOLFIN as the group 'mesh' so that BedFile.mesh() can read it back,
+  and return it open for writing the fields.  An existing container is
+  replaced.
+  """
+  from fenics import HDF5File
+  fn = os.path.join(bed_dir, BED)
+  f  = HDF5File(mesh.mpi_comm(), fn, 'w')
+  f.write(mesh, 'mesh')
+  f.close()
+  bf = BedFile(bed_dir, 'a')
+  bf.f.attrs['mesh_sha'] = mesh_hash(mesh)
+  return bf
+
+
+class BedFile(object):
+  """
+  The HDF5 container <bed_dir>/bed.h5 of the submesh and all the fields of
+  a bed directory, in place of one DOLFIN XML file per field, opened with
+  the h5py <mode>.
+
+  Each field is a dataset of the group 'fields', named as its legacy file
+  without the extension, of its values at the vertices of the submesh in
+  vertex order, so that they do not depend on the numbering of the
+  degrees of freedom.  The datasets are stored in chunks of <chunk>
+  values, shuffled and gzip-compressed at <level>, and carry the SHA-1 of
+  their values as the attribute 'sha', so that a FeatureStore can tell
+  which fields changed without reading them.  A field is only read when
+  asked for, by itself.
+  """
+  def __init__(self, bed_dir, mode='r', chunk=2**16, level=4):
+    import h5py
+    self.bed_dir = bed_dir
+    self.fn      = os.path.join(bed_dir, BED)
+    self.chunk   = chunk
+    self.level   = level
+    self.f       = h5py.File(self.fn, mode)
+
+  def close(self):
+    """
+    Close the file.
+    """
+    self.f.close()
+
+  def names(self):
+    """
+    Return the sorted names of the fields held.
+    """
+    if 'fields' not in self.f:
+      return []
+    vara = []
+    def visit(name, obj):
+      if not hasattr(obj, 'keys'):
+        vara.append(name)
+    self.f['fields'].visititems(visit)
+    return sorted(vara)
+
+  def has(self, name):
+    """
+    Return True if the field <name> is held.
+    """
+    return 'fields/' + name in self.f
+
+  def sha(self, name):
+    """
+    Return the SHA-1 of the values of the field <name>.
+    """
+    sha = self.f['fields/' + name].attrs['sha']
+    if isinstance(sha, bytes):
+      sha = sha.decode()
+    return str(sha)
+
+  def write(self, name, v):
+    """
+    Write the values <v> at the vertices of the submesh, in vertex order,
+    as the field <name>, replacing it if held.
+    """
+    v   = asarray(v, dtype=float64)
+    key = 'fields/' + name
+    if key in self.f:
+      del self.f[key]
+    d   = self.f.create_dataset(key, data=v,
+                                chunks=(min(self.chunk, len(v)),),
+                                compression='gzip',
+                                compression_opts=self.level, shuffle=True)
+    d.attrs['sha'] = values_hash(v)
+
+  def write_functions(self, fields):
+    """
+    Write the CG1 Functions of the (name, Function) pairs <fields>.
+    """
+    from fenics import vertex_to_dof_map
+    for name, f in fields:
+      v2d = vertex_to_dof_map(f.function_space())
+      self.write(name, f.vector().array()[v2d])
+
+  def read(self, name):
+    """
+    Return the values of the field <name> at the vertices of the submesh,
+    in vertex order.
+    """
+    return self.f['fields/' + name][:]
+
+  def check(self, mesh):
+    """
+    Raise a ValueError if <mesh> is not the submesh the fields are on.
+    """
+    if mesh_hash(mesh) != self.f.attrs['mesh_sha']:
+      raise ValueError("%s holds the fields of another submesh" % self.fn)
+
+  def read_dofs(self, name, Q):
+    """
+    Return the values of the field <name> as the degrees of freedom of the
+    CG1 space <Q> of the submesh.
+    """
+    from fenics import dof_to_vertex_map
+    return self.read(name)[dof_to_vertex_map(Q)]
+
+  def function(self, name, Q):
+    """
+    Return the field <name> as a Function on the CG1 space <Q> of the
+    submesh.
+    """
+    from fenics import Function
+    f = Function(Q)
+    f.vector().set_local(self.read_dofs(name, Q))
+    f.vector().apply('insert')
+    return f
+
+  def mesh(self):
+    """
+    Return the submesh held.
+    """
+    from fenics import Mesh, HDF5File, mpi_comm_world
+    mesh = Mesh()
+    f    = HDF5File(mpi_comm_world(), self.fn, 'r')
+    f.read(mesh, 'mesh', False)
+    f.close()
+    return mesh
+
+
+def open_bed(bed_dir, mode='r'):
+  """
+  Return the BedFile of <bed_dir>, or None if there is none.
+  """
+  if not os.path.exists(os.path.join(bed_dir, BED)):
+    return None
+  return BedFile(bed_dir, mode)
+
+
+def field_shas(bed_dir):
+  """
+  Return a dictionary of the SHA-1 of the values of each field held by
+  the container of <bed_dir>, empty if there is none.  The container is
+  closed again, so no handle outlives the call.
+  """
+  bf = open_bed(bed_dir)
+  if bf is None:
+    return {}
+  vara = dict((name, bf.sha(name)) for name in bf.names())
+  bf.close()
+  return vara
+
+
+def read_function(bed_dir, fn, Q):
+  """
+  Return the field of the legacy file <fn> of the bed directory <bed_dir>
+  as a Function on the CG1 space <Q> of its submesh, read from the
+  container if it holds it and from the DOLFIN XML file <fn> otherwise.
+  """
+  from fenics import Function, File
+  bf = open_bed(bed_dir)
+  if bf is not None and bf.has(field_name(fn)):
+    bf.check(Q.mesh())
+    f = bf.function(field_name(fn), Q)
+    bf.close()
+    return f
+  if bf is not None:
+    bf.close()
+  f = Function(Q)
+  File(os.path.join(bed_dir, fn)) >> f
+  return f
+
+
+def xml_to_bed(bed_dir, fns, Q):
+  """
+  Create the container of the bed directory <bed_dir> from its legacy XML
+  files <fns> of fields on the CG1 space <Q> of the submesh, converting a
+  directory written before the container; an existing container is
+  replaced.
+  """
+  from fenics import Function, File
+  bf = create_bed(bed_dir, Q.mesh())
+  f  = Function(Q)
+  for fn in fns:
+    File(os.path.join(bed_dir, fn)) >> f
+    bf.write_functions([(field_name(fn), f)])
+  bf.close()
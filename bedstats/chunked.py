@@ -0,0 +1,292 @@
+from numpy            import ones, zeros, hstack, vstack, column_stack, \
+                             sqrt, log, exp, dot, mean, var, inf, abs, sum, \
+                             ndim, asarray, load, float64
+from numpy.linalg     import norm, qr, LinAlgError
+from numpy.lib.format import open_memmap
+from scipy.linalg     import cho_factor
+from time             import time
+
+from bedstats.glm       import factor_solve, factor_inverse, \
+                               glm_statistics, scale_transform, \
+                               unscale_transform, factor_transform, \
+                               conditioning
+from bedstats.design    import LazyDesign
+from bedstats.telemetry import Telemetry
+
+
+def row_blocks(n, chunk):
+  """
+  Generate the (start, end) index pairs splitting <n> rows into blocks of
+  at most <chunk> rows.
+  """
+  for s in range(0, n, chunk):
+    yield s, min(s + chunk, n)
+
+
+def column_scale(X, w, chunk=2**16):
+  """
+  Return the means and standard deviations of the columns of the design
+  <X> weighted by the prior weights <w>, accumulated block-wise.  Constant
+  columns are given unit scale.
+  """
+  n,q = X.shape
+  s0  = 0.0
+  s1  = zeros(q)
+  s2  = zeros(q)
+  for s,e in row_blocks(n, chunk):
+    Xb  = asarray(X[s:e], dtype=float64)
+    if ndim(w) == 0: wb = w * ones(e-s)
+    else:            wb = asarray(w[s:e])
+    s0 += sum(wb)
+    s1 += dot(wb, Xb)
+    s2 += dot(wb, Xb**2)
+  m  = s1 / s0
+  sd = sqrt(abs(s2 / s0 - m**2))
+  sd[sd == 0] = 1.0
+  return m, sd
+
+
+def save_design(fn, x, chunk=2**16, dtype=float64):
+  """
+  Write the explanatory variables <x>, either a sequence of <p> length-<n>
+  columns as passed to glm() or a LazyDesign, to the file <fn> as an <n> x
+  <p> row-major matrix of <dtype> so that row blocks are contiguous on
+  disk.  The file is a .npy array if <fn> ends in '.npy', otherwise an HDF5
+  file with the matrix in the chunked, compressed dataset 'X'.  Rows are
+  copied <chunk> at a time, so only one block of the transposed matrix is
+  held in memory.  A float32 matrix halves the file and the reads of each
+  Newton iteration; glm_chunked() converts each block to float64.
+  """
+  if isinstance(x, LazyDesign):
+    n,p   = x.shape
+    block = lambda s,e: x[s:e]
+  else:
+    p     = len(x)
+    n     = len(x[0])
+    block = lambda s,e: column_stack([xi[s:e] for xi in x])
+  if fn.endswith('.npy'):
+    X = open_memmap(fn, mode='w+', dtype=dtype, shape=(n,p))
+    for s,e in row_blocks(n, chunk):
+      X[s:e] = block(s,e)
+    X.flush()
+    del X
+  else:
+    import h5py
+    f = h5py.File(fn, 'w')
+    X = f.create_dataset('X', (n,p), dtype=dtype,
+                         chunks=(min(chunk, n), p), compression='gzip')
+    for s,e in row_blocks(n, chunk):
+      X[s:e] = block(s,e)
+    f.close()
+
+
+def open_design(fn):
+  """
+  Open the design matrix written by save_design() to the file <fn> without
+  reading it into memory.  Returns a read-only memory map for .npy files,
+  or the h5py dataset 'X' otherwise; both support row slicing.
+  """
+  if fn.endswith('.npy'):
+    return load(fn, mmap_mode='r')
+  import h5py
+  return h5py.File(fn, 'r')['X']
+
+
+def weighted_r(X, y, w, ahat, m, sd, chunk=2**16):
+  """
+  Return the triangular factor R of W^{1/2} X for the design <X> with an
+  intercept column, its columns centred on <m> and scaled by <sd>, and the
+  IRLS weights of the log-link GLM of <y> with prior weights <w> at the
+  estimate <ahat>, or at the initial mean estimate if <ahat> is None,
+  taking one pass over blocks of <chunk> rows.
+  """
+  n    = X.shape[0]
+  sig  = var(y)
+  ybar = mean(y)
+  R    = zeros((0, X.shape[1] + 1))
+  for s,e in row_blocks(n, chunk):
+    Xb  = hstack((ones((e-s,1)), (asarray(X[s:e], dtype=float64) - m)/sd))
+    yb  = asarray(y[s:e])
+    if ahat is None: mub = (yb + ybar)/2.0
+    else:            mub = exp(dot(Xb, ahat))
+    if ndim(w) == 0: wb = w
+    else:            wb = asarray(w[s:e])
+    sw  = sqrt(wb*mub**2/sig)
+    R   = qr(vstack((R, Xb * sw[:,None])), mode='r')
+  return R
+
+
+def glm_chunked(X, y, w=1.0, chunk=2**16, solver='cholesky', rtol=1e-4,
+                dtol=1e-4, maxIter=65, a0=None, fac0=None, standardize=False,
+                telemetry=None, verbose=True):
+  """
+  Out-of-core version of glm() for the <n> x <p> design matrix <X>, an
+  on-disk matrix returned by open_design(), a LazyDesign, or any array
+  sliceable by rows, of any floating-point type; each block is converted
+  to float64, so the Gram matrix, the solve and the fitted values are in
+  double precision whatever the storage.  The intercept column is added
+  block by block.
+
+  Each Newton iteration is a single pass over blocks of <chunk> rows which
+  accumulates X^T W X (or, if <solver> is 'qr', updates the triangular
+  factor R of W^{1/2} X) and X^T W z, and at the same time evaluates the
+  deviance of the previous estimate, so the design matrix itself never
+  resides in memory beyond one <chunk> x <p> block.  The iterates, stopping
+  rule and returned dictionary are those of glm(), with the final
+  factorization added under 'fac' and the iteration count under 'nIter'.
+
+  If <a0> is given, the iteration is warm-started from these parameters
+  instead of from the data, and if <fac0> is also given (for instance the
+  downdated factor of a previous fit, see factor_downdate()) it is used for
+  the first Newton step in place of accumulating X^T W X.
+
+  As for factor(), if X^T W X is not positive definite to working
+  precision the Cholesky factorization falls back to QR, R being formed by
+  one more pass over the blocks and updated in place of X^T W X for the
+  remaining iterations.
+
+  <standardize> is as for glm(), the column means and standard deviations
+  taking one more pass; <a0>, <fac0> and the returned 'ahat' and 'fac'
+  refer to the original columns.
+
+  <telemetry> is as for glm(), the reading or evaluation of the design
+  blocks being timed as the 'read' phase.  A Newton iteration's record
+  holds its solve and the pass evaluating the new estimate.  <verbose> is
+  as for glm().
+  """
+  n,q    = X.shape
+  p      = q + 1                       # add one for intercept
+  tel    = telemetry or Telemetry()
+  tel.begin(fitter='glm_chunked', n=n, p=p, solver=solver, chunk=chunk,
+            standardize=standardize, warm=a0 is not None)
+  if standardize:
+    m, sd = column_scale(X, 1.0, chunk)
+    T     = scale_transform(m, sd)
+    if a0 is not None:
+      a0   = dot(unscale_transform(m, sd), a0)
+    if fac0 is not None:
+      fac0 = factor_transform(fac0, T)
+  else:
+    m, sd = zeros(q), ones(q)
+
+  sig    = var(y)                      # variance
+  ybar   = mean(y)
+  mu     = zeros(n)                    # fitted mean, filled block-wise
+
+  # Newton-Raphson :
+  converged = False
+  nIter     = 0
+  deviance  = 1
+  D         = 1
+  rel_res   = zeros(p)   # initial relative residual
+  if a0 is None:
+    ahat    = zeros(p)   # initial parameters
+  else:
+    ahat    = asarray(a0, dtype=float64).copy()
+
+  rel_a  = []
+  dev_a  = []
+  cond_a = []
+
+  while True:
+    XTWX = zeros((p,p))
+    XTWz = zeros(p)
+    R    = zeros((0,p))
+    D_n  = 0.0
+    for s,e in row_blocks(n, chunk):
+      t   = time()
+      Xb  = hstack((ones((e-s,1)), (asarray(X[s:e], dtype=float64) - m)/sd))
+      yb  = asarray(y[s:e])
+      t   = tel.add('read', t)
+      if nIter == 0 and a0 is None:
+        mub  = (yb + ybar)/2.0             # initial mean estimate
+        etab = log(mub)                    # initial predictor
+      else:
+        etab = dot(Xb, ahat)               # compute estimates
+        mub  = exp(etab)                   # linear predictor
+        mu[s:e] = mub
+        D_n += sum((yb - mub)**2)
+      t    = tel.add('predict', t)
+
+      if ndim(w) == 0: wb = w
+      else:            wb = asarray(w[s:e])
+      sw   = sqrt(wb*mub**2/sig)           # square root of the weights
+      z    = etab + (yb - mub)/mub         # adjusted dependent variable
+      t    = tel.add('weight', t)
+      Xw   = Xb * sw[:,None]
+      XTWz += dot(Xw.T, sw*z)
+      if nIter > 0 or fac0 is None:
+        if solver == 'qr':
+          R = qr(vstack((R, Xw)), mode='r')
+        else:
+          XTWX += dot(Xw.T, Xw)
+      tel.add('gram', t)
+
+    if nIter > 0:
+      deviance = abs(D_n - D)
+      D        = D_n
+      dev_a.append(deviance)
+
+      if rel_res < rtol or deviance < dtol: converged = True
+
+      if verbose:
+        string = "Newton iteration %d: d (abs) = %.2e, (tol = %.2e) r (rel) = %.2e (tol = %.2e)"
+        print(string % (nIter, deviance, dtol, rel_res, rtol))
+      tel.iteration(rel_res=rel_res, deviance=deviance, resid_norm=sqrt(D),
+                    cond=cond_a[-1])
+
+      if converged or nIter >= maxIter: break
+
+    elif a0 is not None:
+      D = D_n                              # deviance of the warm start
+
+    t = time()
+    if nIter == 0 and fac0 is not None:
+      fac = fac0
+    elif solver == 'qr':
+      fac = ('qr', R)
+    else:
+      try:
+        fac = ('cholesky', cho_factor(XTWX, lower=False))
+      except LinAlgError:
+        print("Cholesky factorization failed, falling back to QR")
+        if nIter == 0 and a0 is None: a = None
+        else:                         a = ahat
+        solver = 'qr'
+        fac    = ('qr', weighted_r(X, y, w, a, m, sd, chunk))
+    ahat_n  = factor_solve(fac, XTWz)
+    cond_a.append(conditioning(fac)[0])
+    tel.add('solve', t)
+
+    # calculate residual :
+    rel_res  = norm(ahat - ahat_n, inf)
+    rel_a.append(rel_res)
+    ahat     = ahat_n
+    nIter   += 1
+
+  if verbose:
+    print("condition number of X^T W X = %.2e" % cond_a[-1])
+
+  # the supplied factor only served as the first step; do not report it :
+  if fac is fac0:
+    try:
+      if solver == 'qr': fac = ('qr', R)
+      else:              fac = ('cholesky', cho_factor(XTWX, lower=False))
+    except LinAlgError:
+      print("Cholesky factorization failed, falling back to QR")
+      fac = ('qr', weighted_r(X, y, w, ahat, m, sd, chunk))
+
+  cov  = factor_inverse(fac)
+  vif  = conditioning(fac)[1]
+  if standardize:
+    ahat = dot(T, ahat)
+    cov  = dot(dot(T, cov), T.T)
+    fac  = factor_transform(fac, unscale_transform(m, sd))
+  vara = glm_statistics(ahat, cov, asarray(y), mu, sig, rel_a, dev_a)
+  vara['fac']    = fac
+  vara['nIter']  = nIter
+  vara['cond_a']    = cond_a
+  vara['vif']       = vif
+  vara['telemetry'] = tel.end(converged=converged, resid_norm=sqrt(D),
+                              AIC=vara['AIC'])
+  return vara
@@ -0,0 +1,144 @@
+from numpy         import empty, log, pi, dot, bincount, argmax, digitize, \
+                          percentile, linspace, asarray, ones, ndim, float64
+from scipy.spatial import cKDTree
+
+from bedstats.chunked import row_blocks
+
+
+def class_edges(beta, k):
+  """
+  Return the <k>-1 inner edges splitting the friction <beta> into <k>
+  classes of equal count.
+  """
+  return percentile(beta, linspace(0, 100, k+1)[1:-1])
+
+
+def classify(beta, edges):
+  """
+  Return the class, 0 to len(<edges>), of each value of <beta>.
+  """
+  return digitize(beta, edges)
+
+
+class GaussianNaiveBayes(object):
+  """
+  Gaussian naive Bayes classifier of the rows of an <n> x <p> attribute
+  array into the classes 0 to <k>-1.  Each attribute is normal with a
+  mean and variance per class, the attributes independent given the class.
+  Every variance is increased by <smooth> times the largest attribute
+  variance so that a constant attribute of a class does not dominate.
+
+  Training takes one weighted bincount per attribute.  The class log-
+  likelihoods of a block of rows are the quadratic
+
+    -1/2 sum_j (x_j - m_cj)^2 / s_cj = -1/2 x^2 . (1/s_c) + x . (m_c/s_c)
+                                       - 1/2 sum_j m_cj^2 / s_cj,
+
+  formed with two matrix products per block of <chunk> rows.
+  """
+  def __init__(self, k, smooth=1e-9, chunk=2**16):
+    self.k      = k
+    self.smooth = smooth
+    self.chunk  = chunk
+
+  def fit(self, X, c, w=1.0):
+    """
+    Estimate the class priors, means and variances from the attributes <X>
+    of the rows of classes <c> with prior weights <w>.
+    """
+    X      = asarray(X, dtype=float64)
+    n,p    = X.shape
+    if ndim(w) == 0:
+      w = w * ones(n)
+    k      = self.k
+    N      = bincount(c, weights=w, minlength=k)
+    m      = empty((k,p))
+    s      = empty((k,p))
+    for j in range(p):
+      m[:,j] = bincount(c, weights=w*X[:,j],    minlength=k) / N
+      s[:,j] = bincount(c, weights=w*X[:,j]**2, minlength=k) / N - m[:,j]**2
+    s     += self.smooth * X.var(axis=0).max()
+    self.prior = log(N / N.sum())
+    self.m     = m
+    self.s     = s
+    self.const = self.prior - 0.5 * (log(2*pi*s) + m**2/s).sum(axis=1)
+    return self
+
+  def log_likelihood(self, X):
+    """
+    Return the <n> x <k> joint log-likelihoods of the classes and the rows
+    of <X>.
+    """
+    n   = X.shape[0]
+    L   = empty((n, self.k))
+    A   = -0.5 / self.s
+    B   = self.m / self.s
+    for s,e in row_blocks(n, self.chunk):
+      Xb     = asarray(X[s:e], dtype=float64)
+      L[s:e] = dot(Xb**2, A.T) + dot(Xb, B.T) + self.const
+    return L
+
+  def predict(self, X):
+    """
+    Return the most probable class of each row of <X>.
+    """
+    return argmax(self.log_likelihood(X), axis=1)
+
+
+class KNNRegressor(object):
+  """
+  Nearest-neighbour regression of the friction on the attributes : the
+  prediction at a row is the mean response of the <k> training rows
+  nearest to it, the attributes scaled by their training standard
+  deviations so that the distance weighs them alike.  The training rows
+  are held in a k-d tree, queried <chunk> rows at a time.
+  """
+  def __init__(self, k=10, chunk=2**16):
+    self.k     = k
+    self.chunk = chunk
+
+  def fit(self, X, y):
+    """
+    Build the k-d tree of the attributes <X> of the responses <y>.
+    """
+    X          = asarray(X, dtype=float64)
+    self.sd    = X.std(axis=0)
+    self.sd[self.sd == 0] = 1.0
+    self.tree  = cKDTree(X / self.sd)
+    self.y     = asarray(y, dtype=float64)
+    return self
+
+  def predict(self, X):
+    """
+    Return the mean response of the nearest training rows of each row of
+    <X>.
+    """
+    n    = X.shape[0]
+    yhat = empty(n)
+    for s,e in row_blocks(n, self.chunk):
+      Xb      = asarray(X[s:e], dtype=float64) / self.sd
+      d, i    = self.tree.query(Xb, self.k)
+      if self.k == 1: yhat[s:e] = self.y[i]
+      else:           yhat[s:e] = self.y[i].mean(axis=1)
+    return yhat
+
+
+def confusion_matrix(c, chat, k):
+  """
+  Return the <k> x <k> matrix of the number of rows of true class <c>
+  (row) assigned the class <chat> (column).
+  """
+  return bincount(asarray(c) * k + asarray(chat),
+                  minlength=k*k).reshape(k,k)
+
+
+def print_confusion(C, name, t_fit, t_pred):
+  """
+  Print the confusion matrix <C> of the classifier <name> with its
+  accuracy and the times <t_fit> and <t_pred> taken to train and predict.
+  """
+  acc = C.trace() / float(C.sum())
+  print("%s : accuracy %.3f, trained in %.2f s, predicted in %.2f s"
+        % (name, acc, t_fit, t_pred))
+  for i,row in enumerate(C):
+    print("  %2d : " % i + ' '.join(['%8d' % v for v in row]))
@@ -0,0 +1,482 @@
+from numpy           import zeros, arange, asarray, atleast_2d, exp, log, \
+                            abs, sum, dot, where, minimum, maximum, clip, \
+                            isfinite, nan, hstack, bincount, sqrt, \
+                            column_stack, flatnonzero, sign, float64
+from scipy.special   import gammaln, digamma, polygamma, xlogy
+from scipy.stats     import distributions
+
+chi2sf = distributions.chi2.sf
+
+# candidate families : Poisson, negative binomial and their zero-inflated
+# versions :
+FAMILIES = ['poisson', 'nbinom', 'zip', 'zinb']
+
+# number of free parameters of each family :
+NPARAM   = {'poisson' : 1,
+            'nbinom'  : 2,
+            'zip'     : 2,
+            'zinb'    : 3}
+
+# nested pairs compared by lr_test() in gof_all() :
+NESTED   = [('poisson', 'nbinom'),
+            ('poisson', 'zip'),
+            ('nbinom',  'zinb'),
+            ('zip',     'zinb')]
+
+# negative binomial sizes at least this are taken as Poisson :
+RMAX     = 1e8
+
+# zero inflations below this are taken as none :
+PIMIN    = 1e-8
+
+
+def frequencies(x, K=None):
+  """
+  Return the S x <K> table of the number of times each count 0 to <K>-1
+  occurs in each of the S series of non-negative integer counts <x>, either
+  an n x S array, one series per column, or a list of S arrays of any
+  length.  <K> is by default one more than the largest count; larger
+  counts are not tabulated.  All the series are tabulated by one bincount.
+  """
+  if isinstance(x, list):
+    xs = x
+  else:
+    x  = atleast_2d(asarray(x).T)
+    xs = list(x)
+  if K is None:
+    K = int(max([xi.max() for xi in xs])) + 1
+  idx = hstack([i*K + asarray(xi, dtype=int) for i,xi in enumerate(xs)])
+  ok  = hstack([asarray(xi) < K for xi in xs])
+  return bincount(idx[ok], minlength=len(xs)*K).reshape(len(xs), K) \
+         .astype(float64)
+
+
+def poisson_logpmf(k, mu):
+  """
+  Return the Poisson log-probabilities of the counts <k> (a row) for the
+  means <mu> (a column).
+  """
+  return xlogy(k, mu) - mu - gammaln(k + 1)
+
+
+def nbinom_logpmf(k, mu, r):
+  """
+  Return the negative binomial log-probabilities of the counts <k> (a row)
+  for the means <mu> and sizes <r> (columns), the variance being
+  mu + mu^2/r; sizes of RMAX or more give the Poisson limit.
+  """
+  rf = minimum(r, RMAX)
+  L  = gammaln(k + rf) - gammaln(rf) - gammaln(k + 1) \
+       + rf * log(rf / (rf + mu)) + xlogy(k, mu / (rf + mu))
+  return where(r >= RMAX, poisson_logpmf(k, mu), L)
+
+
+def nbinom_size(F, mu, r0=None, tol=1e-10, maxIter=100):
+  """
+  Return the maximum likelihood negative binomial sizes r of the frequency
+  tables <F> (one series per row) with means <mu>, by Newton's method on
+  the profile score in log r,
+
+    sum_k F_k (digamma(k + r) - digamma(r)) + N log(r / (r + mu)) = 0,
+
+  run on all the series at once from the moment estimates, or <r0> where
+  it is below RMAX, each series leaving the iteration once it has
+  converged.  Where the profile is not concave, as it is above its
+  maximum, a unit step is taken uphill instead.  Series not over-
+  dispersed get RMAX.
+  """
+  S,K = F.shape
+  k   = arange(K)
+  N   = F.sum(axis=1)
+  v   = sum(F * (k - mu[:,None])**2, axis=1) / maximum(N - 1, 1)
+  rm  = where(v > mu, mu**2 / maximum(v - mu, 1e-300), RMAX)
+  if r0 is None:
+    r0 = rm
+  else:
+    r0 = where(asarray(r0) < RMAX, r0, rm)
+  t   = log(clip(r0, 1e-8, RMAX))
+  od  = (v > mu) & (mu > 0)
+  act = flatnonzero(od)
+  for i in range(maxIter):
+    if len(act) == 0:
+      break
+    m   = mu[act]
+    r   = exp(t[act])
+    s   = sum(F[act] * (digamma(k + r[:,None]) - digamma(r)[:,None]), axis=1) \
+          + N[act] * log(r / (r + m))
+    ds  = sum(F[act] * (polygamma(1, k + r[:,None])
+                        - polygamma(1, r)[:,None]), axis=1) \
+          + N[act] * m / (r * (r + m))
+    h   = r * ds
+    dt  = clip(where(h < 0, s / where(h < 0, h, -1.0), -sign(s)), -2.0, 2.0)
+    dt  = where(isfinite(dt), dt, 0.0)
+    t[act] = clip(t[act] - dt, log(1e-8), log(RMAX))
+    act = act[abs(dt) >= tol]
+  r = exp(t)
+  r[~od | (r >= RMAX)] = RMAX
+  return r
+
+
+def loglik(F, lp):
+  """
+  Return the log-likelihoods of the frequency tables <F> (one series per
+  row) under the log-probabilities <lp>, empty bins contributing nothing
+  even if impossible.
+  """
+  return sum(where(F > 0, F * lp, 0.0), axis=1)
+
+
+def fit_base(F, family, r0=None):
+  """
+  Return the parameters of the maximum likelihood Poisson or negative
+  binomial fit to each row of the frequency tables <F> and the S x K
+  log-probabilities of the counts tabulated.
+  """
+  k  = arange(F.shape[1])
+  mu = dot(F, k) / F.sum(axis=1)
+  if family == 'poisson':
+    return {'mu' : mu}, poisson_logpmf(k, mu[:,None])
+  r  = nbinom_size(F, mu, r0)
+  return {'mu' : mu, 'r' : r}, nbinom_logpmf(k, mu[:,None], r[:,None])
+
+
+def zi_logpmf(theta, base, K):
+  """
+  Return the S x <K> log-probabilities of the counts 0 to <K>-1 of the
+  <base> family of the zero-inflated parameters <theta>, the columns pi,
+  mu and, for the negative binomial, r of one row per series.
+  """
+  k = arange(K)
+  if base == 'poisson':
+    return poisson_logpmf(k, theta[:,1:2])
+  return nbinom_logpmf(k, theta[:,1:2], theta[:,2:3])
+
+
+def overdispersed(F):
+  """
+  Return whether the variance of each row of the frequency tables <F>
+  exceeds its mean, the condition for a finite maximum likelihood negative
+  binomial size.
+  """
+  k  = arange(F.shape[1])
+  N  = F.sum(axis=1)
+  mu = dot(F, k) / N
+  v  = sum(F * (k - mu[:,None])**2, axis=1) / N
+  return (v > mu) & (mu > 0)
+
+
+def zi_split(F, N, theta, lp):
+  """
+  Return the E step of the zero-inflated fit <theta> (see zi_logpmf()),
+  with log-probabilities <lp>, to the frequency tables <F> of <N> counts :
+  the tables with the zeros attributed to the point mass, in proportion
+  to its posterior probability, removed, and the updated pi.
+  """
+  pi       = theta[:,0]
+  z        = pi / (pi + (1 - pi) * exp(lp[:,0]))
+  Fa       = F.copy()
+  Fa[:,0] *= 1 - z
+  return Fa, F[:,0] * z / N
+
+
+def zi_step(F, N, theta, lp, base):
+  """
+  Return the parameters <theta> (see zi_logpmf()) and log-probabilities of
+  the zero-inflated <base> family to the frequency tables <F> of <N>
+  counts after one EM step from <theta> and its log-probabilities <lp> :
+  the E step of zi_split(), and the base family refit to the tables
+  it leaves.
+  """
+  Fa, pi   = zi_split(F, N, theta, lp)
+  r0       = theta[:,2] if base == 'nbinom' else None
+  prm, lp  = fit_base(Fa, base, r0)
+  cols     = [pi, prm['mu']]
+  if base == 'nbinom':
+    cols.append(prm['r'])
+  return column_stack(cols), lp
+
+
+def zi_extrapolate(t0, t1, t2, a=None, umax=2.0):
+  """
+  Return the SQUAREM extrapolation of the successive EM iterates <t0>,
+  <t1>, <t2> of zi_step(), taken in logit pi and the logarithms of mu and
+  r, and the step lengths <a> of the series.  The default steps are
+  -max(1, |r|/|v|) for the first and second differences r and v; a step
+  of -1 gives <t2>.  The extrapolation is kept within <umax> of <t2> in
+  each transformed parameter, as the likelihood is flat towards r = RMAX
+  and EM does not return from far out on it.
+  """
+  lo = [PIMIN, 1e-300, 1e-8][:t0.shape[1]]
+  hi = [1 - 1e-12, 1e300, RMAX][:t0.shape[1]]
+  def u(t):
+    t = clip(t, lo, hi)
+    return hstack((log(t[:,:1] / (1 - t[:,:1])), log(t[:,1:])))
+  u0, u1, u2 = u(t0), u(t1), u(t2)
+  r  = u1 - u0
+  v  = u2 - u1 - r
+  if a is None:
+    nv = sqrt(sum(v**2, axis=1))
+    a  = -maximum(1.0, sqrt(sum(r**2, axis=1)) / where(nv > 0, nv, 1.0))
+  ue = clip(u0 - 2*a[:,None]*r + a[:,None]**2 * v, u2 - umax, u2 + umax)
+  te = clip(hstack((1 / (1 + exp(-ue[:,:1])), exp(ue[:,1:]))), lo, hi)
+  return te, a
+
+
+def fit_counts(F, family, tol=1e-8, maxIter=500, fits=None):
+  """
+  Fit the count <family> of FAMILIES by maximum likelihood to every row of
+  the frequency tables <F>, e.g. from frequencies(), at once.  The zero-
+  inflated families, a point mass pi at zero mixed with the Poisson or
+  negative binomial, are fit by EM, each M step refitting the base family
+  to the tables with the zeros attributed to the point mass removed (see
+  zi_step()).  EM crawls along the ridge of the likelihood between pi and
+  the dispersion, so it is accelerated by SQUAREM : each cycle takes two
+  EM steps, extrapolates along them (see zi_extrapolate()) and takes one
+  more step from there, keeping the extrapolation only where it does not
+  lower the likelihood.  A series leaves the iteration once its
+  log-likelihood changes by less than <tol> relatively over a cycle, or
+  once its zero inflation falls below PIMIN.
+
+  The zero-inflated negative binomial is compared with the fits of its
+  two boundary families, the negative binomial and the zero-inflated
+  Poisson, taken from the dictionary <fits> by family if it holds them,
+  as in gof_all(), and fit otherwise.
+
+  Returns a dictionary with the 'family', the number of parameters
+  'nparam', the parameter arrays 'mu', 'r' (negative binomial sizes) and
+  'pi' (zero inflation) as fit, the log-likelihoods 'L' and the S x (K+1)
+  probabilities 'prob' of the counts 0 to K-1 and of K or more.
+  """
+  F    = atleast_2d(asarray(F, dtype=float64))
+  N    = F.sum(axis=1)
+  K    = F.shape[1]
+  base = {'zip' : 'poisson', 'zinb' : 'nbinom'}.get(family, family)
+  prm, lp = fit_base(F, base)
+  pi   = zeros(len(N))
+
+  if family in ['zip', 'zinb']:
+    g0   = exp(lp[:,0])
+    f0   = F[:,0] / N
+    pi   = clip((f0 - g0) / (1 - g0), 0.0, 1.0)
+    pi[~isfinite(pi)] = 0.0
+    L    = zi_loglik(F, pi, lp)
+    cols = [pi, prm['mu']]
+    if base == 'nbinom':
+      cols.append(prm['r'])
+    theta = column_stack(cols)
+    act  = flatnonzero(pi >= PIMIN)
+    for i in range(maxIter):
+      if len(act) == 0:
+        break
+      Fa, Na   = F[act], N[act]
+      t1, lp1  = zi_step(Fa, Na, theta[act], lp[act], base)
+      t2, lp2  = zi_step(Fa, Na, t1, lp1, base)
+      L2       = zi_loglik(Fa, t2[:,0], lp2)
+
+      # halve the steps towards EM where the extrapolation loses, or would
+      # leave tables that are not overdispersed, sending r to RMAX where EM
+      # is trapped at the zero-inflated Poisson fit (compared below in any
+      # case) :
+      te, a    = zi_extrapolate(theta[act], t1, t2)
+      for j in range(8):
+        lpe    = zi_logpmf(te, base, K)
+        bad    = ~(zi_loglik(Fa, te[:,0], lpe) >= L2)
+        if base == 'nbinom':
+          bad |= ~overdispersed(zi_split(Fa, Na, te, lpe)[0]) \
+                 & (t2[:,2] < RMAX)
+        if not bad.any():
+          break
+        a[bad] = minimum((a[bad] - 1) / 2, -1.0)
+        te, a  = zi_extrapolate(theta[act], t1, t2, a)
+      t3, lp3  = zi_step(Fa, Na, te, lpe, base)
+      L3       = zi_loglik(Fa, t3[:,0], lp3)
+      up       = L3 >= L2
+      if base == 'nbinom':
+        up    &= (t3[:,2] < RMAX) | (t2[:,2] >= RMAX)
+      t2[up]   = t3[up]
+      lp2[up]  = lp3[up]
+      L2[up]   = L3[up]
+      conv     = abs(L2 - L[act]) < tol * abs(L2)
+      theta[act] = t2
+      lp[act]  = lp2
+      L[act]   = L2
+      act      = act[~conv & (t2[:,0] >= PIMIN)]
+    pi        = theta[:,0]
+    prm['mu'] = theta[:,1]
+    if base == 'nbinom':
+      prm['r'] = theta[:,2]
+
+    # the likelihood of the zero-inflated negative binomial is flat towards
+    # the boundaries pi = 0 and r = RMAX, so each series keeps the better
+    # of its fit and those of the two families on them :
+    if family == 'zinb':
+      for sub in ['nbinom', 'zip']:
+        if fits is not None and sub in fits:
+          fs = fits[sub]
+        else:
+          fs = fit_counts(F, sub, tol, maxIter)
+        up      = fs['L'] > L
+        L[up]   = fs['L'][up]
+        pi[up]  = fs['pi'][up]
+        prm['mu'][up] = fs['mu'][up]
+        prm['r'][up]  = fs['r'][up] if sub == 'nbinom' else RMAX
+      lp = nbinom_logpmf(arange(K), prm['mu'][:,None], prm['r'][:,None])
+  else:
+    L = loglik(F, lp)
+
+  P        = exp(lp) * (1 - pi)[:,None]
+  P[:,0]  += pi
+  prob     = hstack((P, maximum(1 - P.sum(axis=1), 0.0)[:,None]))
+
+  vara = {'family' : family,
+          'nparam' : NPARAM[family],
+          'pi'     : pi,
+          'L'      : L,
+          'prob'   : prob}
+  vara.update(prm)
+  return vara
+
+
+def zi_loglik(F, pi, lp):
+  """
+  Return the log-likelihoods of the frequency tables <F> under the zero
+  inflation <pi> of the base log-probabilities <lp>.
+  """
+  L0 = xlogy(F[:,0], pi + (1 - pi) * exp(lp[:,0]))
+  return L0 + loglik(F[:,1:], lp[:,1:] + log(1 - pi)[:,None])
+
+
+def merge_bins(O, E, minExp=5.0):
+  """
+  Merge the adjacent bins of the observed <O> and expected <E> frequencies
+  (one series per row) from the left until each group expects at least
+  <minExp>, the remainder joining the last group.  The columns are scanned
+  once for all the series together.
+
+  Returns the chi-square statistics X^2 = sum (O - E)^2 / E, the
+  likelihood-ratio (G) statistics 2 sum O log(O / E) and the number of
+  groups of each series.
+  """
+  S,K  = O.shape
+  aO   = zeros(S)
+  aE   = zeros(S)
+  lO   = zeros(S)
+  lE   = zeros(S)
+  X2   = zeros(S)
+  G    = zeros(S)
+  nb   = zeros(S, dtype=int)
+  x2   = lambda o,e: where(e > 0, (o - e)**2 / where(e > 0, e, 1), 0.0)
+  g    = lambda o,e: 2 * (xlogy(o, o) - xlogy(o, e))
+  for j in range(K):
+    aO  += O[:,j]
+    aE  += E[:,j]
+    done = aE >= minExp
+    X2  += where(done, x2(aO, aE), 0.0)
+    G   += where(done, g(aO, aE),  0.0)
+    nb  += done
+    lO   = where(done, aO, lO)
+    lE   = where(done, aE, lE)
+    aO   = where(done, 0.0, aO)
+    aE   = where(done, 0.0, aE)
+
+  # the remainder expecting less than <minExp> joins the last group :
+  rest = (aE > 0) | (aO > 0)
+  join = rest & (nb > 0)
+  X2  += where(join, x2(lO + aO, lE + aE) - x2(lO, lE), 0.0)
+  G   += where(join, g(lO + aO, lE + aE) - g(lO, lE),   0.0)
+  X2  += where(rest & (nb == 0), x2(aO, aE), 0.0)
+  G   += where(rest & (nb == 0), g(aO, aE),  0.0)
+  nb  += rest & (nb == 0)
+  return X2, G, nb
+
+
+def chi2_test(F, fit, minExp=5.0):
+  """
+  Chi-square and likelihood-ratio (G) goodness-of-fit tests of the fit
+  <fit> of fit_counts() to every row of the frequency tables <F>, with the
+  bins expecting fewer than <minExp> merged by merge_bins().  The degrees
+  of freedom are the number of groups less one less the number of fitted
+  parameters.
+
+  Returns a dictionary of the statistics 'X2' and 'G', the numbers of
+  groups 'bins', the degrees of freedom 'dof' and the p-values 'p_X2' and
+  'p_G', nan where no degrees of freedom remain.
+  """
+  F    = atleast_2d(asarray(F, dtype=float64))
+  N    = F.sum(axis=1)
+  O    = hstack((F, zeros((len(N), 1))))
+  E    = fit['prob'] * N[:,None]
+  X2, G, nb = merge_bins(O, E, minExp)
+  dof  = nb - 1 - fit['nparam']
+  ok   = dof > 0
+  vara = {'X2'   : X2,
+          'G'    : G,
+          'bins' : nb,
+          'dof'  : dof,
+          'p_X2' : where(ok, chi2sf(X2, maximum(dof, 1)), nan),
+          'p_G'  : where(ok, chi2sf(G,  maximum(dof, 1)), nan)}
+  return vara
+
+
+def lr_test(fit0, fit1):
+  """
+  Likelihood-ratio tests of the fits <fit0> within the larger nested fits
+  <fit1> of fit_counts().  The extra parameters of every nested pair in
+  FAMILIES lie on the boundary of their space under the smaller model, so
+  the statistic is referred to the equal mixture of chi-square
+  distributions with one fewer and as many degrees of freedom as extra
+  parameters.  Returns the statistics and p-values.
+  """
+  df = fit1['nparam'] - fit0['nparam']
+  LR = maximum(2 * (fit1['L'] - fit0['L']), 0.0)
+  p  = 0.5 * chi2sf(LR, df)
+  if df > 1:
+    p += 0.5 * chi2sf(LR, df - 1)
+  else:
+    p += 0.5 * (LR == 0)
+  return LR, p
+
+
+def gof_all(F, families=FAMILIES, minExp=5.0):
+  """
+  Fit every family of <families> to every row of the frequency tables <F>
+  and test each fit with chi2_test(), the zero-inflated negative binomial
+  reusing the fits of its boundary families (see fit_counts()).  Returns
+  a dictionary of the fits by family, each with its tests and information
+  criteria 'AIC' and 'BIC' added, and under 'lr' the likelihood-ratio
+  tests lr_test() of the nested pairs of NESTED among them.
+  """
+  F    = atleast_2d(asarray(F, dtype=float64))
+  N    = F.sum(axis=1)
+  vara = {}
+  for fam in families:
+    fit = fit_counts(F, fam, fits=vara)
+    fit.update(chi2_test(F, fit, minExp))
+    fit['AIC'] = -2*fit['L'] + 2*fit['nparam']
+    fit['BIC'] = -2*fit['L'] + log(N)*fit['nparam']
+    vara[fam]  = fit
+  vara['lr'] = {}
+  for a,b in NESTED:
+    if a in vara and b in vara:
+      vara['lr'][(a,b)] = lr_test(vara[a], vara[b])
+  return vara
+
+
+def print_gof(gof, i=0, names=None):
+  """
+  Print the fits and tests of series <i> of the result <gof> of gof_all(),
+  labelled by <names>[<i>] if given.
+  """
+  if names is not None:
+    print(names[i])
+  print("%-8s %12s %12s %10s %4s %10s %10s" % ('family', 'L', 'AIC', 'X2',
+                                               'dof', 'p(X2)', 'p(G)'))
+  for fam in FAMILIES:
+    if fam not in gof:
+      continue
+    f = gof[fam]
+    print("%-8s %12.6g %12.6g %10.4g %4d %10.4g %10.4g"
+          % (fam, f['L'][i], f['AIC'][i], f['X2'][i], f['dof'][i],
+             f['p_X2'][i], f['p_G'][i]))
+  for (a,b), (LR, p) in sorted(gof['lr'].items()):
+    print("LR %s in %s : %.4g, p = %.4g" % (a, b, LR[i], p[i]))
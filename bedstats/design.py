@@ -0,0 +1,113 @@
+from numpy import empty, zeros, ones, dot, sqrt, asarray, ndim, float64
+
+
+class LazyDesign(object):
+  """
+  Design matrix whose columns are the explanatory terms <terms>, each
+  either the index of one of the base variables <base> or a list of
+  indices whose product forms an interaction term, as in the <ii_int>
+  expansion of linear_model_n.py.  <base> may be a list or a dictionary
+  of equal-length arrays; only references to the variables used by
+  <terms> are kept and no product column is ever stored.  <names> are the
+  LaTeX names of the base variables used to label the terms.  <n> is the
+  number of rows, by default the length of the base variables; <terms>
+  may be empty, as for the intercept-only model.
+
+  Row slices X[s:e] evaluate the expanded <e-s> x <p> block on demand, so
+  the object may be passed in place of the on-disk matrix to
+  glm_chunked(), and the Gram-matrix and prediction kernels below work
+  one block of rows at a time.  The intercept column is not included.
+  """
+  def __init__(self, base, terms, names=None, chunk=2**16, n=None):
+    self.terms = [list(i) if type(i) == list else [i] for i in terms]
+    self.base  = {}
+    for i in self.terms:
+      for j in i:
+        self.base[j] = base[j]
+    self.names = names
+    self.chunk = chunk
+    if n is None and type(base) == dict:
+      n = len(list(base.values())[0])
+    elif n is None:
+      n = len(base[0])
+    self.n     = n
+    self.shape = (self.n, len(self.terms))
+
+  def __getitem__(self, rows):
+    """
+    Return the dense block of the expanded columns at the row slice <rows>.
+    """
+    b   = {}
+    for j in self.base:
+      b[j] = asarray(self.base[j][rows], dtype=float64)
+    m   = len(range(self.n)[rows])
+    blk = empty((m, len(self.terms)))
+    for k,i in enumerate(self.terms):
+      blk[:,k] = b[i[0]]
+      for j in i[1:]:
+        blk[:,k] *= b[j]
+    return blk
+
+  def blocks(self):
+    """
+    Generate the tuples (s, e, block) covering all rows in blocks of at
+    most <chunk> rows.
+    """
+    for s in range(0, self.n, self.chunk):
+      e = min(s + self.chunk, self.n)
+      yield s, e, self[s:e]
+
+  def term_names(self):
+    """
+    Return the list of term names, with interaction terms joined by a star
+    as in the <ex_n> list of linear_model_n.py.
+    """
+    ex_n = []
+    for i in self.terms:
+      ex_n.append(r'$ \star $'.join([self.names[j] for j in i]))
+    return ex_n
+
+  def column(self, k):
+    """
+    Return the full column of term <k>.
+    """
+    x = asarray(self.base[self.terms[k][0]], dtype=float64).copy()
+    for j in self.terms[k][1:]:
+      x *= self.base[j]
+    return x
+
+  def select(self, cols):
+    """
+    Return a new LazyDesign with only the terms at indices <cols>, sharing
+    the base variables of this one; if <cols> is empty, the design of the
+    intercept-only model.
+    """
+    terms = [self.terms[k] for k in cols]
+    return LazyDesign(self.base, terms, self.names, self.chunk, self.n)
+
+  def gram(self, w=1.0):
+    """
+    Return X^T W X for the design with an intercept column and diagonal
+    weights <w>, accumulated block-wise.
+    """
+    p    = self.shape[1] + 1
+    XTWX = zeros((p,p))
+    for s,e,blk in self.blocks():
+      if ndim(w) == 0: sw = sqrt(w)
+      else:            sw = sqrt(asarray(w[s:e]))[:,None]
+      Xw    = empty((e-s, p))
+      Xw[:,0]  = 1.0
+      Xw[:,1:] = blk
+      Xw   *= sw
+      XTWX += dot(Xw.T, Xw)
+    return XTWX
+
+  def dot(self, ahat):
+    """
+    Return the linear predictor <ahat>[0] + X <ahat>[1:], evaluated
+    block-wise.
+    """
+    eta = empty(self.n)
+    for s,e,blk in self.blocks():
+      eta[s:e] = ahat[0] + dot(blk, ahat[1:])
+    return eta
@@ -0,0 +1,198 @@
+from numpy             import histogram, histogram2d, linspace, arange, \
+                              hstack, sort, partition, interp, zeros, sqrt, \
+                              sum, asarray
+from numpy.random      import RandomState
+from scipy.stats       import distributions, probplot
+from scipy.interpolate import interp1d
+from matplotlib.colors import colorConverter
+from matplotlib.pyplot import figure, tight_layout, savefig, close
+
+
+def hist_density(ax, x, bins=300, range=None, **kwargs):
+  """
+  Draw on the axes <ax> the normalized histogram of <x> with <bins> equal
+  bins over <range> (default, the extremes of <x>), as ax.hist(x, bins,
+  normed=True, **kwargs) would, but binning the data with numpy first so
+  that matplotlib only receives the <bins> bar heights.
+  """
+  if range is None:
+    range = (x.min(), x.max())
+  dens, edges = histogram(x, bins, range=range, density=True)
+  return ax.hist(edges[:-1], edges, weights=dens, **kwargs)
+
+
+def scatter_density(ax, x, y, xlim, ylim, color='k', alpha=0.1, shape=None):
+  """
+  Draw on the axes <ax> the points <x>, <y> within <xlim> and <ylim> as
+  an image of one pixel per bin, in place of ax.plot(x, y, '.',
+  alpha=<alpha>).  Overplotting c points of opacity <alpha> gives the
+  opacity 1 - (1 - <alpha>)^c, so the bin counts are mapped to that.
+  The raster is <shape> = (columns, rows) bins, by default the size of the
+  axes in pixels, so the figure costs the same for any number of points.
+  """
+  if shape is None:
+    box   = ax.get_window_extent()
+    shape = (max(int(box.width), 1), max(int(box.height), 1))
+  c, xe, ye = histogram2d(x, y, shape, range=[xlim, ylim])
+  img       = zeros((shape[1], shape[0], 4))
+  img[:,:,:3] = colorConverter.to_rgb(color)
+  img[:,:,3]  = 1 - (1 - alpha)**c.T
+  ax.imshow(img, extent=(xlim[0], xlim[1], ylim[0], ylim[1]), origin='lower',
+            aspect='auto', interpolation='nearest')
+  ax.set_xlim(xlim)
+  ax.set_ylim(ylim)
+
+
+def order_medians(i, n):
+  """
+  Return Filliben's estimate of the medians of the uniform order statistics
+  of ranks <i> (1 to <n>) in a sample of <n>, as scipy's probplot() uses.
+  """
+  i = asarray(i, dtype=float)
+  m = (i - 0.3175) / (n + 0.365)
+  m[i == n] = 0.5**(1.0/n)
+  m[i == 1] = 1 - 0.5**(1.0/n)
+  return m
+
+
+def probplot_sample(x, size=20000, tails=1000, seed=0):
+  """
+  Return the normal quantile plot of <x> as scipy.stats.probplot(x) :
+  ((osm, osr), (slope, intercept, r)), from at most 2 <tails> + <size>
+  points.  The <tails> smallest and largest values are found exactly by
+  partition; the quantiles between them are interpolated in the sorted
+  random subsample of <size> values at evenly spaced ranks.  The least
+  squares line and correlation weight each point by the number of ranks it
+  stands for.
+  """
+  n = len(x)
+  if n <= size + 2*tails:
+    return probplot(x)
+  lo  = sort(partition(x, tails - 1)[:tails])
+  hi  = sort(partition(x, n - tails)[n - tails:])
+  s   = sort(x[RandomState(seed).randint(0, n, size)])
+  rk  = linspace(tails + 1, n - tails, size)
+  mid = interp((rk - 0.5) / n, (arange(size) + 0.5) / size, s)
+
+  ranks = hstack((arange(1, tails + 1), rk, arange(n - tails + 1, n + 1)))
+  osr   = hstack((lo, mid, hi))
+  osm   = distributions.norm.ppf(order_medians(ranks, n))
+  w     = hstack((zeros(tails) + 1, zeros(size) + (n - 2.0*tails) / size,
+                  zeros(tails) + 1))
+
+  W     = sum(w)
+  xm    = sum(w * osm) / W
+  ym    = sum(w * osr) / W
+  sxy   = sum(w * (osm - xm) * (osr - ym))
+  sxx   = sum(w * (osm - xm)**2)
+  syy   = sum(w * (osr - ym)**2)
+  slope = sxy / sxx
+  return (osm, osr), (slope, ym - slope * xm, sxy / sqrt(sxx * syy))
+
+
+def plot_distributions(y, yhat, fn):
+  """
+  Save to <fn> the histograms of the observed friction <y> and the fitted
+  friction <yhat>.
+  """
+  fig      = figure()
+  ax       = fig.add_subplot(111)
+
+  hist_density(ax, y,    300, histtype='step', color='k', lw=1.5, alpha=1.0,
+               label=r'$\beta$')
+  hist_density(ax, yhat, 300, histtype='step', color='r', lw=1.5, alpha=1.0,
+               label=r'$\hat{\beta}$')
+  ax.set_xlim([0,200])
+  ax.set_xlabel(r'$\hat{\beta}$')
+  ax.set_ylabel('Frequency')
+  ax.legend(loc='upper right')
+  ax.grid()
+  tight_layout()
+  savefig(fn, dpi=100)
+  close(fig)
+
+
+def plot_residuals(resid, yhat, fn):
+  """
+  Save to <fn> the normal quantile plot of the residuals <resid> beside
+  the residuals against the fitted values <yhat>.
+  """
+  fig = figure(figsize=(12,5))
+  ax1 = fig.add_subplot(121)
+  ax2 = fig.add_subplot(122)
+
+  # Normal quantile plot of residuals, from exact tails and a subsample :
+  ((osm,osr), (m, b, r)) = probplot_sample(resid)
+  interp = interp1d(osm, osr)
+  yl     = interp(-2.5)
+  yh     = interp(2.5)
+  ax1.plot(osm, m*osm + b, 'r-', lw=2.0, label=r'LS fit')
+  ax1.plot(osm, osr,       'k.', alpha=1.0, label='$\mathbf{d}$')
+  ax1.set_xlabel('Standard Normal Quantiles')
+  ax1.set_ylabel('Residuals')
+  ax1.set_xlim([-2.5, 2.5])
+  ax1.set_ylim([yl,   yh])
+  ax1.legend(loc='lower right')
+  ax1.grid()
+
+  # one pixel per bin, shaded as the overplotted points would be :
+  scatter_density(ax2, yhat, resid, [0, 150], [yl, yh], 'k', alpha=0.10)
+  ax2.set_xlabel(r'$\hat{\beta}$')
+  ax2.set_ylabel('Residuals')
+  ax2.grid()
+
+  tight_layout()
+  savefig(fn, dpi=100)
+  close(fig)
+
+
+def plot_newton(rel_a, dev_a, fn):
+  """
+  Save to <fn> the Newton convergence history <rel_a>, <dev_a> of a fit.
+  """
+  fig = figure()
+  ax  = fig.add_subplot(111)
+
+  ax.plot(rel_a, 'k-', lw=2.0,
+          label=r'$\Vert \alpha - \alpha_n \Vert^2$')
+  ax.plot(dev_a, 'r-', lw=2.0,
+          label=r'$\Vert \mathbf{d} - \mathbf{d}_n \Vert^2$')
+  ax.set_xlabel(r'Iteration')
+  ax.set_yscale('log')
+  ax.set_xlim([0, len(dev_a)-1])
+  ax.grid()
+  ax.legend()
+  tight_layout()
+  savefig(fn, dpi=100)
+  close(fig)
+
+
+def plot_variogram(v, fn):
+  """
+  Save to <fn> the semivariogram and Moran's I correlogram <v> of
+  bedstats.spatial.variogram(), the sill at the variance of the field and
+  the correlogram against its expectation without autocorrelation.
+  """
+  fig = figure(figsize=(12,5))
+  ax1 = fig.add_subplot(121)
+  ax2 = fig.add_subplot(122)
+
+  h   = v['h'] / 1000.0
+  ax1.plot(h, v['gamma'], 'ko-', lw=2.0)
+  ax1.axhline(v['var'], color='r', lw=1.5, ls='--', label=r'$\sigma^2$')
+  ax1.set_xlabel(r'$h$ [km]')
+  ax1.set_ylabel(r'$\gamma(h)$')
+  ax1.set_ylim(bottom=0)
+  ax1.legend(loc='lower right')
+  ax1.grid()
+
+  ax2.plot(h, v['moran'], 'ko-', lw=2.0)
+  ax2.axhline(v['E_moran'], color='r', lw=1.5, ls='--', label=r'$E[I]$')
+  ax2.set_xlabel(r'$h$ [km]')
+  ax2.set_ylabel(r'$I(h)$')
+  ax2.legend(loc='upper right')
+  ax2.grid()
+
+  tight_layout()
+  savefig(fn, dpi=100)
+  close(fig)
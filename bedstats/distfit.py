@@ -0,0 +1,156 @@
+from numpy           import log, exp, sqrt, mean, std, sort, arange, abs, \
+                            sum, isfinite
+from numpy.random    import RandomState
+from scipy.special   import digamma, polygamma
+from scipy.optimize  import minimize_scalar
+from scipy.stats     import distributions
+
+# candidate families, named as in scipy.stats :
+FAMILIES = ['norm', 'expon', 'gamma', 'lognorm', 'weibull_min']
+
+# number of free parameters of each family with the location fixed :
+NPARAM   = {'norm'        : 2,
+            'expon'       : 1,
+            'gamma'       : 2,
+            'lognorm'     : 2,
+            'weibull_min' : 2}
+
+
+def gamma_shape(s, tol=1e-12, maxIter=20):
+  """
+  Return the maximum likelihood gamma shape k solving
+  log(k) - digamma(k) = <s>, where <s> = log(mean(x)) - mean(log(x)),
+  starting from the closed-form approximation of Minka (2002).
+  """
+  k = (3 - s + sqrt((s - 3)**2 + 24*s)) / (12*s)
+  for i in range(maxIter):
+    dk = (log(k) - digamma(k) - s) / (1/k - polygamma(1, k))
+    k -= dk
+    if abs(dk) < tol * k: break
+  return k
+
+
+def weibull_shape(lx, k0, tol=1e-10, maxIter=50):
+  """
+  Return the maximum likelihood Weibull shape k for the logarithms <lx> of
+  the data, by Newton's method from <k0> on the profile score
+  sum(x^k log x)/sum(x^k) - 1/k - mean(log x).
+  """
+  k   = k0
+  lx  = lx - lx.max()                  # the score is unchanged by a shift
+  lm  = mean(lx)
+  for i in range(maxIter):
+    xk  = exp(k*lx)
+    A   = sum(xk)
+    B   = sum(xk*lx)
+    C   = sum(xk*lx**2)
+    g   = B/A - 1/k - lm
+    dg  = C/A - (B/A)**2 + 1/k**2
+    dk  = g / dg
+    k  -= dk
+    if abs(dk) < tol * k: break
+  return k
+
+
+def fit_fixed(y, family, loc=0.0):
+  """
+  Return the maximum likelihood parameters of the scipy.stats
+  distribution <family> for the data <y> with the location fixed at <loc>,
+  as the tuple (shape..., loc, scale) accepted by its pdf().  These are
+  closed form for 'norm', 'expon' and 'lognorm', and a few scalar Newton
+  steps on the sufficient statistics, or one vectorized pass per step for
+  'weibull_min', for the others.
+  """
+  if family == 'norm':
+    return (mean(y), std(y))
+  x = y - loc
+  if family == 'expon':
+    return (loc, mean(x))
+  lx = log(x)
+  if family == 'lognorm':
+    return (std(lx), loc, exp(mean(lx)))
+  elif family == 'gamma':
+    m = mean(x)
+    k = gamma_shape(log(m) - mean(lx))
+    return (k, loc, m/k)
+  elif family == 'weibull_min':
+    k     = weibull_shape(lx, 1.2825 / std(lx))
+    c     = lx.max()
+    scale = exp(c + log(mean(exp(k*(lx - c)))) / k)
+    return (k, loc, scale)
+  raise ValueError('unknown family %s' % family)
+
+
+def loglik(y, family, params):
+  """
+  Return the log-likelihood of the data <y> under <family> with <params>.
+  """
+  return sum(getattr(distributions, family).logpdf(y, *params))
+
+
+def fit(y, family, loc=0.0, subsample=10000, seed=0):
+  """
+  Fit the distribution <family> to the data <y>.  With <loc> given the
+  location is fixed and the fit is that of fit_fixed().  With <loc> None
+  the location is free : scipy's generic fit on a random subsample of
+  <subsample> values supplies the initial location, which is then refined
+  on the full data by maximizing the profile likelihood of fit_fixed()
+  over the location alone ('expon' has the closed form loc = min(<y>)).
+  """
+  if loc is not None or family == 'norm':
+    return fit_fixed(y, family, 0.0 if loc is None else loc)
+  if family == 'expon':
+    return fit_fixed(y, family, y.min())
+
+  n    = len(y)
+  if n > subsample:
+    ys = y[RandomState(seed).choice(n, subsample, replace=False)]
+  else:
+    ys = y
+  loc0 = getattr(distributions, family).fit(ys)[-2]
+
+  ymin = y.min()
+  d    = std(y)
+  lo   = min(loc0, ymin) - d
+  hi   = ymin - 1e-6 * d
+  nll  = lambda l: -loglik(y, family, fit_fixed(y, family, l))
+  l    = minimize_scalar(nll, bounds=(lo, hi), method='bounded').x
+  return fit_fixed(y, family, l)
+
+
+def fit_all(y, families=FAMILIES, loc=0.0):
+  """
+  Fit each of <families> to the data <y> as in fit() and return, ordered
+  by increasing AIC, one dictionary per family with its 'family',
+  'params', log-likelihood 'L', 'AIC', 'BIC' and Kolmogorov-Smirnov
+  statistic 'KS' against the empirical distribution of <y>.
+  """
+  n    = len(y)
+  ys   = sort(y)
+  ecdf = arange(1, n+1) / float(n)
+  fits = []
+  for family in families:
+    params = fit(y, family, loc)
+    L      = loglik(y, family, params)
+    k      = NPARAM[family] + (loc is None and family != 'norm')
+    F      = getattr(distributions, family).cdf(ys, *params)
+    KS     = max(abs(ecdf - F).max(), abs(ecdf - 1.0/n - F).max())
+    if not isfinite(L):
+      L    = -float('inf')
+    fits.append({'family' : family,
+                 'params' : params,
+                 'L'      : L,
+                 'AIC'    : -2*L + 2*k,
+                 'BIC'    : -2*L + k*log(n),
+                 'KS'     : KS})
+  return sorted(fits, key=lambda f: f['AIC'])
+
+
+def print_fits(fits):
+  """
+  Print the goodness-of-fit summary of the fits returned by fit_all().
+  """
+  print("%-12s %14s %14s %8s" % ('family', 'AIC', 'BIC', 'KS'))
+  for f in fits:
+    print("%-12s %14.6g %14.6g %8.4f" % (f['family'], f['AIC'], f['BIC'],
+                                        f['KS']))
@@ -0,0 +1,82 @@
+from fenics            import Mesh, FunctionSpace, Function, File, project, \
+                              CellSize
+
+from bedstats.gradient import GradientOperator
+from bedstats.bedfile  import field_name, open_bed
+
+
+class DolfinBedLoader(object):
+  """
+  Reads the fields written by extract_bed.py from the bed directory
+  <bed_dir> onto the piecewise-linear space of its submesh, for use with
+  FeatureStore, one at a time from its container bed.h5 or, failing that,
+  from the legacy XML files.  The container is opened for each read and
+  closed again, so that no handle to it is inherited by forked workers,
+  and its submesh is checked on the first.  The mesh and function space
+  are only created when first needed, so a fully cached FeatureStore
+  never touches DOLFIN.
+  Derivatives are recovered with the cached GradientOperator of the
+  submesh, using the lumped mass matrix if <lumped> is True.
+  """
+  def __init__(self, bed_dir, Q=None, lumped=False):
+    self.bed_dir = bed_dir
+    self.Q       = Q
+    self.lumped  = lumped
+    self.G       = None
+    self.checked = False
+
+  def space(self):
+    """
+    Return the CG1 function space of the submesh.
+    """
+    if self.Q is None:
+      mesh   = Mesh(self.bed_dir + 'submesh.xdmf')
+      self.Q = FunctionSpace(mesh, 'CG', 1)
+    return self.Q
+
+  def read(self, fn):
+    """
+    Return the nodal values of the field of the legacy file <fn>.
+    """
+    bf = open_bed(self.bed_dir)
+    if bf is not None:
+      try:
+        if not self.checked:
+          bf.check(self.space().mesh())
+          self.checked = True
+        if bf.has(field_name(fn)):
+          return bf.read_dofs(field_name(fn), self.space())
+      finally:
+        bf.close()
+    f = Function(self.space())
+    File(self.bed_dir + fn) >> f
+    return f.vector().array()
+
+  def operator(self):
+    """
+    Return the gradient-recovery operator of the submesh.
+    """
+    if self.G is None:
+      self.G = GradientOperator(self.bed_dir, self.Q, self.lumped)
+    return self.G
+
+  def gradient(self, u, i):
+    """
+    Return the projection of the <i>-th derivative of the field with nodal
+    values <u>.
+    """
+    return self.operator().derivative(u, i)
+
+  def coordinates(self):
+    """
+    Return the n x 2 array of the coordinates of the nodes, in the order
+    of the degrees of freedom.
+    """
+    return self.space().tabulate_dof_coordinates().reshape(-1, 2)
+
+  def cell_size(self):
+    """
+    Return the projected cell size used to weight the nodes.
+    """
+    Q = self.space()
+    return project(CellSize(Q.mesh()), Q).vector().array()
@@ -0,0 +1,295 @@
+import os
+import json
+import hashlib
+
+from numpy import sqrt, zeros, load, savez_compressed, array
+
+from bedstats.filters import NodeFilter
+from bedstats.bedfile import BED, field_name, field_shas
+
+rhoi = 917.0                           # density of ice
+g    = 9.8                             # gravitational acceleration
+
+# raw fields and the files they are read from, relative to the bed directory
+# written by extract_bed.py :
+RAW = {'beta'   : 'beta_s.xml',
+       'S'      : 'S_s.xml',
+       'B'      : 'B_s.xml',
+       'adot'   : 'adot_s.xml',
+       'qgeo'   : 'qgeo_s.xml',
+       'Mb'     : 'Mb_s.xml',
+       'W'      : 'W_s.xml',
+       'Tb'     : 'Tb_s.xml',
+       'Ts'     : 'Ts_s.xml',
+       'u'      : 'ub_s.xml',
+       'v'      : 'vb_s.xml',
+       'w'      : 'wb_s.xml',
+       'us'     : 'us_s.xml',
+       'vs'     : 'vs_s.xml',
+       'ws'     : 'ws_s.xml',
+       'Ubar'   : 'Ubar_s.xml',
+       'etabar' : 'etabar_s.xml',
+       'ubar'   : 'ubar_s.xml',
+       'vbar'   : 'vbar_s.xml',
+       'Ubar5'  : 'bv/Ubar_5.xml',
+       'Ubar10' : 'bv/Ubar_10.xml',
+       'Ubar20' : 'bv/Ubar_20.xml',
+       'U_ob'   : 'U_ob_s.xml',
+       'tau_id' : 'tau_id_s.xml',
+       'tau_jd' : 'tau_jd_s.xml',
+       'tau_ii' : 'tau_ii_s.xml',
+       'tau_ij' : 'tau_ij_s.xml',
+       'tau_iz' : 'tau_iz_s.xml',
+       'tau_ji' : 'tau_ji_s.xml',
+       'tau_jj' : 'tau_jj_s.xml',
+       'tau_jz' : 'tau_jz_s.xml',
+       'mask'   : 'mask_s.xml'}
+
+MESH = 'submesh.xdmf'
+
+# coordinates of the nodes of the submesh :
+COORD = {'x' : 0,
+         'y' : 1}
+
+# horizontal derivatives, recovered on the submesh by the loader :
+GRAD = {'dSdx' : ('S', 0),
+        'dSdy' : ('S', 1),
+        'dBdx' : ('B', 0),
+        'dBdy' : ('B', 1),
+        'dHdx' : ('H', 0),
+        'dHdy' : ('H', 1)}
+
+def bed_depth(B):
+  """
+  Return the bed elevation <B> where it is below sea level, zero elsewhere.
+  """
+  D        = zeros(len(B))
+  D[B < 0] = B[B < 0]
+  return D
+
+# derived fields, the fields they depend on and how they are computed :
+DERIVED = {
+  'H'          : (['S', 'B'],          lambda S, B: S - B),
+  'gradH'      : (['dHdx', 'dHdy'],    lambda x, y: sqrt(x**2 + y**2 + 1e-16)),
+  'U_mag'      : (['u', 'v'],          lambda u, v: sqrt(u**2 + v**2 + 1e-16)),
+  'gradS'      : (['dSdx', 'dSdy'],    lambda x, y: sqrt(x**2 + y**2 + 1e-16)),
+  'gradB'      : (['dBdx', 'dBdy'],    lambda x, y: sqrt(x**2 + y**2 + 1e-16)),
+  'D'          : (['B'],               bed_depth),
+  'taux'       : (['H', 'dSdx'],       lambda H, x: -rhoi * g * H * x),
+  'tauy'       : (['H', 'dSdy'],       lambda H, y: -rhoi * g * H * y),
+  'tau_mag'    : (['taux', 'tauy'],    lambda x, y: sqrt(x**2 + y**2 + 1e-16)),
+  'uhat'       : (['u', 'U_mag'],      lambda u, U: u / U),
+  'vhat'       : (['v', 'U_mag'],      lambda v, U: v / U),
+  'dBdi'       : (['dBdx', 'dBdy', 'uhat', 'vhat'],
+                  lambda x, y, uh, vh: x * uh + y * vh),
+  'dBdj'       : (['dBdx', 'dBdy', 'uhat', 'vhat'],
+                  lambda x, y, uh, vh: x * vh - y * uh),
+  'dSdi'       : (['dSdx', 'dSdy', 'uhat', 'vhat'],
+                  lambda x, y, uh, vh: x * uh + y * vh),
+  'dSdj'       : (['dSdx', 'dSdy', 'uhat', 'vhat'],
+                  lambda x, y, uh, vh: x * vh - y * uh),
+  'dHdi'       : (['dHdx', 'dHdy', 'uhat', 'vhat'],
+                  lambda x, y, uh, vh: x * uh + y * vh),
+  'dHdj'       : (['dHdx', 'dHdy', 'uhat', 'vhat'],
+                  lambda x, y, uh, vh: x * vh - y * uh),
+  'Ubar_avg'   : (['Ubar5', 'Ubar10', 'Ubar20'],
+                  lambda a, b, c: (a + b + c) / 3.0),
+  'ini_i_Ubar' : (['H', 'dSdi', 'Ubar5'],
+                  lambda H, d, U: rhoi * g * H * d / (U + 0.1)),
+  'ini_j_Ubar' : (['H', 'dSdj', 'Ubar5'],
+                  lambda H, d, U: rhoi * g * H * d / (U + 0.1)),
+  'ini_i_U'    : (['H', 'dSdi', 'U_mag'],
+                  lambda H, d, U: rhoi * g * H * d / (U + 0.1)),
+  'ini_j_U'    : (['H', 'dSdj', 'U_mag'],
+                  lambda H, d, U: rhoi * g * H * d / (U + 0.1))}
+
+
+def file_hash(fn, blocksize=2**20):
+  """
+  Return the SHA-1 hex digest of the contents of the file <fn>.
+  """
+  h = hashlib.sha1()
+  f = open(fn, 'rb')
+  while True:
+    b = f.read(blocksize)
+    if not b: break
+    h.update(b)
+  f.close()
+  return h.hexdigest()
+
+
+class FeatureStore(object):
+  """
+  Cache of the raw and derived bed variables of the bed directory
+  <bed_dir> (e.g. dump/bed/07/), stored column-wise in the compressed
+  file <bed_dir>/<cache>.
+
+  Raw fields are read with the object <loader>, which provides read(fn)
+  for the legacy file <fn> relative to <bed_dir>, read from the container
+  bed.h5 if it holds the field (see bedstats/bedfile.py), gradient(u, i)
+  for the <i>-th horizontal derivative of the nodal values <u>,
+  cell_size(), and coordinates() for the n x 2 node coordinates; see
+  bedstats/dolfin_bed.py.  Each cached column records the SHA-1 digests
+  of all files it was computed from, and a column is recomputed only when
+  one of these has changed.  Files are only re-hashed when their
+  modification time or size differ from those recorded; a field of the
+  container is the source 'bed.h5:name', with the digest stored with it;
+  these digests are read once, and the container is not kept open, so
+  that pools forked later inherit no handle to it and extract_bed.py may
+  rewrite it.
+  Valid-node masks of a NodeFilter are cached the same way; see filter().
+  """
+  def __init__(self, bed_dir, loader, cache='features.npz'):
+    self.bed_dir = bed_dir
+    self.loader  = loader
+    self.fn      = os.path.join(bed_dir, cache)
+    self.columns = {}                  # columns in memory
+    self.dirty   = set()               # columns to be written
+    self.filters = {}                  # NodeFilters by column name
+    self.meta    = {'files' : {}, 'columns' : {}, 'filters' : {}}
+    self.npz     = None
+    self.shas    = field_shas(bed_dir) # digests of the container fields
+    if os.path.exists(self.fn):
+      self.npz  = load(self.fn)
+      self.meta = json.loads(str(self.npz['__meta__']))
+      self.meta.setdefault('filters', {})
+
+  def sources(self, name):
+    """
+    Return the sorted list of files the column <name> depends on.
+    """
+    if name in RAW:
+      return [self.raw_source(RAW[name])]
+    elif name == 'h' or name in COORD:
+      return [MESH]
+    elif name in GRAD:
+      return sorted(set(self.sources(GRAD[name][0]) + [MESH]))
+    elif name in DERIVED or name in self.filters:
+      s = set()
+      for d in self.dependencies(name):
+        s.update(self.sources(d))
+      return sorted(s)
+    raise KeyError('unknown bed feature %s' % name)
+
+  def raw_source(self, fn):
+    """
+    Return the source of the raw field of the legacy file <fn> : the field
+    of the container if it holds it, otherwise <fn> itself.
+    """
+    if field_name(fn) in self.shas:
+      return BED + ':' + field_name(fn)
+    return fn
+
+  def dependencies(self, name):
+    """
+    Return the columns the derived or filter column <name> is computed from.
+    """
+    if name in self.filters:
+      return self.filters[name].fields()
+    return DERIVED[name][0]
+
+  def signature(self, fn):
+    """
+    Return the SHA-1 digest of the file <fn>, relative to the bed
+    directory, re-hashing it only if its time stamp or size changed, or
+    of the field of the container <fn> = 'bed.h5:name'.
+    """
+    if fn.startswith(BED + ':'):
+      return self.shas[fn[len(BED)+1:]]
+    st  = os.stat(os.path.join(self.bed_dir, fn))
+    old = self.meta['files'].get(fn)
+    if old is not None and old[0] == st.st_mtime and old[1] == st.st_size:
+      return old[2]
+    sha = file_hash(os.path.join(self.bed_dir, fn))
+    self.meta['files'][fn] = [st.st_mtime, st.st_size, sha]
+    return sha
+
+  def stale(self, name):
+    """
+    Return True if the column <name> is not in the cache or any of its
+    source files changed since it was stored.
+    """
+    sig = dict((fn, self.signature(fn)) for fn in self.sources(name))
+    return self.npz is None or name not in self.npz.files \
+           or self.meta['columns'].get(name) != sig
+
+  def compute(self, name):
+    """
+    Read or derive the column <name> from its sources.
+    """
+    if name in RAW:
+      return self.loader.read(RAW[name])
+    elif name == 'h':
+      return self.loader.cell_size()
+    elif name in COORD:
+      return self.loader.coordinates()[:,COORD[name]].copy()
+    elif name in GRAD:
+      f, i = GRAD[name]
+      return self.loader.gradient(self[f], i)
+    elif name in self.filters:
+      mask, counts = self.filters[name].evaluate(self)
+      self.meta['filters'][name] = counts
+      return mask
+    deps, func = DERIVED[name]
+    return func(*[self[d] for d in deps])
+
+  def __getitem__(self, name):
+    if name not in self.columns:
+      if self.stale(name):
+        print("feature store : computing %s" % name)
+        self.columns[name] = self.compute(name)
+        self.meta['columns'][name] = dict((fn, self.signature(fn))
+                                          for fn in self.sources(name))
+        self.dirty.add(name)
+      else:
+        self.columns[name] = self.npz[name]
+    return self.columns[name]
+
+  def filter(self, flt):
+    """
+    Return the valid-node mask and rejection counts of the NodeFilter or
+    filter spec <flt> (see bedstats/filters.py), cached as a column
+    alongside the fields it reads and re-evaluated only when one of their
+    sources changed.
+    """
+    if not isinstance(flt, NodeFilter):
+      flt = NodeFilter(flt)
+    name               = 'valid_' + flt.key()
+    self.filters[name] = flt
+    mask               = self[name]
+    self.save()
+    counts = [tuple(c) for c in self.meta['filters'][name]]
+    return mask, counts
+
+  def load(self, names):
+    """
+    Return a dictionary of the columns <names>, writing any that had to be
+    recomputed back to the cache.
+    """
+    F = dict((k, self[k]) for k in names)
+    self.save()
+    return F
+
+  def save(self):
+    """
+    Write the cache if any column was recomputed, keeping the unchanged
+    columns already stored.
+    """
+    if not self.dirty:
+      return
+    cols = {}
+    if self.npz is not None:
+      for k in self.npz.files:
+        if k != '__meta__' and k in self.meta['columns']:
+          cols[k] = self.npz[k]
+    cols.update(self.columns)
+    cols['__meta__'] = array(json.dumps(self.meta))
+    tmp = self.fn + '.%d.tmp' % os.getpid()
+    f   = open(tmp, 'wb')
+    savez_compressed(f, **cols)
+    f.close()
+    if self.npz is not None:
+      self.npz.close()
+    os.rename(tmp, self.fn)
+    self.npz   = load(self.fn)
+    self.dirty = set()
@@ -0,0 +1,128 @@
+import re
+import json
+import hashlib
+
+from numpy import ones, empty, abs, count_nonzero, less, less_equal, \
+                  greater, greater_equal, equal, not_equal, logical_and
+
+# comparison operators allowed in a filter condition :
+OPS = {'<'  : less,
+       '<=' : less_equal,
+       '>'  : greater,
+       '>=' : greater_equal,
+       '==' : equal,
+       '!=' : not_equal}
+
+COND = re.compile(r'^\s*(<=|>=|==|!=|<|>)\s*(\S+)\s*$')
+ABS  = re.compile(r'^\s*abs\(\s*(\w+)\s*\)\s*$')
+
+
+def parse(key, cond):
+  """
+  Return the tuple (label, field, absolute, op, value) of the condition
+  string <cond>, e.g. '>1e-14', on the spec key <key>, which is either a
+  field name, e.g. 'beta', or its absolute value, e.g. 'abs(Mb)'.
+  """
+  m = COND.match(cond)
+  if m is None:
+    raise ValueError('bad filter condition %s : %s' % (key, cond))
+  op, value = m.group(1), float(m.group(2))
+  a = ABS.match(key)
+  if a is not None:
+    field, absolute = a.group(1), True
+  else:
+    field, absolute = key.strip(), False
+  return ('%s %s %s' % (key.strip(), op, m.group(2)), field, absolute, op,
+          value)
+
+
+class NodeFilter(object):
+  """
+  Declarative selection of the valid nodes of a bed data set.  The spec
+  <spec> maps a field name, or 'abs(<name>)', to one condition string or a
+  tuple of them, e.g.
+
+    {'mask' : '<1', 'beta' : ('>1e-14', '<1000'), 'H' : '>60'},
+
+  and a node is valid if it satisfies every condition.  A list of
+  (key, condition) pairs may be given instead of a dictionary to fix the
+  order in which the conditions are reported; dictionary keys are taken in
+  sorted order.
+  """
+  def __init__(self, spec):
+    if isinstance(spec, dict):
+      spec = sorted(spec.items())
+    self.conditions = []
+    for key, conds in spec:
+      if isinstance(conds, str):
+        conds = (conds,)
+      for c in conds:
+        self.conditions.append(parse(key, c))
+
+  def fields(self):
+    """
+    Return the sorted list of fields the filter reads.
+    """
+    return sorted(set(c[1] for c in self.conditions))
+
+  def key(self):
+    """
+    Return a short digest identifying the conditions, used to cache the
+    mask.
+    """
+    s = json.dumps([c[1:] for c in self.conditions])
+    return hashlib.sha1(s.encode('utf-8')).hexdigest()[:12]
+
+  def evaluate(self, F):
+    """
+    Return the boolean mask of the nodes of the fields <F> (a dictionary
+    or FeatureStore of equal-length arrays) satisfying every condition,
+    and a list with one tuple (label, rejected, removed) per condition,
+    where 'rejected' counts the nodes failing that condition and 'removed'
+    those failing it but none of the conditions before it.
+
+    The conditions are and-ed into a single mask in place, with one
+    scratch array, instead of intersecting sorted index arrays.
+    """
+    n      = len(F[self.conditions[0][1]])
+    mask   = ones(n, dtype=bool)
+    tmp    = empty(n, dtype=bool)
+    left   = n
+    counts = []
+    for label, field, absolute, op, value in self.conditions:
+      x = F[field]
+      if absolute:
+        x = abs(x)
+      OPS[op](x, value, out=tmp)
+      logical_and(mask, tmp, out=mask)
+      kept  = int(count_nonzero(mask))
+      counts.append((label, n - int(count_nonzero(tmp)), left - kept))
+      left  = kept
+    return mask, counts
+
+
+def filter_mask(spec, F):
+  """
+  Return the valid-node mask and rejection counts of the filter <spec>
+  evaluated on the fields <F>; see NodeFilter.evaluate().
+  """
+  return NodeFilter(spec).evaluate(F)
+
+
+def merge_counts(*counts):
+  """
+  Return the sum of the rejection counts <counts> of the same filter
+  evaluated on different regions.
+  """
+  return [(c[0][0], sum(r[1] for r in c), sum(r[2] for r in c))
+          for c in zip(*counts)]
+
+
+def print_counts(counts, n):
+  """
+  Print the rejection counts <counts> of a filter applied to <n> nodes.
+  """
+  print("%-24s %10s %10s" % ('filter', 'rejected', 'removed'))
+  for label, rejected, removed in counts:
+    print("%-24s %10d %10d" % (label, rejected, removed))
+  print("%-24s %10d of %d" % ('valid', n - sum(c[2] for c in counts), n))
@@ -0,0 +1,315 @@
+from numpy         import ones, zeros, vstack, sqrt, log, exp, dot, diag, \
+                          mean, var, pi, inf, eye, abs, sum, outer, triu, \
+                          tril_indices_from, nan
+from numpy.linalg  import norm, qr, inv, svd, LinAlgError
+from scipy.linalg  import cho_factor, cho_solve, solve_triangular
+from scipy.stats   import t
+from scipy.special import fdtrc
+from time          import time
+
+from bedstats.telemetry import Telemetry
+
+
+def factor(Xw, solver='cholesky'):
+  """
+  Factor the weighted design matrix <Xw> = W^{1/2} X, with n rows and p
+  columns.  If <solver> is 'cholesky' the normal matrix X^T W X is formed
+  and Cholesky-factored; if this fails because the matrix is not positive
+  definite to working precision, or <solver> is 'qr', the economic QR
+  decomposition of <Xw> is used instead.
+
+  Returns the tuple (kind, F), where F is the Cholesky factor or R.
+  """
+  if solver == 'cholesky':
+    try:
+      return 'cholesky', cho_factor(dot(Xw.T, Xw), lower=False)
+    except LinAlgError:
+      print("Cholesky factorization failed, falling back to QR")
+  return 'qr', qr(Xw, mode='r')
+
+
+def factor_solve(fac, b):
+  """
+  Solve X^T W X a = <b> with the factorization <fac> returned by factor().
+  """
+  kind, F = fac
+  if kind == 'cholesky':
+    return cho_solve(F, b)
+  return solve_triangular(F, solve_triangular(F, b, trans='T'))
+
+
+def factor_inverse(fac):
+  """
+  Return (X^T W X)^{-1} from the factorization <fac> returned by factor().
+  """
+  kind, F = fac
+  if kind == 'cholesky':
+    p = F[0].shape[0]
+    return cho_solve(F, eye(p))
+  Ri = solve_triangular(F, eye(F.shape[0]))
+  return dot(Ri, Ri.T)
+
+
+def factor_downdate(fac, keep):
+  """
+  Return the factorization of the Gram matrix restricted to the columns
+  <keep> from the factorization <fac> of the full one, without touching the
+  data.  Deleting columns of the triangular factor R leaves R[:,<keep>],
+  which has the same Gram matrix and is re-triangularized by a small QR
+  decomposition in O(p k^2) operations.
+  """
+  kind, F = fac
+  if kind == 'cholesky':
+    R = F[0].copy()
+    R[tril_indices_from(R, -1)] = 0.0     # cho_factor leaves garbage here
+  else:
+    R = F
+  Rk = qr(R[:,keep], mode='r')
+  if kind == 'cholesky':
+    return 'cholesky', (Rk, False)
+  return 'qr', Rk
+
+
+def scale_transform(m, sd):
+  """
+  Return the upper-triangular matrix T taking the parameters b of the
+  model on the standardized columns (x - <m>)/<sd>, intercept first, to
+  those of the original columns, a = T b.  The standardized design is
+  X T, so its Gram matrix is T^T X^T W X T.
+  """
+  p        = len(m) + 1
+  T        = eye(p)
+  T[0,1:]  = -m / sd
+  T[1:,1:] = diag(1.0 / sd)
+  return T
+
+
+def unscale_transform(m, sd):
+  """
+  Return the inverse of scale_transform(<m>, <sd>), b = T^{-1} a.
+  """
+  p        = len(m) + 1
+  Ti       = eye(p)
+  Ti[0,1:] = m
+  Ti[1:,1:] = diag(sd)
+  return Ti
+
+
+def factor_transform(fac, T):
+  """
+  Return the factorization of T^T X^T W X T, the Gram matrix of the
+  design X <T>, from the factorization <fac> of X^T W X, for an upper-
+  triangular <T> with positive diagonal such as scale_transform() : the
+  triangular factor R becomes R T.
+  """
+  kind, F = fac
+  if kind == 'cholesky':
+    return 'cholesky', (dot(triu(F[0]), T), False)
+  return 'qr', dot(F, T)
+
+
+def conditioning(fac):
+  """
+  Return the 2-norm condition number of X^T W X and the variance inflation
+  factors of the columns after the intercept, from the factorization <fac>
+  returned by factor().  The VIFs are the diagonal of the inverse of the
+  weighted correlation matrix of the columns, inf if it is singular.
+  """
+  kind, F = fac
+  if kind == 'cholesky':
+    R = triu(F[0])
+  else:
+    R = F
+  sv   = svd(R, compute_uv=False)
+  cond = (sv[0] / sv[-1])**2
+  G    = dot(R.T, R)
+  C    = G[1:,1:] - outer(G[0,1:], G[0,1:]) / G[0,0]
+  d    = sqrt(diag(C))
+  try:
+    vif = diag(inv(C / outer(d, d)))
+  except LinAlgError:
+    vif = inf * ones(len(d))
+  return cond, vif
+
+
+def print_conditioning(out, names=None):
+  """
+  Print the conditioning report of the fit <out> of glm() or glm_chunked() :
+  the condition number of X^T W X at each Newton iteration and the final
+  variance inflation factor of each term, labelled by <names> (intercept
+  first) if given.
+  """
+  print("condition numbers : " + ', '.join(['%.2e' % c
+                                             for c in out['cond_a']]))
+  for j,v in enumerate(out['vif']):
+    if names is None: n = 'x%d' % (j+1)
+    else:             n = names[j+1]
+    print("VIF %-40s %.1f" % (n, v))
+
+
+def glm(x, y, w=1.0, solver='cholesky', rtol=1e-4, dtol=1e-4, maxIter=65,
+        standardize=False, telemetry=None, verbose=True):
+  """
+  Fit a log-link Gaussian generalized linear model of the response <y>
+  against the <p> x <n> array of explanatory variables <x> by iteratively
+  re-weighted least squares, with optional prior weights <w>.
+
+  The IRLS weights are kept as a length-<n> vector rather than an <n> x <n>
+  diagonal matrix, each Newton step is solved with a Cholesky (or QR if
+  <solver> is 'qr') factorization of the weighted normal equations, and the
+  covariance matrix of the parameters is formed only once, after
+  convergence.
+
+  With <standardize> the model is fit to the columns of <x> centred and
+  scaled to unit standard deviation, so that X^T W X is well conditioned
+  whatever the units of the variables and the stopping rule on the change
+  in the parameters treats every column alike, and the estimates and
+  their covariance are transformed back to the original columns.  The
+  condition number of X^T W X at each iteration is returned, and the
+  final one printed once per fit.  With <verbose> False neither it nor
+  the iterations are printed, e.g. for the refits of a resampling run;
+  the telemetry still records every iteration.
+
+  The phases of each iteration are timed by the Telemetry <telemetry>,
+  which also logs the residual norms if it has a file (see
+  bedstats/telemetry.py); by default an unlogged one is used.
+
+  Returns a dictionary of the parameter estimates, their covariance
+  'cov', standard errors and confidence intervals, the fitted values and
+  residuals, the convergence history, the goodness-of-fit statistics,
+  the condition numbers 'cond_a', the final variance inflation factors
+  'vif' and the telemetry summary 'telemetry'.
+  """
+  tel    = telemetry or Telemetry()
+  tel.begin(fitter='glm', n=x.shape[1], p=x.shape[0]+1, solver=solver,
+            standardize=standardize)
+  p,n    = x.shape                     # sample size
+  p     += 1                           # add one for intercept
+
+  sig    = var(y)                      # variance
+  mu     = (y + mean(y))/2.0           # initial mean estimate
+  eta    = log(mu)                     # initial predictor
+  if standardize:
+    m    = x.mean(axis=1)
+    sd   = x.std(axis=1)
+    sd[sd == 0] = 1.0
+    x    = (x - m[:,None]) / sd[:,None]
+  X      = vstack((ones(n), x)).T      # observed x-variable matrix
+
+  # Newton-Raphson :
+  converged = False
+  nIter     = 0
+  deviance  = 1
+  D         = 1
+  ahat      = zeros(p)   # initial parameters
+  rel_res   = zeros(p)   # initial relative residual
+
+  rel_a  = []
+  dev_a  = []
+  cond_a = []
+
+  while not converged and nIter < maxIter:
+    t0      = time()
+    sw      = sqrt(w*mu**2/sig)             # square root of the weights
+    z       = eta + (y - mu)/mu             # adjusted dependent variable
+    t0      = tel.add('weight', t0)
+
+    Xw      = X * sw[:,None]
+    fac     = factor(Xw, solver)
+    XTWz    = dot(Xw.T, sw*z)
+    t0      = tel.add('gram', t0)
+    ahat_n  = factor_solve(fac, XTWz)
+    cond_a.append(conditioning(fac)[0])
+    t0      = tel.add('solve', t0)
+
+    eta     = dot(X, ahat_n)               # compute estimates
+    mu      = exp(eta)                     # linear predictor
+
+    # calculate residual :
+    rel_res  = norm(ahat - ahat_n, inf)
+    rel_a.append(rel_res)
+    ahat     = ahat_n
+
+    D_n      = sum((y - mu)**2)
+    deviance = abs(D_n - D)
+    D        = D_n
+    dev_a.append(deviance)
+    t0       = tel.add('predict', t0)
+
+    if rel_res < rtol or deviance < dtol: converged = True
+    nIter +=  1
+
+    if verbose:
+      string = "Newton iteration %d: d (abs) = %.2e, (tol = %.2e) r (rel) = %.2e (tol = %.2e)"
+      print(string % (nIter, deviance, dtol, rel_res, rtol))
+    tel.iteration(rel_res=rel_res, deviance=deviance, resid_norm=sqrt(D),
+                  cond=cond_a[-1])
+
+  if verbose:
+    print("condition number of X^T W X = %.2e" % cond_a[-1])
+
+  cov  = factor_inverse(fac)
+  if standardize:
+    T    = scale_transform(m, sd)
+    ahat = dot(T, ahat)
+    cov  = dot(dot(T, cov), T.T)
+  vara = glm_statistics(ahat, cov, y, mu, sig, rel_a, dev_a)
+  vara['cond_a']    = cond_a
+  vara['vif']       = conditioning(fac)[1]
+  vara['telemetry'] = tel.end(converged=converged, resid_norm=sqrt(D),
+                              AIC=vara['AIC'])
+  return vara
+
+
+def glm_statistics(ahat, iXTWX, y, mu, sig, rel_a, dev_a):
+  """
+  Compute the inference and goodness-of-fit statistics for a converged
+  log-link Gaussian fit with parameters <ahat>, covariance <iXTWX>,
+  response <y>, fitted mean <mu> and response variance <sig>.  <rel_a> and
+  <dev_a> are the Newton convergence histories.
+
+  Returns the result dictionary of glm().
+  """
+  p      = len(ahat)                   # number of parameters
+  n      = len(y)                      # sample size
+  dof    = n - p                       # degrees of freedom
+
+  varA   = diag(iXTWX)            # variance of alpha hat
+  sea    = sqrt(varA)             # vector of standard errors for alpha hat
+  t_a    = ahat / sea
+  pval   = t.sf(abs(t_a), dof) * 2
+  conf   = 0.95                        # 95% confidence interval
+  tbonf  = t.ppf((1 - conf/p), dof)    # bonferroni corrected t-value
+  ci     = tbonf*sea                   # confidence interval for ahat
+  resid  = (y - mu)                    # 'working' residual
+
+  RSS    = sum((y - mu)**2)            # residual sum of squares
+  TSS    = sum((y - mean(y))**2)       # total sum of squares
+  R2     = (TSS-RSS)/TSS               # R2
+  if p > 1:
+    F    = (TSS-RSS)/(p-1) * (n-p)/RSS # F-statistic
+  else:
+    F    = nan                         # intercept-only; nothing to test
+  F_p    = fdtrc(p-1, dof, F)          # F-Stat. p-value
+
+  # log-likelihood :
+  L      = sum((y*mu - mu**2/2)/(2*sig) - y**2/(2*sig) - 0.5*log(2*pi*sig))
+  AIC    = (-2*L + 2*p)/n              # AIC statistic
+
+  # estimated error variance :
+  sighat = 1.0/(n-p) * RSS
+
+  vara = { 'ahat'  : ahat,
+           'cov'   : iXTWX,
+           'yhat'  : mu,
+           'sea'   : sea,
+           'ci'    : ci,
+           'dof'   : dof,
+           'resid' : resid,
+           'rel_a' : rel_a,
+           'dev_a' : dev_a,
+           'R2'    : R2,
+           'F'     : F,
+           'AIC'   : AIC,
+           'sighat': sighat}
+  return vara
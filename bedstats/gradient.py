@@ -0,0 +1,139 @@
+import os
+
+from numpy               import load, savez_compressed, array, asarray, \
+                                column_stack
+from scipy.sparse        import csr_matrix
+from scipy.sparse.linalg import splu
+
+from bedstats.features   import file_hash, MESH
+
+
+def to_csr(A):
+  """
+  Return the assembled DOLFIN matrix <A> as a scipy CSR matrix.
+  """
+  from fenics import as_backend_type
+  indptr, indices, data = as_backend_type(A).mat().getValuesCSR()
+  return csr_matrix((data, indices, indptr), shape=(A.size(0), A.size(1)))
+
+
+class GradientOperator(object):
+  """
+  Recovers the horizontal derivatives of piecewise-linear fields on the
+  submesh of the bed directory <bed_dir>, i.e., the L2 projections
+  project(u.dx(i), Q) onto the CG1 space <Q>, as
+
+    M du/dx_i = G_i u,
+
+  where M is the mass matrix and G_i the matrix of (u.dx(i), v).  M, G_0
+  and G_1 are assembled once per submesh and cached in <bed_dir>/<cache>
+  together with the SHA-1 of submesh.xdmf, so later runs only read them;
+  <Q> is only needed, and DOLFIN only imported, when they are assembled.
+
+  With <lumped> the diagonal row-sum mass matrix is used, replacing the
+  solve by a division; otherwise M is factored once and every derivative
+  of every field costs two sparse triangular solves.
+  """
+  def __init__(self, bed_dir, Q=None, lumped=False, cache='gradient.npz'):
+    self.bed_dir = bed_dir
+    self.Q       = Q
+    self.lumped  = lumped
+    self.fn      = os.path.join(bed_dir, cache)
+    self.sha     = file_hash(os.path.join(bed_dir, MESH))
+    if not self.load():
+      self.assemble()
+      self.save()
+    if lumped:
+      self.m  = asarray(self.M.sum(axis=1)).ravel()
+    else:
+      self.lu = splu(self.M.tocsc())
+
+  def load(self):
+    """
+    Read the cached matrices, returning False if there are none for the
+    current submesh.
+    """
+    if not os.path.exists(self.fn):
+      return False
+    f = load(self.fn)
+    if str(f['sha']) != self.sha:
+      f.close()
+      return False
+    for k in ['M', 'Gx', 'Gy']:
+      A = csr_matrix((f[k + '_data'], f[k + '_indices'], f[k + '_indptr']),
+                     shape=tuple(f[k + '_shape']))
+      setattr(self, k, A)
+    f.close()
+    return True
+
+  def assemble(self):
+    """
+    Assemble the mass and derivative matrices on the submesh.
+    """
+    from fenics import Mesh, FunctionSpace, TrialFunction, TestFunction, \
+                       assemble, dx
+    print("gradient operator : assembling on %s" % self.bed_dir)
+    if self.Q is None:
+      mesh   = Mesh(os.path.join(self.bed_dir, MESH))
+      self.Q = FunctionSpace(mesh, 'CG', 1)
+    u       = TrialFunction(self.Q)
+    v       = TestFunction(self.Q)
+    self.M  = to_csr(assemble(u * v * dx))
+    self.Gx = to_csr(assemble(u.dx(0) * v * dx))
+    self.Gy = to_csr(assemble(u.dx(1) * v * dx))
+
+  def save(self):
+    """
+    Write the matrices to the cache.
+    """
+    A = {'sha' : array(self.sha)}
+    for k in ['M', 'Gx', 'Gy']:
+      B = getattr(self, k)
+      A[k + '_data']    = B.data
+      A[k + '_indices'] = B.indices
+      A[k + '_indptr']  = B.indptr
+      A[k + '_shape']   = array(B.shape)
+    tmp = self.fn + '.%d.tmp' % os.getpid()
+    f   = open(tmp, 'wb')
+    savez_compressed(f, **A)
+    f.close()
+    os.rename(tmp, self.fn)
+
+  def solve(self, b):
+    """
+    Return M^{-1} <b> for a vector or the columns of an array <b>.
+    """
+    if self.lumped:
+      if b.ndim == 1:
+        return b / self.m
+      return b / self.m[:,None]
+    return self.lu.solve(b)
+
+  def derivative(self, u, i):
+    """
+    Return the <i>-th horizontal derivative of the nodal values <u>.
+    """
+    G = [self.Gx, self.Gy][i]
+    return self.solve(G.dot(asarray(u, dtype=float)))
+
+  def gradient(self, u):
+    """
+    Return the derivatives (du/dx, du/dy) of the nodal values <u>, either
+    one field or an n x k array of k fields, with a single solve.
+    """
+    u = asarray(u, dtype=float)
+    k = 1 if u.ndim == 1 else u.shape[1]
+    d = self.solve(column_stack((self.Gx.dot(u), self.Gy.dot(u))))
+    if u.ndim == 1:
+      return d[:,0], d[:,1]
+    return d[:,:k], d[:,k:]
+
+  def directional(self, u, uhat, vhat):
+    """
+    Return the derivatives (du/di, du/dj) of <u> along and across the flow
+    direction with unit components <uhat>, <vhat>.
+    """
+    dudx, dudy = self.gradient(u)
+    if dudx.ndim == 2:
+      uhat, vhat = uhat[:,None], vhat[:,None]
+    return dudx * uhat + dudy * vhat, dudx * vhat - dudy * uhat
@@ -0,0 +1,111 @@
+from numpy             import where, isfinite, asarray, float64
+from scipy.spatial     import cKDTree
+from fenics            import Function, FunctionSpace, Mesh, HDF5File
+
+from bedstats.resample import predict
+
+# the fields written by MeshWriter.write() :
+FIELDS = ['beta_hat', 'resid']
+
+
+class MeshWriter(object):
+  """
+  Writes the fitted friction of a model and its residuals onto the
+  submeshes of the <regions>, for plotting and for initializing the basal
+  traction of the ice-sheet model.  <X> is the design over every node of
+  the concatenated bed table, such as the LazyDesign <Vt> over the full
+  columns <V> of linear_model_n.py, and <ok> the mask of the nodes the
+  model was fit to.
+
+  One Function per region and field is created on the first write and
+  refilled by every later one, so the fits of a backward elimination
+  reuse them.  Each is filled with one set_local() and apply() of the
+  slice of a vector evaluated block-wise over all the nodes.
+  """
+  def __init__(self, regions, X, ok, chunk=2**16):
+    self.regions = regions
+    self.X       = X
+    self.ok      = ok
+    self.chunk   = chunk
+    self.values  = {}
+    self.funcs   = dict((r.label, {}) for r in regions)
+
+  def write(self, ahat, y, cols=None, fill=0.0):
+    """
+    Evaluate the fitted mean 'beta_hat' of the parameters <ahat> at every
+    node and the residuals 'resid' of the observations <y> over all nodes
+    at the nodes of the fit, zero elsewhere, and write both to the
+    Functions of the regions.  <cols> are the columns of the model in the
+    design with the intercept first, as held by the steps of
+    backward_eliminate(), if not all of them.  Nodes where the predictor
+    is not finite, for instance the logarithm of a zero speed, get <fill>.
+    Returns the dictionary of the vectors over all nodes.
+    """
+    X  = self.X
+    if cols is not None:
+      X = X.select(asarray(cols[1:]) - 1)
+    mu = predict(X, ahat, self.chunk)
+    mu[~isfinite(mu)] = fill
+    self.values['beta_hat'] = mu
+    self.values['resid']    = where(self.ok, asarray(y, dtype=float64) - mu,
+                                    0.0)
+    for r in self.regions:
+      for k in FIELDS:
+        self.set(r, k, self.values[k][r.start:r.stop])
+    return self.values
+
+  def set(self, r, name, v):
+    """
+    Fill the Function <name> of the Region <r> with the nodal values <v>,
+    creating it if need be.
+    """
+    funcs = self.funcs[r.label]
+    if name not in funcs:
+      funcs[name] = Function(r.space())
+    funcs[name].vector().set_local(v)
+    funcs[name].vector().apply('insert')
+
+  def function(self, r, name='beta_hat'):
+    """
+    Return the Function <name> of the Region <r> last written.
+    """
+    return self.funcs[r.label][name]
+
+  def export(self, r, fn, name='beta_hat'):
+    """
+    Write the submesh of the Region <r> and the field <name> on it to the
+    HDF5 file <fn>, as the datasets 'mesh' and 'beta' read by
+    bed_to_mesh().
+    """
+    f    = self.function(r, name)
+    mesh = f.function_space().mesh()
+    h5   = HDF5File(mesh.mpi_comm(), fn, 'w')
+    h5.write(mesh, 'mesh')
+    h5.write(f,    'beta')
+    h5.close()
+
+
+def bed_to_mesh(fn, Q):
+  """
+  Return a Function on the space <Q> of the three-dimensional mesh holding
+  the bed field written to the HDF5 file <fn> by MeshWriter.export(), for
+  model.init_beta().  The submesh vertices lie under those of the mesh, so
+  every degree of freedom takes the value of the bed node nearest in the
+  horizontal plane, found with a k-d tree of the bed nodes.
+  """
+  mesh = Mesh()
+  h5   = HDF5File(mesh.mpi_comm(), fn, 'r')
+  h5.read(mesh, 'mesh', False)
+  Q_b  = FunctionSpace(mesh, 'CG', 1)
+  f_b  = Function(Q_b)
+  h5.read(f_b, 'beta')
+  h5.close()
+
+  x_b  = Q_b.tabulate_dof_coordinates().reshape(-1, 2)
+  x    = Q.tabulate_dof_coordinates().reshape(-1, 3)[:,:2]
+  i    = cKDTree(x_b).query(x)[1]
+
+  beta = Function(Q)
+  beta.vector().set_local(f_b.vector().array()[i])
+  beta.vector().apply('insert')
+  return beta
@@ -0,0 +1,259 @@
+from numpy             import zeros, ones, empty, sqrt, log, exp, dot, abs, \
+                              sum, var, ndim, asarray, logspace, argmin, \
+                              flatnonzero, union1d, float64
+from time              import time
+
+from bedstats.chunked  import row_blocks, column_scale
+from bedstats.resample import run, share_design
+from bedstats.shared   import shared_array
+
+# the data of the current cross-validation run; set before the pool is
+# forked so that every worker inherits it :
+job = {}
+
+
+def soft(x, t):
+  """
+  Return the soft-thresholding of <x> at <t>.
+  """
+  if x > t:    return x - t
+  elif x < -t: return x + t
+  return 0.0
+
+
+def working_pass(X, y, w, b, cols, m, sd, sig, chunk=2**16):
+  """
+  One pass over the data at the standardized coefficients <b> (intercept
+  first) : returns the IRLS Gram columns H = [1 Z]^T W [1 Z]_S for the
+  standardized design Z = (X - <m>)/<sd> and the columns S = <cols>
+  (indices into [1 Z], so 0 is the intercept), the vector g = [1 Z]^T W z,
+  both divided by the sum of the prior weights <w>, and the deviance of
+  <b>.  Only the columns with non-zero coefficients enter the predictor.
+  """
+  n,q  = X.shape
+  nz   = flatnonzero(b)
+  H    = zeros((q+1, len(cols)))
+  g    = zeros(q+1)
+  D    = 0.0
+  Nw   = 0.0
+  for s,e in row_blocks(n, chunk):
+    Zb       = empty((e-s, q+1))
+    Zb[:,0]  = 1.0
+    Zb[:,1:] = (asarray(X[s:e], dtype=float64) - m) / sd
+    yb       = asarray(y[s:e])
+    if ndim(w) == 0: wb = w * ones(e-s)
+    else:            wb = asarray(w[s:e])
+    eta  = dot(Zb[:,nz], b[nz])
+    mu   = exp(eta)
+    D   += sum(wb * (yb - mu)**2)
+    Nw  += sum(wb)
+    W    = wb * mu**2 / sig
+    z    = eta + (yb - mu)/mu
+    g   += dot(Zb.T, W*z)
+    H   += dot(Zb.T, W[:,None] * Zb[:,cols])
+  return H / Nw, g / Nw, D
+
+
+def coordinate_descent(H, g, b, cols, lam, alpha, tol=1e-9, maxSweep=1000):
+  """
+  Minimize the penalized quadratic 1/2 b^T H b - g^T b + <lam> (<alpha>
+  |b|_1 + (1 - <alpha>)/2 |b|^2) over the coordinates <cols> of <b>, in
+  place, by cyclic coordinate descent; coordinate 0, the intercept, is not
+  penalized and the others are held fixed.  <H> holds only the columns
+  <cols> of the full matrix.  Returns the number of sweeps.
+  """
+  Hs  = H[cols]                          # the square block over <cols>
+  gs  = g[cols]
+  bs  = b[cols].copy()
+  r   = gs - dot(Hs, bs)                 # partial residuals, kept current
+  l1  = lam * alpha
+  l2  = lam * (1 - alpha)
+  for sweep in range(maxSweep):
+    dmax = 0.0
+    for k,j in enumerate(cols):
+      h  = Hs[k,k]
+      if j == 0: bk = bs[k] + r[k] / h
+      else:      bk = soft(h * bs[k] + r[k], l1) / (h + l2)
+      d  = bk - bs[k]
+      if d != 0.0:
+        r    -= d * Hs[:,k]
+        bs[k] = bk
+        dmax  = max(dmax, h * d**2)
+    if dmax < tol:
+      break
+  b[cols] = bs
+  return sweep + 1
+
+
+def glm_path(X, y, w=1.0, alpha=1.0, nlambda=50, ratio=1e-3, lambdas=None,
+             chunk=2**16, tol=1e-9, rtol=1e-4, maxIter=25, verbose=True):
+  """
+  Elastic-net regularization path of the log-link Gaussian GLM of <y> on
+  the <n> x <p> design <X> (as for glm_chunked()) with prior weights <w>.
+  With the columns standardized, the coefficients minimize, at each of a
+  decreasing grid of <nlambda> penalties from the smallest that zeroes
+  every coefficient down to <ratio> times it (or the given <lambdas>),
+
+    sum w (y - mu)^2 / (2 sig sum w) + lambda (alpha |b|_1
+                                               + (1 - alpha)/2 |b|^2),
+
+  <alpha> = 1 being the lasso.  Each penalty is warm-started from the
+  last.  Its IRLS iterations, at most <maxIter> until the coefficients
+  change by less than <rtol>, each take one pass over the data followed
+  by coordinate descent on the p x p working problem to <tol>.
+
+  Only the strong set of Tibshirani et al. (2012) is updated and only its
+  columns of the Gram matrix are formed; coefficients outside it that
+  violate the optimality conditions are added and the penalty is refit,
+  so columns which never enter the model are never iterated over.
+
+  Returns a dictionary with the penalties 'lambda', the coefficients
+  'ahat' on the scale of <X> (<nlambda> x (p+1), intercept first), the
+  column standard deviations 'scale' by which they multiply to the
+  standardized scale, the training 'deviance' sum w (y - mu)^2 at the
+  start of the last iteration of each penalty, the number of non-zero
+  coefficients 'df', the IRLS iterations 'nIter' of each penalty and the
+  wall time 'time' in seconds.
+  """
+  t0    = time()
+  n,q   = X.shape
+  y     = asarray(y, dtype=float64)
+  sig   = var(y)
+  m, sd = column_scale(X, w, chunk)
+
+  # the intercept-only fit, at which every penalized coefficient is zero :
+  b     = zeros(q+1)
+  if ndim(w) == 0: ybar = y.mean()
+  else:            ybar = sum(w*y) / sum(w)
+  b[0]  = log(ybar)
+  H, g, D = working_pass(X, y, w, b, [0], m, sd, sig, chunk)
+  grad  = g - H[:,0] * b[0]
+
+  if lambdas is None:
+    lmax    = abs(grad[1:]).max() / max(alpha, 1e-3)
+    lambdas = logspace(log(lmax), log(lmax*ratio), nlambda, base=exp(1))
+  nlambda = len(lambdas)
+
+  ahat  = empty((nlambda, q+1))
+  dev   = empty(nlambda)
+  df    = zeros(nlambda, dtype=int)
+  nIter = zeros(nlambda, dtype=int)
+  lprev = lambdas[0]
+  for k,lam in enumerate(lambdas):
+    # strong rule screening with the gradient at the previous solution :
+    strong = flatnonzero(abs(grad[1:]) >= alpha * (2*lam - lprev)) + 1
+    cols   = list(union1d(union1d([0], flatnonzero(b)), strong))
+    while True:
+      for it in range(maxIter):
+        H, g, D = working_pass(X, y, w, b, cols, m, sd, sig, chunk)
+        b_o     = b.copy()
+        coordinate_descent(H, g, b, cols, lam, alpha, tol)
+        nIter[k] += 1
+        if abs(b - b_o).max() < rtol:
+          break
+      grad = g - dot(H, b[cols])
+      viol = [j for j in flatnonzero(abs(grad[1:]) > lam*alpha) + 1
+              if j not in cols]
+      if len(viol) == 0:
+        break
+      cols = sorted(cols + viol)
+    lprev = lam
+
+    # back to the scale of X :
+    ahat[k,1:] = b[1:] / sd
+    ahat[k,0]  = b[0] - dot(m, ahat[k,1:])
+    dev[k]     = D
+    df[k]      = len(flatnonzero(b[1:]))
+    if verbose:
+      string = "lambda %d: %.3e, %d non-zero, %d IRLS iterations, " \
+               + "deviance %.6e"
+      print(string % (k, lam, df[k], nIter[k], dev[k]))
+
+  vara = {'lambda'   : lambdas,
+          'ahat'     : ahat,
+          'scale'    : sd,
+          'deviance' : dev,
+          'df'       : df,
+          'nIter'    : nIter,
+          'time'     : time() - t0}
+  return vara
+
+
+def predict_path(X, ahat, chunk=2**16):
+  """
+  Return the fitted means exp(<ahat>[:,0] + X <ahat>[:,1:]^T) of every
+  penalty of a path as an <n> x <nlambda> array, evaluated block-wise.
+  """
+  n  = X.shape[0]
+  mu = empty((n, ahat.shape[0]))
+  for s,e in row_blocks(n, chunk):
+    mu[s:e] = exp(ahat[:,0] + dot(asarray(X[s:e], dtype=float64),
+                                  ahat[:,1:].T))
+  return mu
+
+
+def path_fold(f):
+  """
+  Compute the path without the rows of fold <f> on the penalties of the
+  full-data path and return the weighted mean squared error of each
+  penalty on the held-out rows.
+  """
+  test = job['folds'] == f
+  p    = glm_path(job['X'], job['y'], job['w'] * (~test),
+                  lambdas=job['lambda'], verbose=False, **job['kwargs'])
+  mu   = predict_path(job['X'], p['ahat'])[test]
+  wt   = job['w'][test]
+  return dot(wt, (job['y'][test][:,None] - mu)**2) / sum(wt)
+
+
+def cv_path(X, y, folds, w=1.0, processes=None, **kwargs):
+  """
+  Regularization path of glm_path() with the cross-validated deviance of
+  each penalty, the rows assigned to folds by the integer array <folds>,
+  e.g. from spatial_folds().  The paths without each fold use the
+  penalties of the full-data path and run in a pool of <processes> forked
+  workers (default, one per fold) reading the data from shared memory.
+
+  Returns the dictionary of glm_path() with the held-out weighted mean
+  squared error of each fold and penalty 'cv_k', their mean 'cv' weighted
+  by fold size and its standard error 'cv_se', and the penalty of least
+  'cv', 'lambda_min', and the largest within one standard error of it,
+  'lambda_1se', with their indices 'i_min' and 'i_1se'.
+  """
+  t0   = time()
+  n    = len(y)
+  if ndim(w) == 0:
+    w  = w * ones(n)
+  path = glm_path(X, y, w, **kwargs)
+
+  k    = int(folds.max()) + 1
+  kwargs.pop('lambdas', None)
+  kwargs.pop('verbose', None)
+  kwargs.pop('nlambda', None)
+  kwargs.pop('ratio',   None)
+  job.clear()
+  job.update({'X'      : share_design(X),
+              'y'      : shared_array(asarray(y, dtype=float64)),
+              'w'      : shared_array(asarray(w, dtype=float64)),
+              'folds'  : asarray(folds),
+              'lambda' : path['lambda'],
+              'kwargs' : kwargs})
+  if processes is None:
+    processes = k
+  cv_k  = asarray(run(path_fold, range(k), min(processes, k)))
+
+  size  = asarray([sum(folds == f) for f in range(k)], dtype=float64)
+  cv    = dot(size, cv_k) / sum(size)
+  cv_se = sqrt(dot(size, (cv_k - cv)**2) / sum(size) / (k - 1))
+  i_min = argmin(cv)
+  i_1se = flatnonzero(cv <= cv[i_min] + cv_se[i_min])[0]
+
+  path.update({'cv_k'       : cv_k,
+               'cv'         : cv,
+               'cv_se'      : cv_se,
+               'lambda_min' : path['lambda'][i_min],
+               'lambda_1se' : path['lambda'][i_1se],
+               'i_min'      : i_min,
+               'i_1se'      : i_1se,
+               'time'       : time() - t0})
+  return path
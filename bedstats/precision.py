@@ -0,0 +1,75 @@
+from numpy import asarray, abs, dtype, load, savez, float64
+
+
+def nbytes(arrays):
+  """
+  Return the number of bytes held by the arrays of the dictionary or
+  sequence <arrays>, and the number they would hold in float64.
+  """
+  if isinstance(arrays, dict):
+    arrays = arrays.values()
+  used = 0
+  full = 0
+  for a in arrays:
+    a     = asarray(a)
+    used += a.nbytes
+    full += a.size * dtype(float64).itemsize
+  return used, full
+
+
+def print_memory(arrays, label='features'):
+  """
+  Print the memory held by the <arrays> as counted by nbytes() and the
+  saving over storing them in float64.
+  """
+  used, full = nbytes(arrays)
+  print("%s : %.1f MB, %.1f MB in float64, %.1f MB (%.0f %%) saved"
+        % (label, used / 2.0**20, full / 2.0**20, (full - used) / 2.0**20,
+           100.0 * (full - used) / full))
+
+
+def save_coefficients(fn, out):
+  """
+  Save the estimates and standard errors of the fit <out> of glm() or
+  glm_chunked() to the .npz file <fn>, as the reference for
+  compare_coefficients().
+  """
+  savez(fn, ahat=out['ahat'], sea=out['sea'])
+
+
+def compare_coefficients(out, ref, tol=0.05):
+  """
+  Compare the estimates of the fit <out> to those of the reference fit
+  <ref>, a fit or the name of a file written by save_coefficients(),
+  typically of the same model with the data stored in float64.  Returns a
+  dictionary with the largest absolute difference of the estimates in
+  units of the reference standard errors 'max_se', the largest relative
+  difference 'max_rel', the index of the worst estimate 'worst', the
+  tolerance 'tol' and whether 'max_se' is within it, 'ok'.
+  """
+  if isinstance(ref, str):
+    ref = load(ref)
+  a    = asarray(ref['ahat'])
+  d    = abs(asarray(out['ahat']) - a)
+  d_se = d / asarray(ref['sea'])
+  vara = {'max_se'  : d_se.max(),
+          'max_rel' : (d / abs(a)).max(),
+          'worst'   : d_se.argmax(),
+          'tol'     : tol,
+          'ok'      : d_se.max() <= tol}
+  return vara
+
+
+def print_comparison(cmp, names=None):
+  """
+  Print the result <cmp> of compare_coefficients(), naming the worst
+  estimate by <names> (intercept first) if given.
+  """
+  k = cmp['worst']
+  if names is None: n = 'x%d' % k
+  else:             n = names[k]
+  if cmp['ok']: state = 'within'
+  else:         state = 'NOT within'
+  print("estimates differ from the reference by at most %.2e standard "
+        "errors (%s, relative %.2e), %s the tolerance %.2e"
+        % (cmp['max_se'], n, cmp['max_rel'], state, cmp['tol']))
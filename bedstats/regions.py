@@ -0,0 +1,135 @@
+from multiprocessing     import Pool
+from numpy               import hstack, where, arange, zeros, count_nonzero, \
+                                float64
+from fenics              import Mesh, FunctionSpace, Function
+
+from bedstats.features   import FeatureStore, MESH
+from bedstats.dolfin_bed import DolfinBedLoader
+from bedstats.filters    import merge_counts
+
+
+class Region(object):
+  """
+  One ice sheet or basin of a multi-region data set : the bed directory
+  <bed_dir> written by extract_bed.py, a function <data> returning the
+  DataInput used to plot on it, e.g.
+
+    lambda : DataInput(DataFactory.get_ant_measures(res=900),
+                       gen_space=False),
+
+  and a <label> naming its output directory.  load_regions() sets the rows
+  start:stop of the region in the concatenated table.
+  """
+  def __init__(self, label, bed_dir, data):
+    self.label   = label
+    self.bed_dir = bed_dir
+    self.data    = data
+    self.Q       = None
+    self.store   = None
+    self.di      = None
+    self.start   = None
+    self.stop    = None
+
+  def space(self):
+    """
+    Return the CG1 function space of the submesh.
+    """
+    if self.Q is None:
+      mesh   = Mesh(self.bed_dir + MESH)
+      self.Q = FunctionSpace(mesh, 'CG', 1)
+    return self.Q
+
+  def feature_store(self):
+    """
+    Return the FeatureStore of the bed directory.
+    """
+    if self.store is None:
+      self.store = FeatureStore(self.bed_dir,
+                                DolfinBedLoader(self.bed_dir, self.Q))
+    return self.store
+
+  def data_input(self):
+    """
+    Return the DataInput of the region, created on first use.
+    """
+    if self.di is None:
+      self.di = self.data()
+    return self.di
+
+  def valid(self, ok):
+    """
+    Return the local indices of the nodes of this region selected by the
+    mask <ok> over the whole table.
+    """
+    return where(ok[self.start:self.stop])[0]
+
+  def conv(self, ok):
+    """
+    Return the positions of this region's selected nodes in a vector over
+    all the nodes selected by <ok>, e.g. the fitted values of a model.
+    """
+    a = count_nonzero(ok[:self.start])
+    return arange(a, a + count_nonzero(ok[self.start:self.stop]))
+
+  def function(self, ok, x):
+    """
+    Return a Function on the region holding the values <x> over all the
+    nodes selected by <ok> at its selected nodes, and zero elsewhere.
+    """
+    f                  = Function(self.space())
+    v                  = zeros(self.stop - self.start)
+    v[self.valid(ok)]  = x[self.conv(ok)]
+    f.vector().set_local(v)
+    f.vector().apply('insert')
+    return f
+
+
+def load_fields(args):
+  """
+  Return the columns <fields> of the bed directory <bed_dir> converted to
+  <dtype>, given as the tuple <args> so as to be mapped over a Pool.
+  """
+  bed_dir, fields, dtype = args
+  F = FeatureStore(bed_dir, DolfinBedLoader(bed_dir)).load(fields)
+  return dict((k, F[k].astype(dtype, copy=False)) for k in fields)
+
+
+def load_regions(regions, fields, processes=None, dtype=float64):
+  """
+  Load the columns <fields> of every Region in <regions>, one process per
+  region at a time using at most <processes> (default, one per region),
+  and return a dictionary of the columns concatenated in the order of
+  <regions>.  The rows of each region are set as its start and stop.
+
+  The columns are converted to <dtype> in the workers, so with float32
+  both the copies sent back and the concatenated table take half the
+  memory; the cache of each region stays in float64.
+  """
+  if processes is None:
+    processes = len(regions)
+  args = [(r.bed_dir, fields, dtype) for r in regions]
+  if processes > 1 and len(regions) > 1:
+    pool = Pool(min(processes, len(regions)))
+    cols = pool.map(load_fields, args, chunksize=1)
+    pool.close()
+    pool.join()
+  else:
+    cols = [load_fields(a) for a in args]
+
+  start = 0
+  for r, F in zip(regions, cols):
+    r.start = start
+    r.stop  = start + len(F[fields[0]])
+    start   = r.stop
+  return dict((k, hstack([F[k] for F in cols])) for k in fields)
+
+
+def filter_regions(regions, spec):
+  """
+  Return the mask over the concatenated table of the nodes satisfying the
+  filter <spec> (see bedstats/filters.py), evaluated and cached by the
+  FeatureStore of each region, and the rejection counts summed over the
+  regions.
+  """
+  masks, counts = zip(*[r.feature_store().filter(spec) for r in regions])
+  return hstack(masks), merge_counts(*counts)
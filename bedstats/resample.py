@@ -0,0 +1,220 @@
+from multiprocessing  import Pool, cpu_count
+from numpy            import zeros, ones, empty, unique, floor, exp, sum, \
+                             bincount, isnan, nan, ndim, asarray, percentile, \
+                             float64
+from numpy.random     import RandomState
+from numpy.linalg     import LinAlgError
+from time             import time
+
+from bedstats.chunked import glm_chunked, row_blocks
+from bedstats.design  import LazyDesign
+from bedstats.shared  import shared_array
+
+# the data of the current resampling run; set before the pool is forked so
+# that every worker inherits it instead of receiving it pickled :
+job = {}
+
+
+def share_design(X):
+  """
+  Return the design <X> with its data in shared memory : a LazyDesign
+  referencing shared copies of its base variables, or <X> itself if it is
+  already on disk, such as a memory map returned by open_design().
+  """
+  if isinstance(X, LazyDesign):
+    base = dict((j, shared_array(asarray(b))) for j,b in X.base.items())
+    return LazyDesign(base, X.terms, X.names, X.chunk, X.n)
+  return X
+
+
+def predict(X, ahat, chunk=2**16):
+  """
+  Return the fitted mean exp(<ahat>[0] + X <ahat>[1:]) of the log-link GLM
+  for the design <X>, evaluated block-wise.
+  """
+  n      = X.shape[0]
+  mu     = empty(n)
+  for s,e in row_blocks(n, chunk):
+    mu[s:e] = exp(ahat[0] + asarray(X[s:e], dtype=float64).dot(ahat[1:]))
+  return mu
+
+
+def spatial_folds(x, y, k, size=1e5, group=None, seed=0):
+  """
+  Assign the nodes at coordinates <x>, <y> to <k> cross-validation folds
+  by square blocks of side <size> (in the units of the coordinates), so
+  that neighbouring, and hence correlated, nodes are held out together.
+  Nodes of different <group>s, e.g. the region index, never share a block.
+  Blocks are dealt to the folds in random order.  Returns the fold index
+  of each node.
+  """
+  bx  = floor((x - x.min()) / size).astype(int)
+  by  = floor((y - y.min()) / size).astype(int)
+  nx  = bx.max() + 1
+  ny  = by.max() + 1
+  key = bx * ny + by
+  if group is not None:
+    key = key + asarray(group, dtype=int) * nx * ny
+  blocks, inv = unique(key, return_inverse=True)
+  perm        = RandomState(seed).permutation(len(blocks))
+  return (perm % k)[inv]
+
+
+def refit(w, fac0=None):
+  """
+  Refit the model of the current run with the prior weights <w>, warm-
+  started from the full-data estimates and, if given, taking the first
+  Newton step with the factorization <fac0>.  Returns the parameters and
+  the number of Newton iterations, or None if the fit was singular.  The
+  refits print nothing, their iterations being left to the telemetry.
+  """
+  kwargs = dict(job['kwargs'], verbose=False)
+  try:
+    out = glm_chunked(job['X'], job['y'], w, a0=job['ahat'], fac0=fac0,
+                      **kwargs)
+  except LinAlgError:
+    return None
+  return out['ahat'], out['nIter']
+
+
+def bootstrap_replicate(b):
+  """
+  Fit the <b>-th bootstrap replicate.  Drawing n rows with replacement is
+  the same as weighting each row by the number of times it is drawn, so
+  the design is never copied.  The replicate weights sum to those of the
+  data, so the full-data factorization serves for the first step.
+  """
+  n = len(job['y'])
+  c = bincount(RandomState(job['seed'] + b).randint(0, n, n), minlength=n)
+  return refit(job['w'] * c, job['fac'])
+
+
+def cv_fold(f):
+  """
+  Fit the model without the rows of fold <f> and return the parameters,
+  iteration count and weighted mean squared error on the held-out rows.
+  """
+  test = job['folds'] == f
+  r    = refit(job['w'] * (~test))
+  if r is None:
+    return None
+  ahat, nIter = r
+  mu   = predict(job['X'], ahat)[test]
+  wt   = job['w'][test]
+  return ahat, nIter, sum(wt * (job['y'][test] - mu)**2) / sum(wt)
+
+
+def run(func, tasks, processes):
+  """
+  Map <func> over <tasks> in a pool of <processes> forked workers, or in
+  this process if <processes> is 1.
+  """
+  if processes == 1:
+    return [func(i) for i in tasks]
+  pool = Pool(processes)
+  res  = pool.map(func, tasks, chunksize=1)
+  pool.close()
+  pool.join()
+  return res
+
+
+def setup(X, y, w, out, processes, seed=0, **kwargs):
+  """
+  Place the data of a resampling run where the workers inherit it.
+  """
+  n  = len(y)
+  if ndim(w) == 0:
+    w = w * ones(n)
+  job.clear()
+  job.update({'X'      : share_design(X),
+              'y'      : shared_array(asarray(y, dtype=float64)),
+              'w'      : shared_array(asarray(w, dtype=float64)),
+              'ahat'   : out['ahat'],
+              'fac'    : out.get('fac'),
+              'seed'   : seed,
+              'kwargs' : kwargs})
+  if processes is None:
+    processes = cpu_count()
+  return processes
+
+
+def bootstrap(X, y, w=1.0, out=None, B=1000, conf=0.95, processes=None,
+              seed=0, **kwargs):
+  """
+  Nonparametric bootstrap of the log-link GLM of <y> on the design <X>
+  (as for glm_chunked()) with prior weights <w>.  Each of the <B> refits
+  is warm-started from the full-data fit <out>, computed first if not
+  given, and the replicates are spread over <processes> forked workers
+  (default, one per core) reading the data from shared memory.
+
+  Returns a dictionary with the replicate parameters 'ahat_b' (<B> x p,
+  rows of nan for singular replicates), the percentile interval 'lo' to
+  'hi' at level <conf>, the bootstrap standard errors 'se', the Newton
+  iterations 'nIter' of each replicate, the number of failed replicates
+  'failed' and the wall time 'time' in seconds.
+  """
+  t0 = time()
+  if out is None:
+    out = glm_chunked(X, y, w, **kwargs)
+  processes = setup(X, y, w, out, processes, seed, **kwargs)
+  res       = run(bootstrap_replicate, range(B), processes)
+
+  p      = len(out['ahat'])
+  ahat_b = empty((B, p))
+  nIter  = zeros(B, dtype=int)
+  for b,r in enumerate(res):
+    if r is None:
+      ahat_b[b] = nan
+    else:
+      ahat_b[b], nIter[b] = r
+  ok     = ~isnan(ahat_b[:,0])
+  alpha  = 100 * (1 - conf) / 2
+  vara   = {'ahat_b' : ahat_b,
+            'lo'     : percentile(ahat_b[ok], alpha,       axis=0),
+            'hi'     : percentile(ahat_b[ok], 100 - alpha, axis=0),
+            'se'     : ahat_b[ok].std(axis=0, ddof=1),
+            'nIter'  : nIter,
+            'failed' : B - sum(ok),
+            'time'   : time() - t0}
+  return vara
+
+
+def cross_validate(X, y, folds, w=1.0, out=None, processes=None, **kwargs):
+  """
+  K-fold cross-validation of the log-link GLM of <y> on the design <X>
+  with prior weights <w>, the rows assigned to folds by the integer array
+  <folds>, e.g. from spatial_folds().  The fit without each fold is
+  warm-started from the full-data fit <out> (computed first if not given)
+  and the folds are fit in parallel as in bootstrap().
+
+  Returns a dictionary with the parameters 'ahat_k' of each fold, the
+  held-out weighted mean squared error 'deviance' of each fold, their
+  average 'cv' weighted by fold size, 'nIter', 'failed' and 'time'.
+  """
+  t0 = time()
+  if out is None:
+    out = glm_chunked(X, y, w, **kwargs)
+  processes = setup(X, y, w, out, processes, **kwargs)
+  job['folds'] = asarray(folds)
+  k         = int(folds.max()) + 1
+  res       = run(cv_fold, range(k), min(processes, k))
+
+  p      = len(out['ahat'])
+  ahat_k = empty((k, p))
+  dev    = empty(k)
+  nIter  = zeros(k, dtype=int)
+  for f,r in enumerate(res):
+    if r is None:
+      ahat_k[f] = nan
+      dev[f]    = nan
+    else:
+      ahat_k[f], nIter[f], dev[f] = r
+  size   = bincount(folds, minlength=k)
+  ok     = ~isnan(dev)
+  vara   = {'ahat_k'   : ahat_k,
+            'deviance' : dev,
+            'cv'       : sum(dev[ok] * size[ok]) / float(sum(size[ok])),
+            'nIter'    : nIter,
+            'failed'   : k - sum(ok),
+            'time'     : time() - t0}
+  return vara
@@ -0,0 +1,31 @@
+from multiprocessing import RawArray
+from numpy           import frombuffer, float32, float64
+
+
+def shared_array(a):
+  """
+  Return a copy of the float array <a> placed in shared memory, in single
+  precision if <a> is float32 and in double precision otherwise.
+  Processes forked afterwards, such as the workers of a
+  multiprocessing.Pool, all see the same pages instead of their own
+  copies.
+  """
+  if a.dtype == float32: code, dtype = 'f', float32
+  else:                  code, dtype = 'd', float64
+  buf = RawArray(code, int(a.size))
+  s   = frombuffer(buf, dtype=dtype).reshape(a.shape)
+  s[:] = a
+  return s
+
+
+def share_globals(namespace, names):
+  """
+  Replace each array named in <names> in the dictionary <namespace>, e.g.
+  the vars() of a module, by a shared-memory copy from shared_array().
+  Returns the total number of bytes placed in shared memory.
+  """
+  nbytes = 0
+  for k in names:
+    namespace[k] = shared_array(namespace[k])
+    nbytes      += namespace[k].nbytes
+  return nbytes
@@ -0,0 +1,140 @@
+from multiprocessing   import cpu_count
+from numpy             import asarray, zeros, unique, ceil, column_stack, \
+                              maximum, diff, arange, array_split, sum, nan, \
+                              float64
+from numpy.random      import RandomState
+from scipy.spatial     import cKDTree
+from time              import time
+
+from bedstats.resample import run
+
+# the k-d trees of the current run; set before the pool is forked so that
+# every worker inherits them instead of receiving them pickled :
+job = {}
+
+
+def bin_sums(task):
+  """
+  Return the numbers of pairs of nodes of group g whose distance lies in
+  each of the lag bins b0 to b1-1, the task <task> = (g, b0, b1), and the
+  sums over those pairs of z_i^2, z_j^2 and z_i z_j, the first node of
+  each pair an anchor, as a (b1-b0) x 4 array.  Each sum takes a single
+  traversal of the trees for all the bins.
+  """
+  g, b0, b1     = task
+  TA, T, zA, z  = job['trees'][g]
+  r             = job['edges'][b0:b1+1]
+  vara = zeros((b1-b0, 4))
+  for j, wt in enumerate([None, (zA**2, None), (None, z**2), (zA, z)]):
+    vara[:,j] = diff(TA.count_neighbors(T, r, weights=wt, cumulative=True))
+  return vara
+
+
+def variogram(x, y, z, edges, group=None, sample=None, processes=None,
+              seed=0, leafsize=16):
+  """
+  Empirical semivariogram and Moran's I correlogram of the field <z>, e.g.
+  the residuals of a fit, at the nodes at coordinates <x>, <y>, over the
+  lag bins (h_b, h_b+1] between successive <edges>.  Nodes of different
+  <group>s, e.g. the region index, are never paired.
+
+  The pairs of a bin are counted rather than listed, by the dual-tree
+  count_neighbors() of k-d trees of the nodes, so that a query is bounded
+  by the largest lag and whole subtrees within a bin are counted at once.
+  Weighting the count by z gives the sums of
+
+    2 N(h) gamma(h) = sum (z_i - z_j)^2 = sum z_i^2 + sum z_j^2
+                                          - 2 sum z_i z_j,
+
+    I(h) = (sum z_i z_j / N(h)) / (sum z^2 / n),
+
+  z centred on the mean of its group.  With <sample> the first node of
+  each pair is one of that many anchors drawn at random from all groups
+  in proportion to their size, cutting the cost by about n / <sample>.
+  The bins of every group are split into runs of adjacent bins counted
+  in a pool of <processes> forked workers (default, one per CPU).
+
+  Returns a dictionary with the 'edges', the bin centres 'h', the numbers
+  of pairs 'pairs', the semivariances 'gamma', Moran's I 'moran' and its
+  expectation -1/(n-1) under no autocorrelation 'E_moran', the variance
+  'var' of z and the 'time' taken.
+  """
+  t0    = time()
+  x     = asarray(x, dtype=float64)
+  y     = asarray(y, dtype=float64)
+  z     = asarray(z, dtype=float64)
+  edges = asarray(edges, dtype=float64)
+  n     = len(z)
+  nb    = len(edges) - 1
+  if group is None:
+    group = zeros(n, dtype=int)
+  groups = unique(group)
+  rng    = RandomState(seed)
+
+  trees = {}
+  ss    = 0.0
+  for g in groups:
+    i   = (group == g).nonzero()[0]
+    zg  = z[i] - z[i].mean()
+    ss += sum(zg**2)
+    X   = column_stack((x[i], y[i]))
+    T   = cKDTree(X, leafsize)
+    if sample is None or sample >= n:
+      A = slice(None)
+    else:
+      m = int(ceil(sample * len(i) / float(n)))
+      A = rng.choice(len(i), min(m, len(i)), replace=False)
+    trees[g] = (cKDTree(X[A], leafsize), T, zg[A], zg)
+
+  job.clear()
+  job.update({'trees' : trees,
+              'edges' : edges})
+  if processes is None:
+    processes = cpu_count()
+  runs  = array_split(arange(nb), min(processes, nb))
+  tasks = [(g, b[0], b[-1]+1) for g in groups for b in runs]
+  res   = run(bin_sums, tasks, min(processes, len(tasks)))
+  job.clear()
+
+  S     = zeros((nb, 4))
+  for (g, b0, b1), s in zip(tasks, res):
+    S[b0:b1] += s
+  N     = S[:,0]
+  Nd    = maximum(N, 1)
+  var   = ss / n
+
+  vara = {'edges'   : edges,
+          'h'       : 0.5 * (edges[:-1] + edges[1:]),
+          'pairs'   : N,
+          'gamma'   : (S[:,1] + S[:,2] - 2*S[:,3]) / (2*Nd),
+          'moran'   : S[:,3] / Nd / var,
+          'E_moran' : -1.0 / (n - 1),
+          'var'     : var,
+          'time'    : time() - t0}
+  vara['gamma'][N == 0] = nan
+  vara['moran'][N == 0] = nan
+  return vara
+
+
+def print_variogram(v):
+  """
+  Print the semivariogram and correlogram <v> of variogram(), one row per
+  lag bin.
+  """
+  print("variogram of variance %.4g, E[I] = %.2e, computed in %.2f s"
+        % (v['var'], v['E_moran'], v['time']))
+  print("%12s %12s %12s %10s" % ('h', 'pairs', 'gamma', 'I'))
+  for h, N, g, I in zip(v['h'], v['pairs'], v['gamma'], v['moran']):
+    print("%12.4g %12.4g %12.4g %10.4f" % (h, N, g, I))
+
+
+def write_variogram(fn, v):
+  """
+  Write the semivariogram and correlogram <v> of variogram() as LaTeX rows
+  of the bin centre, number of pairs, semivariance and Moran's I to <fn>.
+  """
+  f = open(fn, 'w')
+  for h, N, g, I in zip(v['h'], v['pairs'], v['gamma'], v['moran']):
+    f.write('%.4g & %.4g & %.4g & %.4f \\\\\n' % (h, N, g, I))
+  f.write('\n')
+  f.close()
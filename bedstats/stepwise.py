@@ -0,0 +1,77 @@
+from numpy            import array, asarray, sign, where, union1d
+from time             import time
+
+from bedstats.glm     import factor_downdate
+from bedstats.chunked import glm_chunked
+
+
+def significant(ahat, ci):
+  """
+  Return the indices of the parameters <ahat> whose confidence intervals
+  <ahat> +/- <ci> do not contain zero.
+  """
+  return where(sign(ahat - ci) == sign(ahat + ci))[0]
+
+
+def backward_eliminate(X, y, w=1.0, names=None, out=None, **kwargs):
+  """
+  Repeatedly drop the explanatory terms of the log-link GLM of <y> on the
+  design <X> (a LazyDesign or any design with a select() method) whose
+  Bonferroni confidence intervals contain zero, and refit, until every
+  remaining term is significant.  The intercept is always retained.
+
+  The prior weights <w> are used for every refit.  Each refit is
+  warm-started from the previous estimates restricted to the kept terms,
+  and its first Newton step uses the previous factorization with the
+  dropped columns deleted (see factor_downdate()) instead of a fresh pass
+  over the data, so a refit typically takes only a few iterations.  <out>
+  is the fit of the full model if already available, <names> the term
+  names including the intercept, and <kwargs> are passed to glm_chunked().
+
+  Returns a list with one dictionary per fit, the full model first,
+  holding the fit 'out', the term 'names' and column indices 'cols' into
+  the full model, the number of terms 'dropped' before this fit, the
+  Newton iteration count 'nIter' and the wall time 'time' in seconds.
+  """
+  t0    = time()
+  if out is None:
+    out = glm_chunked(X, y, w, **kwargs)
+  cols  = array(range(X.shape[1] + 1))
+  if names is not None:
+    names = array(names)
+
+  steps = [{'out'     : out,
+            'names'   : names,
+            'cols'    : cols,
+            'dropped' : 0,
+            'nIter'   : len(out['rel_a']),
+            'time'    : time() - t0}]
+
+  while True:
+    keep = union1d([0], significant(out['ahat'], out['ci']))
+    if len(keep) == len(out['ahat']):
+      break
+
+    t0    = time()
+    drop  = len(out['ahat']) - len(keep)
+    X     = X.select(keep[1:]-1)
+    a0    = out['ahat'][keep]
+    fac0  = factor_downdate(out['fac'], keep)
+    out   = glm_chunked(X, y, w, a0=a0, fac0=fac0, **kwargs)
+    cols  = cols[keep]
+    if names is not None:
+      names = names[keep]
+
+    steps.append({'out'     : out,
+                  'names'   : names,
+                  'cols'    : cols,
+                  'dropped' : drop,
+                  'nIter'   : len(out['rel_a']),
+                  'time'    : time() - t0})
+
+    string = "backward elimination step %d: dropped %d terms, %d remain, " \
+             + "%d Newton iterations in %.2f s"
+    print(string % (len(steps) - 1, drop, len(keep),
+                    steps[-1]['nIter'], steps[-1]['time']))
+
+  return steps
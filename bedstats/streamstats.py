@@ -0,0 +1,162 @@
+from numpy import array, asarray, hstack, ones, cumsum, floor, arcsin, pi, \
+                  argsort, flatnonzero, diff, add, interp, sqrt, inf, float64
+
+
+class StreamStats(object):
+  """
+  One-pass summary of a stream of values, fed in chunks with update() :
+  the count, mean, variance (as the sum of squared deviations <M2>),
+  minimum and maximum, combined across chunks with the pairwise update of
+  Chan et al., and a t-digest of the distribution from which quantiles are
+  interpolated.
+
+  The digest holds at most about <compression> weighted centroids,
+  narrowest at the tails, formed by grouping the sorted values by the
+  integer part of the arcsine scale function of their cumulative weight;
+  the rank error of a quantile is a small fraction of a percent.  Two
+  summaries of disjoint data merge() exactly for the moments and with the
+  same accuracy for the quantiles, so partial summaries may be computed on
+  separate processes or MPI ranks and combined without gathering the data.
+  """
+  def __init__(self, compression=200):
+    self.compression = compression
+    self.n           = 0
+    self.mu          = 0.0
+    self.M2          = 0.0
+    self.xmin        =  inf
+    self.xmax        = -inf
+    self.means       = array([])     # centroid means
+    self.weights     = array([])     # centroid weights
+
+  def combine(self, n, mu, M2, xmin, xmax):
+    """
+    Add the moments of another set of <n> values to those of this one.
+    """
+    if n == 0:
+      return
+    N        = self.n + n
+    d        = mu - self.mu
+    self.M2 += M2 + d**2 * self.n * n / float(N)
+    self.mu += d * n / float(N)
+    self.n   = N
+    self.xmin = min(self.xmin, xmin)
+    self.xmax = max(self.xmax, xmax)
+
+  def compress(self, means, weights):
+    """
+    Replace the digest by the compression of the centroids <means> with
+    <weights>.
+    """
+    o     = argsort(means, kind='mergesort')
+    m     = means[o]
+    w     = weights[o]
+    N     = w.sum()
+    q     = (cumsum(w) - w/2) / N
+    k     = floor(self.compression * (arcsin(2*q - 1) / pi + 0.5))
+    s     = hstack(([0], flatnonzero(diff(k)) + 1))
+    W     = add.reduceat(w, s)
+    self.means   = add.reduceat(m*w, s) / W
+    self.weights = W
+
+  def update(self, x):
+    """
+    Add the chunk of values <x>, returning this object.
+    """
+    x  = asarray(x, dtype=float64).ravel()
+    n  = len(x)
+    if n == 0:
+      return self
+    mu = x.mean()
+    self.combine(n, mu, ((x - mu)**2).sum(), x.min(), x.max())
+    self.compress(hstack((self.means, x)), hstack((self.weights, ones(n))))
+    return self
+
+  def merge(self, other):
+    """
+    Add the summary <other> of disjoint data, returning this object.
+    """
+    self.combine(other.n, other.mu, other.M2, other.xmin, other.xmax)
+    if other.n > 0:
+      self.compress(hstack((self.means, other.means)),
+                    hstack((self.weights, other.weights)))
+    return self
+
+  def mean(self):
+    """
+    Return the mean.
+    """
+    return self.mu
+
+  def var(self, ddof=0):
+    """
+    Return the variance with <ddof> delta degrees of freedom, as numpy.
+    """
+    return self.M2 / (self.n - ddof)
+
+  def std(self, ddof=0):
+    """
+    Return the standard deviation with <ddof> delta degrees of freedom.
+    """
+    return sqrt(self.var(ddof))
+
+  def quantile(self, q):
+    """
+    Return the estimated <q>-quantile(s), 0 <= <q> <= 1, interpolated
+    between the centroids with the exact extremes at the ends.
+    """
+    mids = cumsum(self.weights) - self.weights/2
+    pos  = hstack(([0], mids, [self.n]))
+    val  = hstack(([self.xmin], self.means, [self.xmax]))
+    return interp(asarray(q) * self.n, pos, val)
+
+  def median(self):
+    """
+    Return the median.
+    """
+    return self.quantile(0.5)
+
+  def iqr(self):
+    """
+    Return the interquartile range.
+    """
+    q1, q3 = self.quantile([0.25, 0.75])
+    return q3 - q1
+
+  def table(self):
+    """
+    Return the statistics of the tables written by the linear model
+    scripts : the mean, median, variance, IQR and variance-to-mean ratio.
+    """
+    s2 = self.var()
+    return [self.mu, self.median(), s2, self.iqr(), s2 / self.mu]
+
+
+def describe(x, chunk=2**16, compression=200):
+  """
+  Return the StreamStats of the array <x>, which may be a memory map or
+  other on-disk array, read <chunk> values at a time.
+  """
+  s = StreamStats(compression)
+  for i in range(0, len(x), chunk):
+    s.update(x[i:i+chunk])
+  return s
+
+
+def merge_all(stats):
+  """
+  Return the merge of the sequence of StreamStats <stats>, e.g. those
+  gathered from the workers of a Pool or with comm.gather() from MPI ranks.
+  """
+  s = StreamStats(stats[0].compression)
+  for t in stats:
+    s.merge(t)
+  return s
+
+
+def mpi_merge(s, comm):
+  """
+  Return the merge of the StreamStats <s> of every rank of the mpi4py
+  communicator <comm>, available on all ranks.  Only the summaries, a few
+  hundred numbers each, are communicated.
+  """
+  return merge_all(comm.allgather(s))
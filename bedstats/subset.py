@@ -0,0 +1,263 @@
+from multiprocessing   import cpu_count
+from heapq             import heappush, heappushpop
+from numpy             import array, asarray, zeros, ones, hstack, \
+                              column_stack, sqrt, log, dot, var, sum, ndim, \
+                              ix_, argsort, float64
+from numpy.linalg      import pinv, LinAlgError
+from scipy.linalg      import cho_factor, cho_solve, solve_triangular
+from time              import time
+
+from bedstats.chunked  import glm_chunked, row_blocks
+from bedstats.resample import run
+
+# the normal equations of the current search; set before the pool is forked
+# so that every worker inherits it :
+job = {}
+
+
+def gram(x, y, w=1.0, chunk=2**16):
+  """
+  Return the sufficient statistics of the weighted least-squares
+  regression of <y> on the explanatory variables <x> with an intercept and
+  prior weights <w> : the Gram matrix G = X^T W X, b = X^T W y and
+  c = y^T W y.  <x> is either a sequence of <p> length-<n> columns as
+  passed to linRegstats() or an <n> x <p> design sliceable by rows, such
+  as a LazyDesign; it is read <chunk> rows at a time.
+  """
+  if hasattr(x, 'shape') and len(x.shape) == 2 and not isinstance(x, list):
+    n,p   = x.shape
+    block = lambda s,e: asarray(x[s:e], dtype=float64)
+  else:
+    p     = len(x)
+    n     = len(x[0])
+    block = lambda s,e: column_stack([xi[s:e] for xi in x])
+  G = zeros((p+1, p+1))
+  b = zeros(p+1)
+  c = 0.0
+  for s,e in row_blocks(n, chunk):
+    if ndim(w) == 0: sw = sqrt(w) * ones(e-s)
+    else:            sw = sqrt(asarray(w[s:e]))
+    yw  = sw * asarray(y[s:e], dtype=float64)
+    Xw  = hstack((ones((e-s,1)), block(s,e))) * sw[:,None]
+    G  += dot(Xw.T, Xw)
+    b  += dot(Xw.T, yw)
+    c  += dot(yw, yw)
+  return G, b, c
+
+
+def subset_rss(G, b, c, S):
+  """
+  Return the residual sum of squares c - b_S^T G_SS^{-1} b_S of the
+  regression on the columns <S> of the normal equations <G>, <b>, <c>, and
+  the coefficients.  Singular subsets are solved by pseudo-inverse.
+  """
+  S = list(S)
+  A = G[ix_(S, S)]
+  r = b[S]
+  try:
+    F = cho_factor(A, lower=False)
+    u = solve_triangular(F[0], r, trans='T')
+    return c - dot(u, u), cho_solve(F, r)
+  except LinAlgError:
+    a = dot(pinv(A), r)
+    return c - dot(r, a), a
+
+
+def record(best, S, rss):
+  """
+  Offer the subset <S> with residual sum of squares <rss> to the heap
+  <best> of the job's 'nbest' distinct subsets of lowest criterion, held
+  negated so that the worst is at the top.
+  """
+  S    = tuple(sorted(S))
+  if S in [item[1] for item in best]:
+    return
+  crit = criterion(rss, len(S))
+  item = (-crit, S, rss)
+  if len(best) < job['nbest']:
+    heappush(best, item)
+  elif crit < -best[0][0]:
+    heappushpop(best, item)
+
+
+def criterion(rss, k):
+  """
+  Return the information criterion of a fit with <k> parameters and
+  residual sum of squares <rss> on the scale of the job's deviance.
+  """
+  D = job['offset'] + job['scale'] * rss
+  return job['n'] * log(D / job['n']) + job['pen'] * k
+
+
+def branch(best, I, R, rss):
+  """
+  Search, depth first, every subset S of the columns with I <= S <= I + R
+  except I + R itself, whose residual sum of squares is <rss> and which
+  has already been recorded.  No such S can fit better than I + R or have
+  fewer parameters than I, so the branch is cut when that combination
+  cannot enter the <best> list.  Each subset is evaluated once, as the
+  'exclude' child of its parent.  Returns the number of subsets evaluated.
+  """
+  if len(R) == 0:
+    return 0
+  if len(best) == job['nbest'] and criterion(rss, len(I)) >= -best[0][0]:
+    return 0
+  G, b, c = job['G'], job['b'], job['c']
+  j       = R[0]
+  R       = R[1:]
+  rss_x   = subset_rss(G, b, c, I + R)[0]
+  record(best, I + R, rss_x)
+  return 1 + branch(best, I + [j], R, rss) + branch(best, I, R, rss_x)
+
+
+def search_node(node):
+  """
+  Search the subtree <node> = (I, R, rss) from the list of the search's
+  seed subsets.  Returns the best list and the number of subsets
+  evaluated.
+  """
+  best = list(job['seed'])
+  I, R, rss = node
+  nodes = branch(best, I, R, rss)
+  return best, nodes
+
+
+def best_subsets(G, b, c, n, crit='BIC', nbest=10, force=[], processes=None,
+                 offset=0.0, scale=1.0):
+  """
+  Exhaustive best-subset selection for the least-squares regression with
+  normal equations <G>, <b>, <c> (see gram()) on <n> observations, by
+  branch and bound in the manner of Furnival and Wilson's leaps and
+  bounds.  Column 0 (the intercept) and the columns <force> are in every
+  subset.  The <nbest> subsets of least <crit>, 'AIC' or 'BIC', computed as
+  n log(D/n) + penalty x parameters with the deviance D = <offset> +
+  <scale> RSS, are returned; only the p x p normal equations are used, so
+  the cost is independent of <n>.
+
+  The candidates are ordered by the increase in RSS on dropping each from
+  the full model, largest first, and a backward-elimination path seeds the
+  list so that the bound cuts from the start.  The tree is then split into
+  about four subtrees per process and searched by a pool of <processes>
+  forked workers (default, one per core).
+
+  Returns a list of dictionaries, best first, with the column indices
+  'cols' into <G>, the number of parameters 'k', the 'RSS', the
+  coefficients 'ahat' and the criterion 'crit'; the number of subsets
+  evaluated and the wall time are printed.
+  """
+  t0  = time()
+  p   = G.shape[0]
+  pen = {'AIC' : 2.0, 'BIC' : log(n)}[crit]
+  job.clear()
+  job.update({'G' : G, 'b' : b, 'c' : c, 'n' : n, 'pen' : pen,
+              'nbest' : nbest, 'offset' : offset, 'scale' : scale})
+
+  fixed = [0] + [j for j in force if j != 0]
+  cand  = [j for j in range(1, p) if j not in fixed]
+  full  = fixed + cand
+  rss_f = subset_rss(G, b, c, full)[0]
+
+  # order the candidates, most important first :
+  drop  = [subset_rss(G, b, c, [i for i in full if i != j])[0] for j in cand]
+  cand  = [cand[i] for i in argsort(drop)[::-1]]
+
+  # seed with the full model and the backward-elimination path :
+  best  = []
+  record(best, full, rss_f)
+  S     = list(cand)
+  nodes = 1 + len(cand)
+  while len(S) > 0:
+    rss = [subset_rss(G, b, c, fixed + [i for i in S if i != j])[0]
+           for j in S]
+    k   = int(argsort(rss)[0])
+    S   = S[:k] + S[k+1:]
+    record(best, fixed + S, rss[k])
+    nodes += len(rss)
+  job['seed'] = best
+
+  # split the tree breadth first into independent subtrees :
+  if processes is None:
+    processes = cpu_count()
+  front = [(fixed, cand, rss_f)]
+  while len(front) < 4*processes and len(front[0][1]) > 0:
+    I, R, rss = front.pop(0)
+    rss_x     = subset_rss(G, b, c, I + R[1:])[0]
+    record(job['seed'], I + R[1:], rss_x)
+    nodes    += 1
+    front    += [(I + [R[0]], R[1:], rss), (I, R[1:], rss_x)]
+
+  res   = run(search_node, front, min(processes, len(front)))
+  found = {}
+  for lst, m in res:
+    nodes += m
+    for item in lst:
+      found[item[1]] = item
+  items = sorted(found.values(), key=lambda item: -item[0])[:nbest]
+
+  subsets = []
+  for mcrit, S, rss in items:
+    cols = array(S)
+    subsets.append({'cols' : cols,
+                    'k'    : len(cols),
+                    'RSS'  : rss,
+                    'ahat' : subset_rss(G, b, c, cols)[1],
+                    'crit' : -mcrit})
+  print("best subsets : %d of %d subsets evaluated in %.2f s"
+        % (nodes, 2**len(cand), time() - t0))
+  return subsets
+
+
+def glm_subsets(X, y, w=1.0, out=None, crit='BIC', nbest=10, force=[],
+                refit=True, processes=None, chunk=2**16, **kwargs):
+  """
+  Approximate best-subset selection for the log-link GLM of <y> on the
+  design <X> with prior weights <w> (as for glm_chunked()).  The deviance
+  of each subset is approximated by the quadratic expansion about the
+  full-model fit <out>, computed first if not given : the weighted
+  residual sum of squares of the final IRLS working regression, so that
+  one pass over the data forms the normal equations and best_subsets()
+  searches them.
+
+  With <refit> the <nbest> subsets are then refit exactly, each warm-
+  started from its working least-squares coefficients with the first
+  Newton step taken on the working Gram matrix, which <X> must support
+  with select() (see LazyDesign), and re-ranked by the exact criterion.
+  The fits are added to the dictionaries under 'out'.
+  """
+  if out is None:
+    out = glm_chunked(X, y, w, chunk=chunk, **kwargs)
+  y     = asarray(y, dtype=float64)
+  n     = len(y)
+  sig   = var(y)
+  mu    = out['yhat']
+  z     = log(mu) + (y - mu)/mu
+  G,b,c = gram(X, z, w*mu**2/sig, chunk)
+  D     = sum((y - mu)**2)
+  Q     = subset_rss(G, b, c, range(G.shape[0]))[0]
+
+  subsets = best_subsets(G, b, c, n, crit, nbest, force, processes,
+                         offset=D - sig*Q, scale=sig)
+  if not refit:
+    return subsets
+
+  pen = {'AIC' : 2.0, 'BIC' : log(n)}[crit]
+  for s in subsets:
+    cols     = s['cols']
+    fac0     = ('cholesky', cho_factor(G[ix_(cols, cols)], lower=False))
+    s['out'] = glm_chunked(X.select(cols[1:]-1), y, w, chunk=chunk,
+                           a0=s['ahat'], fac0=fac0, **kwargs)
+    s['ahat'] = s['out']['ahat']
+    s['RSS']  = sum((y - s['out']['yhat'])**2)
+    s['crit'] = n * log(s['RSS'] / n) + pen * s['k']
+  return sorted(subsets, key=lambda s: s['crit'])
+
+
+def print_subsets(subsets, names, crit='BIC'):
+  """
+  Print the subsets returned by best_subsets() or glm_subsets() with the
+  <names> of the explanatory variables, the intercept excluded.
+  """
+  print("%4s %14s  %s" % ('k', crit, 'terms'))
+  for s in subsets:
+    terms = ', '.join([names[j-1] for j in s['cols'][1:]])
+    print("%4d %14.6g  %s" % (s['k'], s['crit'], terms))
@@ -0,0 +1,151 @@
+import os
+import json
+import resource
+
+from time import time
+
+# the phases of a Newton iteration timed by glm() and glm_chunked() :
+PHASES = ['read', 'weight', 'gram', 'solve', 'predict']
+
+
+def peak_memory():
+  """
+  Return the peak resident memory of this process in megabytes.
+  """
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def plain(o):
+  """
+  Convert the numpy scalar <o> for json.
+  """
+  return o.item()
+
+
+class Telemetry(object):
+  """
+  Convergence telemetry of the Newton iterations of glm() and
+  glm_chunked().  The fitter calls begin() once per fit, add() after each
+  timed step of one of the <PHASES>, iteration() once per Newton iteration
+  and end() when done :
+
+    'read'    : evaluating or reading the design blocks (glm_chunked()),
+    'weight'  : the IRLS weights and adjusted dependent variable,
+    'gram'    : forming (and, for glm(), factoring) X^T W X and X^T W z,
+    'solve'   : factoring and solving the normal equations,
+    'predict' : the linear predictor, fitted mean and deviance.
+
+  Each iteration is recorded with its phase times, total wall time, peak
+  resident memory and the residual norms passed by the fitter; each fit
+  with the phase totals and the values passed to begin() and end().  If
+  <fn> is given every record is appended to it as one JSON line, tagged
+  with the keyword arguments <tags>, e.g. the model variant, so the runs
+  of several variants and meshes can share one log.  The file is opened
+  for each line, so the workers of a process pool may share a Telemetry;
+  their records are told apart by the process id 'pid'.
+  """
+  def __init__(self, fn=None, **tags):
+    self.fn    = fn
+    self.tags  = tags
+    self.nFit  = 0
+    self.iters = []
+
+  def write(self, record):
+    """
+    Append <record> with the tags to the log file, if any.
+    """
+    if self.fn is None:
+      return
+    rec = dict(self.tags)
+    rec.update(record)
+    rec['pid'] = os.getpid()
+    f   = open(self.fn, 'a')
+    f.write(json.dumps(rec, sort_keys=True, default=plain) + '\n')
+    f.close()
+
+  def begin(self, **info):
+    """
+    Start the record of a fit, described by the values <info>.
+    """
+    self.info   = info
+    self.iters  = []
+    self.t0     = time()
+    self.tLast  = self.t0
+    self.times  = dict((k, 0.0) for k in PHASES)
+    self.totals = dict((k, 0.0) for k in PHASES)
+
+  def add(self, phase, t):
+    """
+    Charge the time since <t> to <phase>, returning the current time so
+    that consecutive phases may be chained.
+    """
+    now = time()
+    self.times[phase] += now - t
+    return now
+
+  def iteration(self, **values):
+    """
+    Close the record of a Newton iteration with the residual norms or
+    other <values> given by the fitter.
+    """
+    now  = time()
+    rec  = {'type'    : 'iteration',
+            'fit'     : self.nFit,
+            'iter'    : len(self.iters) + 1,
+            'time'    : now - self.tLast,
+            'peak_mb' : peak_memory()}
+    rec.update(self.times)
+    rec.update(values)
+    for k in PHASES:
+      self.totals[k] += self.times[k]
+      self.times[k]   = 0.0
+    self.tLast = now
+    self.iters.append(rec)
+    self.write(rec)
+
+  def end(self, **values):
+    """
+    Close the record of the fit and return its summary, the phase totals
+    over all iterations with the wall time 'time', the number of
+    iterations 'nIter', the peak memory 'peak_mb', the values passed to
+    begin() and the <values> given here.
+    """
+    for k in PHASES:
+      self.totals[k] += self.times[k]
+      self.times[k]   = 0.0
+    rec = {'type'    : 'summary',
+           'fit'     : self.nFit,
+           'nIter'   : len(self.iters),
+           'time'    : time() - self.t0,
+           'peak_mb' : peak_memory()}
+    rec.update(self.totals)
+    rec.update(self.info)
+    rec.update(values)
+    self.nFit += 1
+    self.write(rec)
+    return rec
+
+
+def read_log(fn, kind='summary'):
+  """
+  Return the records of type <kind>, 'summary' or 'iteration', of the
+  JSON-lines log <fn>.
+  """
+  recs = []
+  for line in open(fn):
+    rec = json.loads(line)
+    if rec['type'] == kind:
+      recs.append(rec)
+  return recs
+
+
+def print_summary(rec):
+  """
+  Print the summary record <rec> returned by Telemetry.end() as the
+  fraction of the wall time spent in each phase.
+  """
+  T = rec['time']
+  print("%d Newton iterations in %.2f s, peak memory %.0f MB"
+        % (rec['nIter'], T, rec['peak_mb']))
+  for k in PHASES:
+    print("  %-8s %8.3f s  %5.1f %%" % (k, rec[k], 100 * rec[k] / T))
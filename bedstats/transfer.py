@@ -0,0 +1,132 @@
+import os
+import hashlib
+
+from numpy             import load, savez_compressed, array, asarray, \
+                              arange, ones, empty, ascontiguousarray, float64
+from scipy.sparse      import csr_matrix
+from scipy.spatial     import cKDTree
+
+
+def mesh_hash(*meshes):
+  """
+  Return the SHA-1 hex digest of the vertex coordinates of the DOLFIN
+  <meshes>, identifying them whatever the files they were read from.
+  """
+  h = hashlib.sha1()
+  for mesh in meshes:
+    h.update(ascontiguousarray(mesh.coordinates(), dtype=float64))
+  return h.hexdigest()
+
+
+class BedTransfer(object):
+  """
+  Carries CG1 fields of the 3D mesh to the CG1 space <Q_b> of its bed
+  submesh, saved to <bed_dir>/submesh.xdmf, in place of one
+  LagrangeInterpolator().interpolate() per field.  Every vertex of the
+  submesh is a vertex of the 3D mesh, so the transfer is the n_b x n
+  sparse matrix P with a single 1 per row, from the degree of freedom of
+  each bed vertex to that of its parent in the space <Q> of the 3D mesh :
+
+    u_b = P u.
+
+  The parent vertices are <parent> if given, e.g. the
+  'parent_vertex_indices' of a SubMesh of the 3D mesh, and are otherwise
+  found once by a k-d tree of the 3D vertices, for instance for the
+  SubMesh of a BoundaryMesh returned by model.get_bed_mesh(), whose
+  indices refer to the boundary mesh.  P is cached in <bed_dir>/<cache>
+  with the SHA-1 of the vertex coordinates of both meshes, so later
+  extractions on the same meshes only read it.
+  """
+  def __init__(self, bed_dir, Q, Q_b, parent=None, tol=1e-3,
+               cache='transfer.npz'):
+    self.bed_dir = bed_dir
+    self.Q       = Q
+    self.Q_b     = Q_b
+    self.tol     = tol
+    self.fn      = os.path.join(bed_dir, cache)
+    self.sha     = mesh_hash(Q.mesh(), Q_b.mesh())
+    if not self.load():
+      self.assemble(parent)
+      self.save()
+
+  def load(self):
+    """
+    Read the cached operator, returning False if there is none for the
+    current meshes.
+    """
+    if not os.path.exists(self.fn):
+      return False
+    f = load(self.fn)
+    if str(f['sha']) != self.sha:
+      f.close()
+      return False
+    self.P = csr_matrix((f['data'], f['indices'], f['indptr']),
+                        shape=tuple(f['shape']))
+    f.close()
+    return True
+
+  def assemble(self, parent=None):
+    """
+    Form the operator from the <parent> vertices of the bed vertices, or
+    from a nearest-vertex search of the 3D mesh.  Raises a ValueError if a
+    bed vertex lies farther than <tol> from every vertex of the 3D mesh.
+    """
+    from fenics import vertex_to_dof_map
+    print("bed transfer : assembling on %s" % self.bed_dir)
+    mesh    = self.Q.mesh()
+    submesh = self.Q_b.mesh()
+    if parent is None:
+      d, parent = cKDTree(mesh.coordinates()).query(submesh.coordinates())
+      if d.max() > self.tol:
+        raise ValueError("bed vertex %i is %g from the 3D mesh"
+                         % (d.argmax(), d.max()))
+    n_b     = submesh.num_vertices()
+    rows    = vertex_to_dof_map(self.Q_b)[arange(n_b)]
+    cols    = vertex_to_dof_map(self.Q)[asarray(parent)]
+    self.P  = csr_matrix((ones(n_b), (rows, cols)),
+                         shape=(self.Q_b.dim(), self.Q.dim()))
+
+  def save(self):
+    """
+    Write the operator to the cache.
+    """
+    A = {'sha'     : array(self.sha),
+         'data'    : self.P.data,
+         'indices' : self.P.indices,
+         'indptr'  : self.P.indptr,
+         'shape'   : array(self.P.shape)}
+    tmp = self.fn + '.%d.tmp' % os.getpid()
+    f   = open(tmp, 'wb')
+    savez_compressed(f, **A)
+    f.close()
+    os.rename(tmp, self.fn)
+
+  def transfer(self, fields):
+    """
+    Return the nodal values on the bed of the Functions <fields> of the 3D
+    space as the columns of an n_b x k array, with one sparse product for
+    all of them.
+    """
+    n = self.Q.dim()
+    U = empty((n, len(fields)))
+    for j, f in enumerate(fields):
+      if f.function_space().dim() != n:
+        raise ValueError("field %i is not in the CG1 space of the 3D mesh"
+                         % j)
+      U[:,j] = f.vector().array()
+    return self.P.dot(U)
+
+  def functions(self, fields):
+    """
+    Return Functions on the bed holding the transfer of the Functions
+    <fields> of the 3D space.
+    """
+    from fenics import Function
+    U    = self.transfer(fields)
+    vara = []
+    for j in range(U.shape[1]):
+      f = Function(self.Q_b)
+      f.vector().set_local(U[:,j])
+      f.vector().apply('insert')
+      vara.append(f)
+    return vara
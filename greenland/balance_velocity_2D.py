@@ -8,6 +8,10 @@ from varglas.helper               import default_config
 from fenics                       import *
 from scipy.io                     import loadmat
 
+import sys
+sys.path.append('../')
+from bedstats.bedfile import read_function
+
 # get the input args :
 out_dir = 'dump/bed/09/bv_smb/'
 in_dir  = 'dump/bed/09/'
@@ -18,11 +22,8 @@ Q      = FunctionSpace(mesh, 'CG', 1)
 bamber = DataFactory.get_bamber()
 dbm    = DataInput(bamber,  mesh=mesh)
 
-S      = Function(Q)
-B      = Function(Q)
-
-File(in_dir + 'S_s.xml') >> S
-File(in_dir + 'B_s.xml') >> B
+S      = read_function(in_dir, 'S_s.xml', Q)
+B      = read_function(in_dir, 'B_s.xml', Q)
 
 adot_v = loadmat(in_dir + 'smb/smb.mat')
 dbm.data['smb'] = adot_v['map_data']
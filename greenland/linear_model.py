@@ -105,6 +105,8 @@ sys.path.append(src_directory)
 
 from scipy.stats               import probplot 
 from src.regstats              import prbplotObj
+sys.path.append('../')
+from bedstats.gradient         import GradientOperator
 from fenics                    import *
 from pylab                     import *
 
@@ -145,12 +147,6 @@ File(in_dir + 'w_s.xml')    >> w
 File('dump/bed/balance_velocity/Ubar_s.xml') >> Ubar
 File('dump/bed/balance_water/q.xml')         >> qbar
 
-dSdx   = project(S.dx(0), Q)
-dSdy   = project(S.dx(1), Q)
-
-dBdx   = project(B.dx(0), Q)
-dBdy   = project(B.dx(1), Q)
-
 # vectors :
 beta_v = beta.vector().array()
 S_v    = S.vector().array()
@@ -168,11 +164,11 @@ qbar_v = qbar.vector().array()
 
 H_v    = S_v - B_v
 U_mag  = sqrt(u_v**2 + v_v**2 + w_v**2 + 1e-16)
-dSdx_v = dSdx.vector().array()
-dSdy_v = dSdy.vector().array()
+# horizontal derivatives from the cached gradient operator of the submesh :
+G      = GradientOperator(in_dir, Q)
+dSdx_v, dSdy_v = G.gradient(S_v)
 gradS  = sqrt(dSdx_v**2 + dSdy_v**2 + 1e-16)
-dBdx_v = dBdx.vector().array()
-dBdy_v = dBdy.vector().array()
+dBdx_v, dBdy_v = G.gradient(B_v)
 gradB  = sqrt(dBdx_v**2 + dBdy_v**2 + 1e-16)
 
 valid  = where(beta_v > 1e-10)[0]
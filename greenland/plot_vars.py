@@ -4,6 +4,10 @@ from varglas.helper            import plotIce
 from varglas.data.data_factory import DataFactory
 from varglas.io                import DataInput
 
+import sys
+sys.path.append('../')
+from bedstats.gradient         import GradientOperator
+
 in_dir  = 'dump/bed/09/'
 
 mesh  = Mesh(in_dir + 'submesh.xdmf')
@@ -83,21 +87,16 @@ B_v        = B.vector().array()
 H_v        = S_v - B_v
 H.vector()[:] = H_v
 
-dSdx    = project(S.dx(0), Q)
-dSdy    = project(S.dx(1), Q)
-
-dBdx    = project(B.dx(0), Q)
-dBdy    = project(B.dx(1), Q)
+# horizontal derivatives from the cached gradient operator of the submesh :
+G       = GradientOperator(in_dir, Q)
 
 gradS   = Function(Q)
-dSdx_v  = dSdx.vector().array()
-dSdy_v  = dSdy.vector().array()
+dSdx_v, dSdy_v = G.gradient(S_v)
 gradS_v = sqrt(dSdx_v**2 + dSdy_v**2 + 1e-16)
 gradS.vector()[:] = gradS_v
 
 gradB   = Function(Q)
-dBdx_v  = dBdx.vector().array()
-dBdy_v  = dBdy.vector().array()
+dBdx_v, dBdy_v = G.gradient(B_v)
 gradB_v = sqrt(dBdx_v**2 + dBdy_v**2 + 1e-16)
 gradB.vector()[:] = gradB_v
 
@@ -7,6 +7,10 @@ from varglas.data.data_factory    import DataFactory
 from varglas.mesh.mesh_factory    import MeshFactory
 from varglas.io                   import DataInput, DataOutput
 
+import sys
+sys.path.append('../')
+from bedstats.bedfile import read_function
+
 
 # get the input args :
 out_dir = 'dump/bed/09/smb/'
@@ -15,11 +19,8 @@ in_dir  = 'dump/bed/09/'
 mesh   = Mesh(in_dir + 'submesh.xdmf')
 Q      = FunctionSpace(mesh, 'CG', 1)
 
-S      = Function(Q)
-B      = Function(Q)
-
-File(in_dir + 'S_s.xml') >> S
-File(in_dir + 'B_s.xml') >> B
+S      = read_function(in_dir, 'S_s.xml', Q)
+B      = read_function(in_dir, 'B_s.xml', Q)
 
 config = default_config()
 config['output_path']  = out_dir
@@ -30,11 +31,11 @@ model.set_mesh(mesh)
 model.set_surface_and_bed(S, B)
 model.initialize_variables()
 
-model.init_adot(in_dir + 'adot_s.xml')
-model.init_Mb(in_dir + 'Mb_s.xml')
-model.init_component_Ubar(in_dir + 'ubar_s.xml',
-                          in_dir + 'vbar_s.xml',
-                          in_dir + 'wbar_s.xml')
+model.init_adot(read_function(in_dir, 'adot_s.xml', Q))
+model.init_Mb(read_function(in_dir, 'Mb_s.xml', Q))
+model.init_component_Ubar(read_function(in_dir, 'ubar_s.xml', Q),
+                          read_function(in_dir, 'vbar_s.xml', Q),
+                          read_function(in_dir, 'wbar_s.xml', Q))
 
 model.save_pvd(model.adot, 'adot')
 
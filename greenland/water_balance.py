@@ -1,6 +1,10 @@
 from pylab  import *
 from fenics import *
 
+import sys
+sys.path.append('../')
+from bedstats.bedfile import read_function
+
 out_dir  = 'dump/bed/balance_water/'
 in_dir   = 'dump/bed/01/'
 
@@ -11,13 +15,9 @@ W      = Q
 V      = MixedFunctionSpace([Q,Q,Q])
 Q2     = MixedFunctionSpace([Q,Q])
 
-S      = Function(Q)
-B      = Function(Q)
-Mb     = Function(Q)
-
-File(in_dir + 'S_s.xml')    >> S
-File(in_dir + 'B_s.xml')    >> B
-File(in_dir + 'Mb_s.xml')   >> Mb
+S      = read_function(in_dir, 'S_s.xml',  Q)
+B      = read_function(in_dir, 'B_s.xml',  Q)
+Mb     = read_function(in_dir, 'Mb_s.xml', Q)
 
 #parameters['form_compiler']['quadrature_degree'] = 3
 params = {"newton_solver":
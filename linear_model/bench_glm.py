@@ -0,0 +1,97 @@
+from pylab        import *
+from scipy.sparse import diags
+from time         import time
+
+import sys
+sys.path.append('../')
+
+from bedstats.glm import glm
+
+# usage : python bench_glm.py [p] [n_1 n_2 ...]
+#   p   : number of explanatory variables (default 40)
+#   n_i : sample sizes to time (default 1e5, 1e6, 1e7)
+
+def glm_inv(x,y,w=1.0):
+  """
+  The original IRLS loop, with an <n> x <n> sparse diagonal weight matrix
+  and an explicit inverse of X^T W X on every Newton iteration, kept only
+  as the reference for timing and accuracy.
+  """
+  p,n    = shape(x)
+  p     += 1
+  sig    = var(y)
+  mu     = (y + mean(y))/2.0
+  eta    = log(mu)
+  X      = vstack((ones(n), x)).T
+
+  converged = False
+  nIter     = 0
+  D         = 1
+  ahat      = zeros(p)
+
+  while not converged and nIter < 65:
+    W       = diags(w*mu**2/sig, 0)
+    z       = eta + (y - mu)/mu
+
+    WX      = W.dot(X)
+    XTWX    = dot(X.T, WX)
+    iXTWX   = inv(XTWX)
+    Wz      = W.dot(z)
+
+    ahat_n  = dot(iXTWX, dot(X.T, Wz))
+
+    eta     = dot(X, ahat_n)
+    mu      = exp(eta)
+
+    rel_res  = norm(ahat - ahat_n, inf)
+    ahat     = ahat_n
+
+    D_n      = sum((y - mu)**2)
+    deviance = abs(D_n - D)
+    D        = D_n
+
+    if rel_res < 1e-4 or deviance < 1e-4: converged = True
+    nIter +=  1
+
+  return ahat, sqrt(diag(iXTWX))
+
+def synthetic(n, p):
+  """
+  Returns a <p> x <n> array of standardized explanatory variables and a
+  positive response with log-linear mean and Gaussian noise.
+  """
+  x     = randn(p, n)
+  a     = hstack((3.0, 0.2*randn(p) / sqrt(p)))
+  mu    = exp(a[0] + dot(a[1:], x))
+  y     = abs(mu + 0.1*mu*randn(n)) + 1e-3
+  return x, y
+
+if len(sys.argv) > 1:
+  p     = int(sys.argv[1])
+else:
+  p     = 40
+
+if len(sys.argv) > 2:
+  sizes = [int(float(s)) for s in sys.argv[2:]]
+else:
+  sizes = [int(1e5), int(1e6), int(1e7)]
+
+seed(0)
+
+print "%10s %4s %12s %12s %8s %12s %12s" % ('n', 'p', 'inv (s)', 'chol (s)',
+                                            'speedup', 'max |da|', 'max |dse|')
+for n in sizes:
+  x, y  = synthetic(n, p)
+
+  t0    = time()
+  a0,s0 = glm_inv(x, y)
+  t_inv = time() - t0
+
+  t0    = time()
+  out   = glm(x, y)
+  t_new = time() - t0
+
+  da    = abs(out['ahat'] - a0).max()
+  dse   = abs(out['sea']  - s0).max()
+  print "%10d %4d %12.3f %12.3f %8.1f %12.2e %12.2e" \
+        % (n, p, t_inv, t_new, t_inv / t_new, da, dse)
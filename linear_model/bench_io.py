@@ -0,0 +1,81 @@
+from pylab  import *
+from fenics import Mesh, FunctionSpace, Function, File
+from time   import time
+
+import sys
+import os
+sys.path.append('../')
+
+from bedstats.features import RAW, MESH
+from bedstats.bedfile  import BED, BedFile, field_name, xml_to_bed
+
+# usage : python bench_io.py bed_dir [bed_dir ...]
+#   bed_dir : a bed directory written by extract_bed.py with its legacy XML
+#             files, e.g. ../antarctica/dump/bed/07/; its container bed.h5
+#             is created from them if missing.
+#
+# times reading every raw field of the FeatureStore from the XML files and
+# from the container, and compares the space they take on disk.
+
+def read_xml(bed_dir, fns, Q):
+  """
+  Return the nodal values of the fields of the XML files <fns>, read one
+  File() at a time as the bed scripts did.
+  """
+  vals = []
+  for fn in fns:
+    f = Function(Q)
+    File(bed_dir + fn) >> f
+    vals.append(f.vector().array())
+  return vals
+
+
+def read_bed(bed_dir, fns, Q):
+  """
+  Return the nodal values of the fields of the legacy files <fns>, read
+  from the container.
+  """
+  bf   = BedFile(bed_dir)
+  bf.check(Q.mesh())
+  vals = [bf.read_dofs(field_name(fn), Q) for fn in fns]
+  bf.close()
+  return vals
+
+
+for bed_dir in sys.argv[1:]:
+  mesh = Mesh(bed_dir + MESH)
+  Q    = FunctionSpace(mesh, 'CG', 1)
+  fns  = [fn for fn in sorted(set(RAW.values()))
+          if os.path.exists(bed_dir + fn)]
+  if len(fns) == 0:
+    print "%s : no XML fields" % bed_dir
+    continue
+
+  if not os.path.exists(bed_dir + BED):
+    t0 = time()
+    xml_to_bed(bed_dir, fns, Q)
+    print "%s : container written in %.2f s" % (bed_dir, time() - t0)
+
+  t0    = time()
+  v_xml = read_xml(bed_dir, fns, Q)
+  t_xml = time() - t0
+
+  t0    = time()
+  v_bed = read_bed(bed_dir, fns, Q)
+  t_bed = time() - t0
+
+  t0    = time()
+  read_bed(bed_dir, fns[:1], Q)
+  t_one = time() - t0
+
+  err   = max([abs(a - b).max() for a,b in zip(v_xml, v_bed)])
+  s_xml = sum([os.path.getsize(bed_dir + fn) for fn in fns])
+  s_bed = os.path.getsize(bed_dir + BED)
+
+  print "%s : %d fields of %d nodes" % (bed_dir, len(fns), Q.dim())
+  print "  %-10s %10s %12s" % ('', 'read [s]', 'size [MB]')
+  print "  %-10s %10.2f %12.1f" % ('XML',  t_xml, s_xml / 2.0**20)
+  print "  %-10s %10.2f %12.1f" % (BED,    t_bed, s_bed / 2.0**20)
+  print "  speed-up %.1f, %.1f times smaller, one field in %.3f s, " \
+        "max difference %.2e" % (t_xml / t_bed, s_xml / float(s_bed), t_one,
+                                 err)
@@ -0,0 +1,78 @@
+import sys
+from multiprocessing import Pool, cpu_count
+from time            import time
+
+# loads the bed data of every region once :
+import linear_model_n as lm
+
+sys.path.append('../')
+from bedstats.shared  import share_globals
+from bedstats.regions import filter_regions
+
+# usage : python linear_model_sweep.py [processes]
+#   fits every (model, weighting) variant of linear_model_n.py in a pool of
+#   worker processes, writing the same dat/ and images/stats/ output as 15
+#   separate runs of that script.
+
+models  = ['U', 'Ubar', 'stress', 'U_temp', 'Ubar_temp']
+modes   = ['normal', 'weighted', 'limited']
+
+# combined bed vectors read by fit_variant() :
+fields  = ['beta_v', 'S_v', 'B_v', 'Ts_v', 'gradH', 'dHdi', 'dHdj', 'gradS',
+           'dSdi', 'dSdj', 'D', 'gradB', 'dBdi', 'dBdj', 'H_v', 'qgeo_v',
+           'adot_v', 'Tb_v', 'Mb_v', 'u_v', 'v_v', 'w_v', 'Ubar5_v',
+           'Ubar10_v', 'Ubar20_v', 'U_ob_v', 'U_mag', 'tau_id_v', 'tau_jd_v',
+           'tau_ii_v', 'tau_ij_v', 'tau_iz_v', 'tau_ji_v', 'tau_jj_v',
+           'tau_jz_v', 'ini_i_Ubar', 'ini_j_Ubar', 'ini_i_U', 'ini_j_U',
+           'mask_v', 'h_v', 'x_v', 'y_v', 'region_v']
+
+def fit(variant):
+  """
+  Fit one (model, weighting) <variant> in a worker and return its name and
+  wall time, or the error message if the fit failed.
+  """
+  model, mode = variant
+  t0          = time()
+  try:
+    lm.fit_variant(model, mode)
+    err = None
+  except Exception as e:
+    err = repr(e)
+  return model + '/' + mode, time() - t0, err
+
+if len(sys.argv) > 1:
+  nproc = int(sys.argv[1])
+else:
+  nproc = min(cpu_count(), len(models) * len(modes))
+
+# evaluate the valid-node masks once, so the workers find them cached :
+for mode in modes:
+  filter_regions(lm.regions, lm.valid_spec(mode))
+
+# workers are forked after this, and share these pages :
+nbytes   = share_globals(vars(lm), fields)
+
+# the loaded fields are rebound to the shared copies too, so the originals
+# are freed :
+for k in fields:
+  if k.endswith('_v'): key = k[:-2]
+  else:                key = k
+  if key in lm.F:
+    lm.F[key] = getattr(lm, k)
+print "%.1f MB of bed data in shared memory" % (nbytes / 2.0**20)
+
+variants = [(model, mode) for model in models for mode in modes]
+
+t0       = time()
+pool     = Pool(nproc)
+results  = pool.map(fit, variants, chunksize=1)
+pool.close()
+pool.join()
+
+for name, dt, err in results:
+  if err is None:
+    print "%-20s %8.1f s" % (name, dt)
+  else:
+    print "%-20s %8.1f s  FAILED : %s" % (name, dt, err)
+print "%i variants in %.1f s on %i processes" % (len(variants), time() - t0,
+                                                 nproc)
@@ -0,0 +1,52 @@
+import sys
+import os
+
+sys.path.append('../')
+from bedstats.artifact    import load_fit, write_alpha, write_stats, \
+                                 write_comparison
+from bedstats.diagplot    import plot_distributions, plot_residuals, \
+                                 plot_newton
+from bedstats.streamstats import describe
+
+# usage : python replot.py variant [variant ...]
+#
+# redraws the tables and figures of each variant, e.g. Ubar/weighted/, from
+# the fits saved by linear_model_n.py to dat/<variant>, and writes the fits
+# of all the variants side by side to dat/comparison.dat.
+
+variants = [v.rstrip('/') + '/' for v in sys.argv[1:]]
+fits     = []
+labels   = []
+
+for file_n in variants:
+  print file_n
+
+  for sfx in ['', '_reduced']:
+    fn = 'dat/' + file_n + 'fit' + sfx + '.npz'
+    if not os.path.exists(fn):
+      continue
+    fit  = load_fit(fn)
+    yhat = fit['yhat']
+    y    = yhat + fit['resid']
+
+    di   = 'images/stats/' + file_n
+    if not os.path.exists(di):
+      os.makedirs(di)
+
+    plot_distributions(y, yhat, di + 'GLM_beta_distributions' + sfx + '.png')
+    if sfx == '': nq = 'GLM_resid_NQ'
+    else:         nq = 'GLM_resid-NQ'
+    plot_residuals(fit['resid'], yhat, di + nq + sfx + '.png')
+    plot_newton(fit['rel_a'], fit['dev_a'],
+                di + 'GLM_newton_resid' + sfx + '.png')
+
+    write_alpha('dat/' + file_n + 'alpha' + sfx + '.dat', fit)
+    write_stats('dat/' + file_n + 'stats' + sfx + '.dat', fit,
+                describe(yhat).table())
+
+    if sfx == '':
+      fits.append(fit)
+      labels.append(file_n.rstrip('/').replace('_', '\\_'))
+
+if len(fits) > 1:
+  write_comparison('dat/comparison.dat', fits, labels)
@@ -10,8 +10,14 @@ sys.path.append(src_directory)
 
 from scipy.stats               import probplot 
 from src.regstats              import prbplotObj
+from bedstats.filters          import filter_mask, print_counts
+from bedstats.classify         import class_edges, classify, \
+                                      GaussianNaiveBayes, KNNRegressor, \
+                                      confusion_matrix, print_confusion
+from bedstats.gradient         import GradientOperator
 from fenics                    import *
 from pylab                     import *
+from time                      import time
 
 #===============================================================================
 # get the data from the model output on the bed :
@@ -50,12 +56,6 @@ File(ant_in_dir + 'w_s.xml')    >> a_w
 File('antarctica/dump/bed/balance_velocity/Ubar_s.xml') >> a_Ubar
 File('antarctica/dump/bed/balance_water/q.xml')         >> a_qbar
 
-a_dSdx   = project(a_S.dx(0), a_Q)
-a_dSdy   = project(a_S.dx(1), a_Q)
-                                
-a_dBdx   = project(a_B.dx(0), a_Q)
-a_dBdy   = project(a_B.dx(1), a_Q)
-
 # vectors :
 a_beta_v = a_beta.vector().array()
 a_S_v    = a_S.vector().array()
@@ -73,11 +73,11 @@ a_qbar_v = a_qbar.vector().array()
 
 a_H_v    = a_S_v - a_B_v
 a_U_mag  = sqrt(a_u_v**2 + a_v_v**2 + 1e-16)
-a_dSdx_v = a_dSdx.vector().array()
-a_dSdy_v = a_dSdy.vector().array()
+# horizontal derivatives from the cached gradient operator of the submesh :
+a_G      = GradientOperator(ant_in_dir, a_Q)
+a_dSdx_v, a_dSdy_v = a_G.gradient(a_S_v)
 a_gradS  = sqrt(a_dSdx_v**2 + a_dSdy_v**2 + 1e-16)
-a_dBdx_v = a_dBdx.vector().array()
-a_dBdy_v = a_dBdy.vector().array()
+a_dBdx_v, a_dBdy_v = a_G.gradient(a_B_v)
 a_gradB  = sqrt(a_dBdx_v**2 + a_dBdy_v**2 + 1e-16)
 
 g_mesh  = Mesh(gre_in_dir + 'submesh.xdmf')
@@ -111,12 +111,6 @@ File(gre_in_dir + 'w_s.xml')    >> g_w
 File('greenland/dump/bed/balance_velocity/Ubar_s.xml') >> g_Ubar
 File('greenland/dump/bed/balance_water/q.xml')         >> g_qbar
 
-g_dSdx   = project(g_S.dx(0), g_Q)
-g_dSdy   = project(g_S.dx(1), g_Q)
-                                
-g_dBdx   = project(g_B.dx(0), g_Q)
-g_dBdy   = project(g_B.dx(1), g_Q)
-
 # vectors :
 g_beta_v = g_beta.vector().array()
 g_S_v    = g_S.vector().array()
@@ -134,26 +128,40 @@ g_qbar_v = g_qbar.vector().array()
 
 g_H_v    = g_S_v - g_B_v
 g_U_mag  = sqrt(g_u_v**2 + g_v_v**2 + 1e-16)
-g_dSdx_v = g_dSdx.vector().array()
-g_dSdy_v = g_dSdy.vector().array()
+# horizontal derivatives from the cached gradient operator of the submesh :
+g_G      = GradientOperator(gre_in_dir, g_Q)
+g_dSdx_v, g_dSdy_v = g_G.gradient(g_S_v)
 g_gradS  = sqrt(g_dSdx_v**2 + g_dSdy_v**2 + 1e-16)
-g_dBdx_v = g_dBdx.vector().array()
-g_dBdy_v = g_dBdy.vector().array()
+g_dBdx_v, g_dBdy_v = g_G.gradient(g_B_v)
 g_gradB  = sqrt(g_dBdx_v**2 + g_dBdy_v**2 + 1e-16)
 
-g_valid  = where(g_beta_v > 1e-10)[0]
-g_valid  = intersect1d(g_valid, where(g_Ubar_v > 0)[0])
-g_valid  = intersect1d(g_valid, where(g_Ubar_v < 1000)[0])
-g_valid  = intersect1d(g_valid, where(abs(g_Mb_v) < 0.1)[0])
-g_valid  = intersect1d(g_valid, where(g_S_v >= 0)[0])
-g_valid  = intersect1d(g_valid, where(g_H_v >  1)[0])
-g_valid  = intersect1d(g_valid, where(g_B_v > -1000)[0])
-g_valid  = intersect1d(g_valid, where(abs(g_qbar_v) < 2000)[0])
-g_valid  = intersect1d(g_valid, where(abs(g_w_v) < 50)[0])
-g_valid  = intersect1d(g_valid, where(abs(g_v_v) < 500)[0])
-g_valid  = intersect1d(g_valid, where(abs(g_u_v) < 500)[0])
-g_valid  = intersect1d(g_valid, where(g_gradS < 0.5)[0])
-g_valid  = intersect1d(g_valid, where(g_gradB < 0.5)[0])
+g_spec   = {'beta'      : '>1e-10',
+            'Ubar'      : ('>0', '<1000'),
+            'abs(Mb)'   : '<0.1',
+            'S'         : '>=0',
+            'H'         : '>1',
+            'B'         : '>-1000',
+            'abs(qbar)' : '<2000',
+            'abs(w)'    : '<50',
+            'abs(v)'    : '<500',
+            'abs(u)'    : '<500',
+            'gradS'     : '<0.5',
+            'gradB'     : '<0.5'}
+g_F      = {'beta'  : g_beta_v,
+            'Ubar'  : g_Ubar_v,
+            'Mb'    : g_Mb_v,
+            'S'     : g_S_v,
+            'H'     : g_H_v,
+            'B'     : g_B_v,
+            'qbar'  : g_qbar_v,
+            'w'     : g_w_v,
+            'v'     : g_v_v,
+            'u'     : g_u_v,
+            'gradS' : g_gradS,
+            'gradB' : g_gradB}
+g_ok, g_rej = filter_mask(g_spec, g_F)
+print_counts(g_rej, len(g_beta_v))
+g_valid  = where(g_ok)[0]
 
 beta_v = hstack((a_beta_v, g_beta_v))
 S_v    = hstack((a_S_v,    g_S_v))
@@ -173,11 +181,19 @@ Mb_v   = hstack((a_Mb_v,   g_Mb_v))
 U_mag  = hstack((a_U_mag,  g_U_mag))
 qbar_v = hstack((a_qbar_v, g_qbar_v))
 
-valid  = where(beta_v > 1e-10)[0]
-valid  = intersect1d(valid, where(Ubar_v > 0)[0])
-valid  = intersect1d(valid, where(abs(Mb_v) < 1500)[0])
-valid  = intersect1d(valid, where(S_v > -100)[0])
-valid  = intersect1d(valid, where(Ts_v > 100)[0])
+spec   = {'beta'    : '>1e-10',
+          'Ubar'    : '>0',
+          'abs(Mb)' : '<1500',
+          'S'       : '>-100',
+          'Ts'      : '>100'}
+F      = {'beta' : beta_v,
+          'Ubar' : Ubar_v,
+          'Mb'   : Mb_v,
+          'S'    : S_v,
+          'Ts'   : Ts_v}
+ok, rej = filter_mask(spec, F)
+print_counts(rej, len(beta_v))
+valid  = where(ok)[0]
 
 #g_data = [log(g_beta_v + 1), g_S_v, g_B_v, g_H_v, g_adot_v, g_Mb_v, 
 #          g_Tb_v, g_Ts_v, log(g_Ubar_v + 1), g_qbar_v, g_u_v, 
@@ -222,10 +238,11 @@ names = [r'$\beta$',
 #
 #print "sample size:", len(g_valid)
 
-n       = len(beta_v)
-idx     = arange(n)
-test_i  = randint(n, size = 1000)
-train_i = setdiff1d(idx, test_i)
+# a tenth of the valid nodes, drawn without replacement, is held out :
+n       = len(valid)
+idx     = permutation(valid)
+test_i  = idx[:n//10]
+train_i = idx[n//10:]
 
 test    = data[1:,test_i].T
 train   = data[1:,train_i].T
@@ -282,4 +299,33 @@ def plot_dist(train, train_class, nbins, name, norm=True):
   #show()
   return array(bi_a), array(ct_a)
 
-out = plot_dist(train[1:], train[0], nbins=10, 'training', norm=False)
+#out = plot_dist(train, train_class, 10, 'training', norm=False)
+
+#===============================================================================
+# classify the friction of the held-out nodes in <k> classes of equal count :
+
+k       = 5
+edges   = class_edges(train_class, k)
+train_c = classify(train_class, edges)
+test_c  = classify(test_class,  edges)
+
+t0      = time()
+nb      = GaussianNaiveBayes(k).fit(train, train_c)
+t_fit   = time() - t0
+t0      = time()
+nb_c    = nb.predict(test)
+t_pred  = time() - t0
+print_confusion(confusion_matrix(test_c, nb_c, k), 'naive Bayes', t_fit,
+                t_pred)
+
+# the mean friction of the 10 nearest training nodes, classified the same
+# way, as a non-parametric baseline for the GLM :
+t0      = time()
+knn     = KNNRegressor(10).fit(train, train_class)
+t_fit   = time() - t0
+t0      = time()
+knn_b   = knn.predict(test)
+t_pred  = time() - t0
+knn_c   = classify(knn_b, edges)
+print_confusion(confusion_matrix(test_c, knn_c, k), '10-NN', t_fit, t_pred)
+print "10-NN held-out RMSE %g" % sqrt(mean((knn_b - test_class)**2))
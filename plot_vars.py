@@ -2,7 +2,6 @@ from pylab          import *
 from scipy.stats    import t, distributions, scoreatpercentile, distributions, \
                            probplot, chisquare
 from scipy.special  import fdtrc
-from scipy.sparse   import diags
 
 from varglas.data.data_factory    import DataFactory
 from varglas.io                   import DataInput
@@ -14,6 +13,9 @@ src_directory = '../statistical_modeling'
 sys.path.append(src_directory)
 
 from src.regstats              import prbplotObj
+from bedstats.glm              import glm
+from bedstats.distfit          import fit
+from bedstats.gradient         import GradientOperator
 from fenics                    import *
 from pylab                     import *
 
@@ -37,61 +39,6 @@ def normal(x, mu, sigma):
   """
   return 1.0/(sigma * sqrt(2.0 * pi)) * exp(-(x - mu)**2 / (2.0 * sigma**2))
 
-def glm(x,y,w=1.0):
-
-  p,n    = shape(x)                    # sample size
-  p     += 1                           # add one for intercept
-  sig    = var(y)                      # variance
-  mu     = y                           # initial estimate of mu is data
-  X      = vstack((ones(n), x)).T      # observed x-variable matrix
-  W      = diags(w*mu**2/sig**2, 0)    # sparse diagonal weight matrix
-  
-  XTW    = dot(X.T, W)
-  XTWX   = dot(XTW, X)
-  iXTWX  = inv(XTWX)
-  eta    = log(mu)
-  z      = eta - 1.0
-  
-  bhat   = dot(dot(iXTWX, XTW), z)   # parameter initial estimates
-
-  # Newton-Raphson :
-  converged = False
-  rtol      = 1e-10
-  lmbda     = 1.0
-  nIter     = 0
-  residual  = 1
-  rel_res   = bhat
-  maxIter   = 13
-
-  while not converged and nIter < maxIter:
-    nIter +=  1
-    W      = diags(mu**2/sig**2, 0)       # compute weights
-    
-    XTW    = dot(X.T, W)
-    XTWX   = dot(XTW, X)
-    iXTWX  = inv(XTWX)
-    eta    = dot(X, bhat)                 # compute estimates
-    mu     = exp(eta)                     # linear predictor
-    z      = eta + y/mu - 1.0
-
-    bhat_n = dot(dot(iXTWX, XTW), z)
-
-    # calculate residual :
-    rel_res = norm(bhat - bhat_n, inf)
-    bhat    = bhat_n
-    if rel_res < rtol: converged = True
-    residual = norm(y - mu)**2 / sig**2
-
-    string = "Newton iteration %d: r (abs) = %.3e, r (rel) = %.3e (tol = %.3e)"
-    print string % (nIter, residual, rel_res, rtol)
-
-  resid  = y - mu
-  vara = { 'bhat'  : bhat,
-           'yhat'  : mu,
-           'resid' : resid}
-  return vara
-
-
 def linRegstats(x, y, conf):
 
   if size(shape(x)) == 1: 
@@ -241,12 +188,6 @@ plotIce(d1, 'B', '.', 'gist_yarg', scale='lin', name=r'$B$',
 
 #===============================================================================
 
-a_dSdx   = project(a_S.dx(0), a_Q)
-a_dSdy   = project(a_S.dx(1), a_Q)
-                                
-a_dBdx   = project(a_B.dx(0), a_Q)
-a_dBdy   = project(a_B.dx(1), a_Q)
-
 # vectors :
 a_beta_v = a_beta.vector().array()
 a_S_v    = a_S.vector().array()
@@ -264,11 +205,11 @@ a_qbar_v = a_qbar.vector().array()
 
 a_H_v    = a_S_v - a_B_v
 a_U_mag  = sqrt(a_u_v**2 + a_v_v**2 + 1e-16)
-a_dSdx_v = a_dSdx.vector().array()
-a_dSdy_v = a_dSdy.vector().array()
+# horizontal derivatives from the cached gradient operator of the submesh :
+a_G      = GradientOperator(ant_in_dir, a_Q)
+a_dSdx_v, a_dSdy_v = a_G.gradient(a_S_v)
 a_gradS  = sqrt(a_dSdx_v**2 + a_dSdy_v**2 + 1e-16)
-a_dBdx_v = a_dBdx.vector().array()
-a_dBdy_v = a_dBdy.vector().array()
+a_dBdx_v, a_dBdy_v = a_G.gradient(a_B_v)
 a_gradB  = sqrt(a_dBdx_v**2 + a_dBdy_v**2 + 1e-16)
 
 g_mesh  = Mesh(gre_in_dir + 'submesh.xdmf')
@@ -316,12 +257,6 @@ sys.exit(0)
 
 #===============================================================================
 
-g_dSdx   = project(g_S.dx(0), g_Q)
-g_dSdy   = project(g_S.dx(1), g_Q)
-                                
-g_dBdx   = project(g_B.dx(0), g_Q)
-g_dBdy   = project(g_B.dx(1), g_Q)
-
 # vectors :
 g_beta_v = g_beta.vector().array()
 g_S_v    = g_S.vector().array()
@@ -339,11 +274,11 @@ g_qbar_v = g_qbar.vector().array()
 
 g_H_v    = g_S_v - g_B_v
 g_U_mag  = sqrt(g_u_v**2 + g_v_v**2 + 1e-16)
-g_dSdx_v = g_dSdx.vector().array()
-g_dSdy_v = g_dSdy.vector().array()
+# horizontal derivatives from the cached gradient operator of the submesh :
+g_G      = GradientOperator(gre_in_dir, g_Q)
+g_dSdx_v, g_dSdy_v = g_G.gradient(g_S_v)
 g_gradS  = sqrt(g_dSdx_v**2 + g_dSdy_v**2 + 1e-16)
-g_dBdx_v = g_dBdx.vector().array()
-g_dBdy_v = g_dBdy.vector().array()
+g_dBdx_v, g_dBdy_v = g_G.gradient(g_B_v)
 g_gradB  = sqrt(g_dBdx_v**2 + g_dBdy_v**2 + 1e-16)
 
 g_valid  = where(g_beta_v > 1e-10)[0]
@@ -461,10 +396,10 @@ expfreq  = px * len(y)                  # computes expected frequencies
 
 #===============================================================================
 # fitting to distributions :
-gam_fit  = gamma.fit(y)
+gam_fit  = fit(y, 'gamma', loc=None)
 chi_fit  = chi2.fit(y)
 cau_fit  = cauchy.fit(y)
-exp_fit  = expon.fit(y)
+exp_fit  = fit(y, 'expon', loc=None)
 g_x      = linspace(y.min(), y.max(), num)
 
 #===============================================================================
@@ -588,7 +523,7 @@ for k,i in enumerate(ii_int):
 out_glm   = glm(array(Xt), y)
 yhat      = out_glm['yhat']
 resid     = out_glm['resid']
-bhat_glm  = out_glm['bhat']
+bhat_glm  = out_glm['ahat']
 
 # remove any data above 1000 for plotting purposes :
 #lt1e3     = where(yhat < 1000)[0]
@@ -1,15 +1,10 @@
 from pylab       import *
-from scipy.stats import scoreatpercentile, distributions
+from scipy.stats import distributions
 
-poisson = distributions.poisson.pmf
-chi2cdf = distributions.chi2.cdf
+from bedstats.streamstats import describe
+from bedstats.countfit    import frequencies, gof_all, print_gof
 
-def iqr(arr):
-  arr           = sort(arr.copy())
-  upperQuartile = scoreatpercentile(arr,.75)
-  lowerQuartile = scoreatpercentile(arr,.25)
-  iqr           = upperQuartile - lowerQuartile
-  return iqr
+poisson = distributions.poisson.pmf
 
 num      = arange(7)
 tapeworm = hstack((0 * zeros(235),
@@ -19,10 +14,11 @@ tapeworm = hstack((0 * zeros(235),
                    4 * ones(7), 
                    5 * ones(2),
                    6 * ones(1)))
-mu       = mean(tapeworm)                # mean
-med      = median(tapeworm)              # median
-sigma    = std(tapeworm)                 # standard deviation
-fe_iqr   = iqr(tapeworm)                 # IQR
+stats    = describe(tapeworm)            # one-pass summary
+mu       = stats.mean()                  # mean
+med      = stats.median()                # median
+sigma    = stats.std()                   # standard deviation
+fe_iqr   = stats.iqr()                   # IQR
 v_m_rat  = sigma**2 / mu                 # variance-to-mean ratio
 px       = poisson(range(7), mu)         # compute probabilities
 expfreq  = px * len(tapeworm)            # computes expected frequencies
@@ -55,15 +51,12 @@ ax.text(0.65, 0.95, textstr, transform=ax.transAxes, fontsize=14,
 show()
 
 #===============================================================================
-# perform chi^2 test :
-mle             = mean(tapeworm)
-px              = poisson(range(4), mle)             # for results <= 3
-px              = append(px, 1-sum(px))              # add on results > 3
-expfreq         = px * len(tapeworm)                 # expected frequency
-obsfreq, n, mid = hist(tapeworm, [0,1,2,3,4,6])      # histogram
-D               = sum((obsfreq-expfreq)**2/expfreq)  # chi squared
-m               = len(n) - 1                         # number of outcomes
-pval            = 1 - chi2cdf(D, m-2)                # probability not Poissson
+# goodness-of-fit of the Poisson, negative binomial and zero-inflated
+# families, bins expecting fewer than 5 merged :
+F               = frequencies([tapeworm])            # count frequencies
+gof             = gof_all(F)                         # fits and tests
+print_gof(gof)
+pval            = gof['poisson']['p_X2'][0]          # probability not Poisson
 print pval
 
 